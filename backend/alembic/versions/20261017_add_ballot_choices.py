@@ -0,0 +1,45 @@
+"""Add ballot_choices side table
+
+Revision ID: add_ballot_choices
+Revises: add_running_tally_to_results
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'add_ballot_choices'
+down_revision = 'add_running_tally_to_results'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('ballot_choices',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('ballot_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('election_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('question_idx', sa.SmallInteger(), nullable=False),
+        sa.Column('option_idx', sa.SmallInteger(), nullable=False),
+        sa.Column('rank', sa.SmallInteger(), nullable=True),
+        sa.ForeignKeyConstraint(['ballot_id'], ['ballots.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['election_id'], ['elections.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ballot_choices_ballot_id'), 'ballot_choices', ['ballot_id'], unique=False)
+    op.create_index('ix_ballot_choices_election_question_option', 'ballot_choices',
+                    ['election_id', 'question_idx', 'option_idx'], unique=False)
+
+    # Existing ballots start unmaterialized; run `python -m app.cli backfill-ballot-choices`
+    op.add_column('ballots', sa.Column('choices_materialized', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.create_index('ix_ballots_election_id_unmaterialized', 'ballots', ['election_id'], unique=False,
+                    postgresql_where=sa.text('NOT choices_materialized'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ballots_election_id_unmaterialized', table_name='ballots')
+    op.drop_column('ballots', 'choices_materialized')
+    op.drop_index('ix_ballot_choices_election_question_option', table_name='ballot_choices')
+    op.drop_index(op.f('ix_ballot_choices_ballot_id'), table_name='ballot_choices')
+    op.drop_table('ballot_choices')
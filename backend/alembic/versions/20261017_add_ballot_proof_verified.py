@@ -0,0 +1,22 @@
+"""Verified-proof flag gating the encrypted tally
+
+Revision ID: add_ballot_proof_verified
+Revises: add_election_sealed_trustee_shares
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_ballot_proof_verified'
+down_revision = 'add_election_sealed_trustee_shares'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('ballots', sa.Column('proof_verified', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('ballots', 'proof_verified')
@@ -0,0 +1,21 @@
+"""Keyset index for the bulletin board feed
+
+Revision ID: add_ballots_feed_index
+Revises: add_merkle_bulletin_board
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_ballots_feed_index'
+down_revision = 'add_merkle_bulletin_board'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_ballots_election_id_timestamp_id', 'ballots', ['election_id', 'timestamp', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ballots_election_id_timestamp_id', table_name='ballots')
@@ -0,0 +1,22 @@
+"""Sealed trustee shares of pooled election keypairs
+
+Revision ID: add_election_sealed_trustee_shares
+Revises: add_ballots_feed_index
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_election_sealed_trustee_shares'
+down_revision = 'add_ballots_feed_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('elections', sa.Column('sealed_trustee_shares', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('elections', 'sealed_trustee_shares')
@@ -0,0 +1,48 @@
+"""Merkle tree bulletin board
+
+Revision ID: add_merkle_bulletin_board
+Revises: add_unique_voter_email_per_election
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'add_merkle_bulletin_board'
+down_revision = 'add_unique_voter_email_per_election'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('merkle_trees',
+        sa.Column('election_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('frontier', sa.JSON(), nullable=False),
+        sa.Column('root_hash', sa.String(length=64), nullable=True),
+        sa.Column('signature', sa.String(length=128), nullable=True),
+        sa.Column('signed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['election_id'], ['elections.id'], ),
+        sa.PrimaryKeyConstraint('election_id')
+    )
+    op.create_table('merkle_nodes',
+        sa.Column('election_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('level', sa.SmallInteger(), nullable=False),
+        sa.Column('idx', sa.BigInteger(), nullable=False),
+        sa.Column('hash', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['election_id'], ['elections.id'], ),
+        sa.PrimaryKeyConstraint('election_id', 'level', 'idx')
+    )
+
+    # Existing ballots start unsequenced; the periodic sweep appends them
+    op.add_column('ballots', sa.Column('leaf_index', sa.BigInteger(), nullable=True))
+    op.create_index('ix_ballots_election_id_unsequenced', 'ballots', ['election_id', 'timestamp', 'id'], unique=False,
+                    postgresql_where=sa.text('leaf_index IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ballots_election_id_unsequenced', table_name='ballots')
+    op.drop_column('ballots', 'leaf_index')
+    op.drop_table('merkle_nodes')
+    op.drop_table('merkle_trees')
@@ -0,0 +1,22 @@
+"""Add result_hash to results
+
+Revision ID: add_result_hash_to_results
+Revises: add_ballot_choices
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_result_hash_to_results'
+down_revision = 'add_ballot_choices'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('results', sa.Column('result_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('results', 'result_hash')
@@ -0,0 +1,24 @@
+"""Add running tally checkpoint to results
+
+Revision ID: add_running_tally_to_results
+Revises: add_voter_email_to_ballots
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_running_tally_to_results'
+down_revision = 'add_voter_email_to_ballots'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('results', sa.Column('running_tally', sa.JSON(), nullable=True))
+    op.add_column('results', sa.Column('running_tally_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('results', 'running_tally_at')
+    op.drop_column('results', 'running_tally')
@@ -0,0 +1,38 @@
+"""Unique voter_email per election on ballots
+
+Revision ID: add_unique_voter_email_per_election
+Revises: add_result_hash_to_results
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_unique_voter_email_per_election'
+down_revision = 'add_result_hash_to_results'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Duplicates let through by the old check-then-insert race: keep every ballot
+    # (results are unchanged) but only the first one stays linked to the email.
+    op.execute("""
+        UPDATE ballots SET voter_email = NULL
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY election_id, voter_email ORDER BY timestamp, id
+                ) AS position
+                FROM ballots
+                WHERE voter_email IS NOT NULL
+            ) ranked
+            WHERE position > 1
+        )
+    """)
+    op.create_index('uq_ballots_election_id_voter_email', 'ballots', ['election_id', 'voter_email'], unique=True,
+                    postgresql_where=sa.text('voter_email IS NOT NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('uq_ballots_election_id_voter_email', table_name='ballots')
@@ -1,37 +1,86 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert, update, literal, func, true, tuple_, SmallInteger
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import Optional, Tuple
+import asyncio
 import hashlib
+import logging
 import uuid
-from app.core.database import get_db
-from app.models.models import Ballot, Election, ElectionStatus, MagicLink
+import zlib
+import orjson
+from datetime import datetime, timedelta, timezone
+from app.core.config import settings
+from app.core.database import get_db, SessionLocal
+from app.core.admission import admit_vote, admit_read
+from app.models.models import Ballot, BallotChoice, Election, ElectionStatus, MagicLink
 from app.schemas.schemas import BallotSubmit, BallotResponse
 from app.services.crypto_service import CryptoEngine
 from app.services.storage_service import get_storage_adapter
 from app.services.email_service import email_service
+from app.services.tally_service import tally_service
+from app.services.stats_cache_service import stats_cache
+from app.services.live_updates_service import live_updates
+from app.services.ballot_ingest_service import ballot_ingest, DuplicateVoteError, ElectionClosedError
+from app.services.tally_engine import materialize_ballot
+from app.services.election_cache_service import election_cache
+from app.services.merkle_service import merkle_board
+from app.services.tracking_code_service import tracking_filter, recent_verifications
+from app.services.proof_batcher_service import proof_batcher
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
-@router.post("/", response_model=BallotResponse)
-async def submit_ballot(ballot_data: BallotSubmit, db: AsyncSession = Depends(get_db)):
-    """Submit encrypted ballot."""
+def _while_open(election_id):
+    """WHERE clause of a ballot insert on its election row, share-locked while open.
+
+    Closing the election (UPDATE of that row) waits for the inserts that saw it
+    open, and inserts that start after the close see it closed: once the close
+    is committed no ballot can be added, whatever the workers' election cache says.
+    """
+    return select(Election.id).where(Election.id == election_id, Election.status == ElectionStatus.OPEN).with_for_update(read=True)
+
+
+async def _not_open(db: AsyncSession, election_id) -> bool:
+    status = (await db.execute(select(Election.status).where(Election.id == election_id))).scalar_one_or_none()
+    return status != ElectionStatus.OPEN
+
+
+async def _check_proof(election, ballot_data: BallotSubmit) -> None:
+    if not await proof_batcher.verify(
+        ballot_data.encrypted_ballot,
+        ballot_data.proof,
+        election.public_key,
+        election.questions
+    ):
+        raise HTTPException(status_code=400, detail="Invalid ballot proof")
+
+
+def _proof_checked(election, ballot_data: BallotSubmit) -> bool:
+    """Flag stored with a ballot that passed _check_proof with a real ElGamal proof."""
+    return CryptoEngine.has_real_proof(ballot_data.encrypted_ballot, ballot_data.proof, election.public_key)
+
+
+async def _accept(db: AsyncSession, ballot_data: BallotSubmit):
+    """Checks shared by the submit endpoints; returns (election, tracking_code, ipfs_hash).
+
+    The proof is checked here in every ingest mode: no tracking code is issued
+    for a ballot whose proof has not passed.
+    """
     # Verify election exists and is open
-    result = await db.execute(select(Election).where(Election.id == ballot_data.election_id))
-    election = result.scalar_one_or_none()
+    election = await election_cache.get(db, ballot_data.election_id)
     if not election:
         raise HTTPException(status_code=404, detail="Election not found")
     
     if election.status != ElectionStatus.OPEN:
         raise HTTPException(status_code=400, detail="Election is not open for voting")
     
-    # Verify ZKP
-    if not CryptoEngine.verify_zkp(
-        ballot_data.encrypted_ballot,
-        ballot_data.proof,
-        election.public_key
-    ):
-        raise HTTPException(status_code=400, detail="Invalid ballot proof")
+    # Verify ZKP (micro-batched with concurrent submissions)
+    await _check_proof(election, ballot_data)
     
     # Generate tracking code
     tracking_code = hashlib.sha256(
@@ -45,7 +94,39 @@ async def submit_ballot(ballot_data: BallotSubmit, db: AsyncSession = Depends(ge
         "proof": ballot_data.proof,
         "tracking_code": tracking_code
     }
-    ipfs_hash = storage.store(bulletin_data)
+    ipfs_hash = await storage.astore(bulletin_data)
+    return election, tracking_code, ipfs_hash
+
+
+async def _after_commit(election, rows, voter_email, tracking_code) -> None:
+    # Before the voter gets the code: the filter must never deny a stored ballot
+    await tracking_filter.add(tracking_code)
+    
+    # Update running tally counters
+    credited = (await tally_service.record_batch(election.id, [rows]))[0]
+    await stats_cache.invalidate(election.id)
+    await live_updates.publish_ballot(election.id, credited)
+    await merkle_board.notify(election.id)
+    
+    if voter_email:
+        # Queued submissions of this voter are refused by the enqueue script
+        await ballot_ingest.remember_voter(election.id, voter_email)
+    
+    # Send confirmation email in background if we have voter email
+    if voter_email:
+        await email_service.send_vote_confirmation(
+            voter_email,
+            election.title,
+            str(election.id),
+            tracking_code
+        )
+
+
+@router.post("/", response_model=BallotResponse, dependencies=[Depends(admit_vote)])
+async def submit_ballot(ballot_data: BallotSubmit, db: AsyncSession = Depends(get_db)):
+    """Submit encrypted ballot."""
+    queued_mode = settings.BALLOT_INGEST_MODE == "queued"
+    election, tracking_code, ipfs_hash = await _accept(db, ballot_data)
     
     # Try to get voter email from magic link (optional)
     voter_email = None
@@ -54,56 +135,358 @@ async def submit_ballot(ballot_data: BallotSubmit, db: AsyncSession = Depends(ge
         ml_result = await db.execute(select(MagicLink).where(MagicLink.token == ballot_data.magic_token))
         magic_link = ml_result.scalar_one_or_none()
         if magic_link:
-            # Check if this magic link has already voted
-            existing_result = await db.execute(
-                select(Ballot).where(
-                    Ballot.election_id == ballot_data.election_id,
-                    Ballot.voter_email == magic_link.email
-                )
-            )
-            existing_ballot = existing_result.scalar_one_or_none()
-            if existing_ballot:
-                raise HTTPException(status_code=400, detail="You have already voted in this election")
             voter_email = magic_link.email
     
-    # Save to database
-    new_ballot = Ballot(
-        election_id=ballot_data.election_id,
-        encrypted_ballot=ballot_data.encrypted_ballot,
-        proof=ballot_data.proof,
-        tracking_code=tracking_code,
-        ipfs_hash=ipfs_hash,
-        voter_fingerprint=ballot_data.voter_fingerprint,
-        voter_email=voter_email
-    )
+    # Mode write-behind: accusé de réception dès que le bulletin est dans la file
+    if queued_mode:
+        queued = {
+            "id": str(uuid.uuid4()),
+            "election_id": str(election.id),
+            "election_title": election.title,
+            "encrypted_ballot": ballot_data.encrypted_ballot,
+            "proof": ballot_data.proof,
+            "tracking_code": tracking_code,
+            "ipfs_hash": ipfs_hash,
+            "timestamp": datetime.utcnow().isoformat(),
+            "voter_fingerprint": ballot_data.voter_fingerprint,
+            "voter_email": voter_email,
+            "choices": materialize_ballot(election.questions, ballot_data.encrypted_ballot),
+            "proof_verified": _proof_checked(election, ballot_data)
+        }
+        try:
+            # Doublons rejetés par le script d'enqueue (ensemble des votants de l'élection)
+            await ballot_ingest.enqueue(queued)
+            return {key: queued[key] for key in ("id", "tracking_code", "timestamp", "ipfs_hash")}
+        except DuplicateVoteError:
+            raise HTTPException(status_code=400, detail="You have already voted in this election")
+        except ElectionClosedError:
+            raise HTTPException(status_code=400, detail="Election is not open for voting")
+        except Exception as e:
+            logger.warning("[INGEST] Queue unavailable, storing ballot directly: %s", e)
     
-    db.add(new_ballot)
+    # Save to database, with the choices decoded once into ballot_choices.
+    # INSERT ... SELECT from the election row while it is open (_while_open),
+    # and the duplicate check is the unique (election_id, voter_email) index
+    # probe of the insert itself: no row returned means one of them failed.
+    rows = materialize_ballot(election.questions, ballot_data.encrypted_ballot)
+    open_election = _while_open(election.id).cte("open_election")
+    inserted = (await db.execute(
+        pg_insert(Ballot).from_select(
+            ["id", "election_id", "encrypted_ballot", "proof", "tracking_code", "ipfs_hash",
+             "voter_fingerprint", "voter_email", "choices_materialized", "proof_verified"],
+            select(
+                literal(uuid.uuid4(), Ballot.id.type),
+                open_election.c.id,
+                literal(ballot_data.encrypted_ballot, Ballot.encrypted_ballot.type),
+                literal(ballot_data.proof, Ballot.proof.type),
+                literal(tracking_code, Ballot.tracking_code.type),
+                literal(ipfs_hash, Ballot.ipfs_hash.type),
+                literal(ballot_data.voter_fingerprint, Ballot.voter_fingerprint.type),
+                literal(voter_email, Ballot.voter_email.type),
+                true(),
+                literal(_proof_checked(election, ballot_data))
+            )
+        ).on_conflict_do_nothing(
+            index_elements=["election_id", "voter_email"],
+            index_where=Ballot.voter_email.isnot(None)
+        ).returning(Ballot.id, Ballot.tracking_code, Ballot.timestamp, Ballot.ipfs_hash)
+    )).one_or_none()
+    if inserted is None:
+        await db.rollback()
+        if await _not_open(db, election.id):
+            raise HTTPException(status_code=400, detail="Election is not open for voting")
+        raise HTTPException(status_code=400, detail="You have already voted in this election")
+    if rows:
+        await db.execute(insert(BallotChoice), [
+            {"ballot_id": inserted.id, "election_id": election.id, "question_idx": q_idx, "option_idx": o_idx, "rank": rank}
+            for q_idx, o_idx, rank in rows
+        ])
     await db.commit()
-    await db.refresh(new_ballot)
     
-    # Send confirmation email in background if we have voter email
-    if voter_email:
-        await email_service.send_vote_confirmation(
-            voter_email,
-            election.title,
-            str(election.id),
-            tracking_code
-        )
+    await _after_commit(election, rows, voter_email, tracking_code)
     
-    return new_ballot
+    return inserted._asdict()
 
 
-@router.get("/verify/{tracking_code}")
+@router.post("/with-magic-link", response_model=BallotResponse, dependencies=[Depends(admit_vote)])
+async def submit_ballot_with_magic_link(ballot_data: BallotSubmit, db: AsyncSession = Depends(get_db)):
+    """Submit a ballot and consume its magic link in one statement.
+
+    The link is marked used by an UPDATE ... RETURNING CTE that feeds the
+    ballot INSERT (and the ballot_choices INSERT), so a link can never be used
+    twice and a failed insert leaves it unused. The link is only consumed while
+    the election row is open (_while_open).
+    """
+    if not ballot_data.magic_token:
+        raise HTTPException(status_code=400, detail="magic_token is required")
+    election, tracking_code, ipfs_hash = await _accept(db, ballot_data)
+    rows = materialize_ballot(election.questions, ballot_data.encrypted_ballot)
+    now = datetime.utcnow()
+
+    open_election = _while_open(election.id).cte("open_election")
+    link = (
+        update(MagicLink)
+        .where(
+            MagicLink.token == ballot_data.magic_token,
+            MagicLink.election_id == select(open_election.c.id).scalar_subquery(),
+            MagicLink.used == False,
+            MagicLink.expires_at > now
+        )
+        .values(used=True)
+        .returning(MagicLink.email)
+        .cte("link")
+    )
+    ballot = (
+        pg_insert(Ballot)
+        .from_select(
+            ["id", "election_id", "encrypted_ballot", "proof", "tracking_code", "ipfs_hash",
+             "timestamp", "voter_fingerprint", "voter_email", "choices_materialized", "proof_verified"],
+            select(
+                literal(uuid.uuid4(), Ballot.id.type),
+                literal(election.id, Ballot.election_id.type),
+                literal(ballot_data.encrypted_ballot, Ballot.encrypted_ballot.type),
+                literal(ballot_data.proof, Ballot.proof.type),
+                literal(tracking_code, Ballot.tracking_code.type),
+                literal(ipfs_hash, Ballot.ipfs_hash.type),
+                literal(now, Ballot.timestamp.type),
+                literal(ballot_data.voter_fingerprint, Ballot.voter_fingerprint.type),
+                link.c.email,
+                true(),
+                literal(_proof_checked(election, ballot_data))
+            )
+        )
+        .on_conflict_do_nothing(
+            index_elements=["election_id", "voter_email"],
+            index_where=Ballot.voter_email.isnot(None)
+        )
+        .returning(Ballot.id, Ballot.tracking_code, Ballot.timestamp, Ballot.ipfs_hash, Ballot.voter_email)
+        .cte("ballot")
+    )
+    choices = func.unnest(
+        literal([r[0] for r in rows], ARRAY(SmallInteger)),
+        literal([r[1] for r in rows], ARRAY(SmallInteger)),
+        literal([r[2] for r in rows], ARRAY(SmallInteger))
+    ).table_valued("question_idx", "option_idx", "rank")
+    choices_insert = (
+        insert(BallotChoice)
+        .from_select(
+            ["ballot_id", "election_id", "question_idx", "option_idx", "rank"],
+            select(ballot.c.id, literal(election.id, Ballot.election_id.type),
+                   choices.c.question_idx, choices.c.option_idx, choices.c.rank)
+            .select_from(ballot).join(choices, true())
+        )
+        .cte("choices")
+    )
+    statement = select(ballot.c.id, ballot.c.tracking_code, ballot.c.timestamp, ballot.c.ipfs_hash,
+                       ballot.c.voter_email).add_cte(choices_insert)
+    inserted = (await db.execute(statement)).one_or_none()
+
+    if inserted is None:
+        # Échec: rien n'est écrit, le lien reste intact. Seul ce chemin relit le lien.
+        await db.rollback()
+        if await _not_open(db, election.id):
+            raise HTTPException(status_code=400, detail="Election is not open for voting")
+        magic_link = (await db.execute(
+            select(MagicLink).where(MagicLink.token == ballot_data.magic_token)
+        )).scalar_one_or_none()
+        if not magic_link or magic_link.election_id != election.id:
+            raise HTTPException(status_code=400, detail="Lien de vote invalide")
+        if magic_link.used:
+            raise HTTPException(status_code=400, detail="Ce lien a déjà été utilisé")
+        if magic_link.expires_at <= now:
+            raise HTTPException(status_code=400, detail="Lien expiré — demandez un nouvel envoi")
+        raise HTTPException(status_code=400, detail="You have already voted in this election")
+    await db.commit()
+
+    await _after_commit(election, rows, inserted.voter_email, tracking_code)
+
+    return {key: value for key, value in inserted._asdict().items() if key != "voter_email"}
+
+
+@router.get("/verify/{tracking_code}", dependencies=[Depends(admit_read)])
 async def verify_ballot(tracking_code: str, db: AsyncSession = Depends(get_db)):
-    """Verify ballot exists in bulletin board."""
-    result = await db.execute(select(Ballot).where(Ballot.tracking_code == tracking_code))
-    ballot = result.scalar_one_or_none()
-    if not ballot:
-        raise HTTPException(status_code=404, detail="Ballot not found")
+    """Verify ballot exists in bulletin board.
+
+    Sequenced ballots come with a Merkle inclusion proof against the latest
+    signed root ("merkle"); it is null while the ballot awaits sequencing.
+    Recent answers and codes rejected by the tracking-code filter are served
+    without touching the database.
+    """
+    cached = recent_verifications.get(tracking_code)
+    if cached:
+        return cached
+    
+    if await tracking_filter.might_contain(tracking_code):
+        result = await db.execute(select(Ballot).where(Ballot.tracking_code == tracking_code))
+        ballot = result.scalar_one_or_none()
+        if ballot:
+            response = {
+                "tracking_code": ballot.tracking_code,
+                "timestamp": ballot.timestamp,
+                "ipfs_hash": ballot.ipfs_hash,
+                "verified": True,
+                "merkle": await merkle_board.inclusion_proof(db, ballot)
+            }
+            if response["merkle"]:
+                recent_verifications.put(tracking_code, response)
+            return response
     
-    return {
-        "tracking_code": ballot.tracking_code,
-        "timestamp": ballot.timestamp,
-        "ipfs_hash": ballot.ipfs_hash,
-        "verified": True
+    # Bulletin accepté mais pas encore écrit en base (mode queued)
+    pending = await ballot_ingest.pending(tracking_code)
+    if pending:
+        return {
+            "tracking_code": tracking_code,
+            "timestamp": pending["timestamp"],
+            "ipfs_hash": pending["ipfs_hash"],
+            "verified": True,
+            "pending": True
+        }
+    # Accusé de réception émis mais bulletin écarté à l'écriture (mode queued)
+    rejected = await ballot_ingest.rejected(tracking_code)
+    if rejected:
+        return {
+            "tracking_code": tracking_code,
+            "timestamp": rejected["timestamp"],
+            "verified": False,
+            "rejected": True,
+            "reason": rejected["reason"]
+        }
+    raise HTTPException(status_code=404, detail="Ballot not found")
+
+
+@router.get("/board/{election_id}/head", dependencies=[Depends(admit_read)])
+async def get_board_head(election_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    """Latest signed Merkle root of an election's bulletin board."""
+    head = await merkle_board.head(db, election_id)
+    if not head:
+        raise HTTPException(status_code=404, detail="No ballots sequenced for this election")
+    return head
+
+
+@router.get("/board/{election_id}/consistency", dependencies=[Depends(admit_read)])
+async def get_board_consistency(
+    election_id: uuid.UUID,
+    from_size: int = Query(..., ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """Consistency proof from an earlier signed head (from_size leaves) to the latest one."""
+    proof = await merkle_board.consistency_proof(db, election_id, from_size)
+    if not proof:
+        raise HTTPException(status_code=404, detail="No signed head of that size for this election")
+    return proof
+
+
+FEED_COLUMNS = (Ballot.id, Ballot.tracking_code, Ballot.timestamp, Ballot.encrypted_ballot, Ballot.proof,
+                Ballot.ipfs_hash, Ballot.leaf_index)
+
+# Each feed stream holds its own DB connection for its whole duration
+_feed_slots = asyncio.Semaphore(settings.BOARD_FEED_MAX_STREAMS)
+
+
+def _parse_cursor(after: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        timestamp, ballot_id = after.rsplit(",", 1)
+        parsed = datetime.fromisoformat(timestamp)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed, uuid.UUID(ballot_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor, expected after=<timestamp>,<id>")
+
+
+def _feed_filters(election_id, cursor: Optional[Tuple[datetime, uuid.UUID]], horizon: datetime) -> list:
+    filters = [Ballot.election_id == election_id, Ballot.timestamp <= horizon]
+    if cursor:
+        filters.append(tuple_(Ballot.timestamp, Ballot.id) > tuple_(literal(cursor[0], Ballot.timestamp.type),
+                                                                   literal(cursor[1], Ballot.id.type)))
+    return filters
+
+
+async def _iter_feed(filters: list, limit: int, compress: bool):
+    """NDJSON lines read through a server-side cursor, one chunk per fetch."""
+    encoder = zlib.compressobj(wbits=31) if compress else None  # gzip container
+    async with _feed_slots:
+        async with SessionLocal() as db:
+            stream = await db.stream(
+                select(*FEED_COLUMNS).where(*filters)
+                .order_by(Ballot.timestamp, Ballot.id)
+                .limit(limit)
+                .execution_options(yield_per=settings.TALLY_STREAM_CHUNK_SIZE)
+            )
+            async for rows in stream.partitions():
+                chunk = b"".join(orjson.dumps(row._asdict()) + b"\n" for row in rows)
+                yield encoder.compress(chunk) + encoder.flush(zlib.Z_SYNC_FLUSH) if encoder else chunk
+    if encoder:
+        yield encoder.flush()
+
+
+@router.get("/board/{election_id}/ballots", dependencies=[Depends(admit_read)])
+async def get_board_feed(
+    election_id: uuid.UUID,
+    request: Request,
+    after: Optional[str] = None,
+    limit: int = Query(settings.BOARD_FEED_PAGE_SIZE, ge=1, le=settings.BOARD_FEED_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db)
+):
+    """Public bulletin board: an election's ballots as NDJSON, in (timestamp, id) order.
+
+    Resume with after=<timestamp>,<id> of the last line received (also given
+    in the Link header of full pages). Only ballots older than
+    BOARD_FEED_SETTLE_SECONDS, and than any ballot still queued, are served:
+    nothing can be inserted before that horizon any more, so a page never
+    changes once it is full and its ETag stays valid.
+    """
+    election = await election_cache.get(db, election_id)
+    if not election:
+        raise HTTPException(status_code=404, detail="Election not found")
+    cursor = _parse_cursor(after) if after else None
+
+    settle = timedelta(seconds=settings.BOARD_FEED_SETTLE_SECONDS)
+    horizon = datetime.utcnow() - settle
+    if settings.BALLOT_INGEST_MODE == "queued":
+        try:
+            oldest_queued = await ballot_ingest.oldest_pending()
+        except Exception as e:
+            logger.warning("[BOARD] Ingest queue unavailable: %s", e)
+            raise HTTPException(status_code=503, detail="Bulletin board temporarily unavailable",
+                                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)})
+        if oldest_queued:
+            horizon = min(horizon, oldest_queued - settle)
+    filters = _feed_filters(election.id, cursor, horizon)
+
+    # Count and last key of the page: enough to identify its content
+    window = (
+        select(Ballot.timestamp, Ballot.id).where(*filters)
+        .order_by(Ballot.timestamp, Ballot.id).limit(limit).subquery()
+    )
+    last = (await db.execute(
+        select(window.c.timestamp, window.c.id, func.count().over().label("count"))
+        .order_by(window.c.timestamp.desc(), window.c.id.desc()).limit(1)
+    )).first()
+    count = last.count if last else 0
+    page_key = f"{election.id}|{after or ''}|{count}|{last.timestamp.isoformat() if last else ''}|{last.id if last else ''}"
+    etag = f'W/"{hashlib.sha256(page_key.encode()).hexdigest()[:32]}"'
+
+    full = count == limit
+    headers = {
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "public, max-age=86400, immutable" if full else "public, no-cache"
     }
+    if full:
+        next_url = request.url.include_query_params(after=f"{last.timestamp.isoformat()},{last.id}")
+        headers["Link"] = f'<{next_url}>; rel="next"'
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    if count == 0:
+        return Response(content=b"", media_type="application/x-ndjson", headers=headers)
+    if _feed_slots.locked():
+        raise HTTPException(status_code=503, detail="Too many bulletin board downloads, retry shortly",
+                            headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)})
+
+    compress = "gzip" in request.headers.get("accept-encoding", "")
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(_iter_feed(filters, limit, compress), media_type="application/x-ndjson", headers=headers)
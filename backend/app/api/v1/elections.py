@@ -1,23 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
 from typing import List
 from datetime import datetime, timedelta
 import uuid
-import base64
-import json
 import logging
 import csv
 import io
 import asyncio
+import orjson
 from app.core.database import get_db
+from app.core.admission import admit_read
 from app.services.audit_service import log_event
-from app.models.models import Election, User, ElectionStatus, MagicLink, Ballot, Result
-from app.schemas.schemas import ElectionCreate, ElectionResponse
-from app.services.crypto_service import CryptoEngine
+from app.models.models import Election, User, ElectionStatus, MagicLink, Ballot, BallotChoice, Result
+from app.schemas.schemas import ElectionCreate, ElectionResponse, PartialDecryptions
 from app.services.email_service import email_service, EmailService
-from app.core.redis import get_redis
+from app.services.tally_service import tally_service, build_stats
+from app.services.tally_runner import run_tally, discard_snapshot
+from app.services.stats_cache_service import stats_cache
+from app.services.live_updates_service import live_updates
+from app.services.ballot_ingest_service import ballot_ingest
+from app.services.election_cache_service import election_cache
+from app.services.merkle_service import merkle_board
+from app.services.encrypted_tally_service import encrypted_tally
+from app.services.key_pool_service import key_pool
 from app.api.v1.dependencies import get_current_admin_user
 import secrets
 from app.core.config import get_settings
@@ -35,8 +42,8 @@ async def create_election(
     current_user: User = Depends(get_current_admin_user)
 ):
     """Create new election (admin only)."""
-    # Generate election keypair
-    keypair = CryptoEngine.generate_keypair()
+    # Pre-generated election keypair
+    public_key, sealed_trustee_shares = await key_pool.pop()
     
     # Default start_date to now if not provided
     start_date = election_data.start_date or datetime.utcnow()
@@ -45,7 +52,8 @@ async def create_election(
         title=election_data.title,
         description=election_data.description,
         admin_id=current_user.id,
-        public_key=keypair["public_key"],
+        public_key=public_key,
+        sealed_trustee_shares=sealed_trustee_shares,
         questions=[q.model_dump() for q in election_data.questions],
         start_date=start_date,
         end_date=election_data.end_date,
@@ -60,7 +68,7 @@ async def create_election(
     return new_election
 
 
-@router.get("/", response_model=List[ElectionResponse])
+@router.get("/", response_model=List[ElectionResponse], dependencies=[Depends(admit_read)])
 async def list_elections(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_admin_user)
@@ -123,143 +131,194 @@ async def update_election_status(
             # Exécuter l'envoi des emails
             await send_invitations()
     
-    # Si on passe à TALLIED (décomptée), notifier les votants
+    # Si on passe à TALLIED (décomptée), s'assurer que les résultats sont figés puis notifier les votants
     if election.status == ElectionStatus.CLOSED and new_status == ElectionStatus.TALLIED:
+        if not await tally_service.read_snapshot(db, election):
+            try:
+                await run_tally(db, election)
+            except Exception as e:
+                logger.exception("[TALLY] Tally failed for %s: %s", election.id, e)
+                raise HTTPException(status_code=500, detail="Tally failed")
         try:
-            ballots_result = await db.execute(select(Ballot).where(Ballot.election_id == election.id))
-            ballots = ballots_result.scalars().all()
-            for b in ballots:
-                if b.voter_email:
-                    asyncio.create_task(EmailService.send_results_published(b.voter_email, election.title, str(election.id)))
+            emails_result = await db.execute(
+                select(Ballot.voter_email).where(Ballot.election_id == election.id, Ballot.voter_email.isnot(None))
+            )
+            for voter_email in emails_result.scalars():
+                asyncio.create_task(EmailService.send_results_published(voter_email, election.title, str(election.id)))
         except Exception as e:
             logger.error("[EMAIL ERROR] Failed to notify results: %s", e)
 
+    # Réouverture: les résultats figés ne sont plus valables
+    if new_status in (ElectionStatus.DRAFT, ElectionStatus.OPEN):
+        await discard_snapshot(db, election)
+
+    previous_status = election.status
+    closing = previous_status == ElectionStatus.OPEN and new_status == ElectionStatus.CLOSED
+    if closing and settings.BALLOT_INGEST_MODE == "queued":
+        # La file refuse l'élection avant la clôture: le drain couvre alors tout bulletin acquitté
+        try:
+            await ballot_ingest.close_election(election.id)
+        except Exception as e:
+            logger.warning("[INGEST] Could not close the queue of %s: %s", election.id, e)
     election.status = new_status
     election.updated_at = datetime.utcnow()
+    # Barrière: cet UPDATE attend les insertions en cours (verrou FOR SHARE de la
+    # ligne election), les suivantes voient l'élection close, quel que soit le cache
     await db.commit()
+    # Avant le dépouillement: les workers doivent cesser d'accepter des bulletins au plus vite
+    await election_cache.invalidate(election.id)
+    if new_status == ElectionStatus.OPEN:
+        await ballot_ingest.reopen_election(election.id)
+    
+    # Clôture: figer les résultats une fois pour toutes, après la barrière (le
+    # statut CLOSED est commité, plus aucun bulletin ne peut être inséré)
+    if closing:
+        try:
+            if settings.BALLOT_INGEST_MODE == "queued":
+                # Les bulletins acceptés avant la clôture doivent être en base
+                await ballot_ingest.drain()
+            # Dernier lot: l'agrégat chiffré couvre alors tous les bulletins
+            await merkle_board.try_sequence(db, election.id)
+            await run_tally(db, election)
+        except Exception as e:
+            # Stats fall back to the live tally until the next CLOSED -> TALLIED
+            logger.exception("[TALLY] Failed to freeze results for %s: %s", election.id, e)
+    
+    await stats_cache.invalidate(election.id)
+    await live_updates.publish_status(election.id, new_status)
     log_event("election_status_updated", {"election_id": str(election.id), "new_status": new_status})
     
     return {"message": f"Election status updated to {new_status}"}
 
 
-@router.get("/{election_id}/stats")
+async def _compute_election_stats(db: AsyncSession, election_id: str) -> dict:
+    result = await db.execute(select(Election).where(Election.id == uuid.UUID(election_id)))
+    election = result.scalar_one_or_none()
+    if not election:
+        raise HTTPException(status_code=404, detail="Election not found")
+    
+    # Élection close: résultats figés, aucune lecture des bulletins
+    snapshot = await tally_service.read_snapshot(db, election)
+    if snapshot:
+        return snapshot
+    
+    counts, vote_count = await tally_service.read(db, election)
+    preferences = await tally_service.read_preferences(db, election)
+    # Ranked-choice rounds are CPU-bound on large elections: keep them off the event loop
+    return await asyncio.to_thread(build_stats, election, counts, vote_count, preferences)
+
+
+@router.get("/{election_id}/stats", dependencies=[Depends(admit_read)])
 async def get_election_stats(
     election_id: str,
     db: AsyncSession = Depends(get_db)
 ):
     """Get election statistics with detailed results."""
-    # Try cache first
-    try:
-        redis = await get_redis()
-        cache_key = f"election:{election_id}:stats"
-        cached = await redis.get(cache_key)
-        if cached:
-            return json.loads(cached)
-    except Exception:
-        pass
+    return await stats_cache.get(
+        db, election_id,
+        lambda session: _compute_election_stats(session, election_id)
+    )
+
+
+def _sse(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+@router.get("/{election_id}/stats/stream")
+async def stream_election_stats(
+    election_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """Live results (Server-Sent Events).
+
+    Sends a full "stats" event, then coalesced "tally" updates as ballots arrive
+    and "status" events on status changes.
+    """
     result = await db.execute(select(Election).where(Election.id == uuid.UUID(election_id)))
     election = result.scalar_one_or_none()
     if not election:
         raise HTTPException(status_code=404, detail="Election not found")
-    
-    ballots_result = await db.execute(select(Ballot).where(Ballot.election_id == uuid.UUID(election_id)))
-    ballots = ballots_result.scalars().all()
-    vote_count = len(ballots)
-    
-    invited_count = len(election.voter_emails) if election.voter_emails else 0
-    
-    results_by_question = []
-    for q_idx, question in enumerate(election.questions):
-        question_title = question.get('question', f'Question {q_idx + 1}')
-        question_type = question.get('type', 'single')  # CORRIGÉ: type au lieu de question_type
-        options = question.get('options', [])
-        option_counts = {opt: 0 for opt in options}
-        
-        for ballot in ballots:
-            try:
-                choices = ballot.encrypted_ballot.get('choices', [])
-                if q_idx < len(choices):
-                    choice_data = choices[q_idx]
-                    if 'encrypted' in choice_data:
-                        encrypted_value = choice_data['encrypted']
-                        try:
-                            decoded = base64.b64decode(encrypted_value).decode('iso-8859-1')
-                            
-                            # ========================================
-                            # LOGIQUE DE COMPTAGE PAR TYPE
-                            # ========================================
-                            try:
-                                decoded_list = json.loads(decoded)
-                                
-                                # TYPE: CHOIX MULTIPLE → Compter toutes les options sélectionnées
-                                if question_type == 'multiple' and isinstance(decoded_list, list):
-                                    for selected_option in decoded_list:
-                                        if selected_option in options:
-                                            option_counts[selected_option] += 1
-                                        else:
-                                            logger.warning("Multiple vote option not found: %s", selected_option)
-                                
-                                # TYPE: CLASSEMENT (RANKING) → Compter UNIQUEMENT le 1er choix
-                                # Format: {"1": "Option A", "2": "Option B", "3": "Option C"}
-                                # Seul le choix en position "1" compte (scrutin majoritaire à 1 tour)
-                                elif question_type == 'ranking' and isinstance(decoded_list, dict):
-                                    first_choice = decoded_list.get("1")
-                                    if first_choice and first_choice in options:
-                                        option_counts[first_choice] += 1
-                                    elif first_choice:
-                                        logger.warning("Ranking first choice not found: %s", first_choice)
-                                
-                                # Autre type JSON → Warning
-                                else:
-                                    logger.warning("Unexpected vote format for type %s: %s", question_type, type(decoded_list))
-                                    
-                            except (json.JSONDecodeError, ValueError):
-                                # Pas du JSON → Vote Simple (single choice)
-                                if decoded in options:
-                                    option_counts[decoded] += 1
-                                else:
-                                    logger.warning("Vote value not found in options: %s", decoded)
-                                    
-                        except Exception as decode_err:
-                            logger.error("Failed to decode vote: %s", decode_err)
-            except Exception as e:
-                logger.exception("Error parsing ballot: %s", e)
-                continue
-        
-        results_by_question.append({
-            "question": question_title,
-            "type": question_type,
-            "options": [
-                {
-                    "option": opt,
-                    "votes": option_counts[opt],
-                    "percentage": (option_counts[opt] / vote_count * 100) if vote_count > 0 else 0
-                }
-                for opt in options
-            ]
-        })
-    
-    stats = {
-        "election_id": election_id,
-        "votes_received": vote_count,
-        "voters_invited": invited_count,
-        "participation_rate": (vote_count / invited_count * 100) if invited_count > 0 else 0,
-        "results_by_question": results_by_question
-    }
-    # Store cache (TTL 60s)
+
+    # S'abonner avant de lire les stats: aucune mise à jour perdue entre les deux
+    channel_id = str(election.id)
+    queue = await live_updates.subscribe(channel_id, election.questions)
+    try:
+        stats = await stats_cache.get(
+            db, election_id,
+            lambda session: _compute_election_stats(session, election_id)
+        )
+    except BaseException:
+        await live_updates.unsubscribe(channel_id, queue)
+        raise
+
+    async def events():
+        try:
+            yield _sse("stats", stats)
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.LIVE_UPDATES_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if event is None:
+                    # Évincé (client trop lent) ou arrêt du serveur: le navigateur se reconnecte
+                    break
+                # Shared between clients: never mutate
+                yield _sse(event["type"], {k: v for k, v in event.items() if k != "type"})
+        finally:
+            await live_updates.unsubscribe(channel_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/{election_id}/encrypted-tally", dependencies=[Depends(admit_read)])
+async def get_encrypted_tally(election_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    """Product of the ElGamal ciphertexts of the first `size` board leaves, per option.
+
+    Anyone can recompute it from the board; the trustees decrypt it.
+    """
+    aggregated = await encrypted_tally.read(db, election_id)
+    if aggregated is None:
+        raise HTTPException(status_code=404, detail="No encrypted tally for this election")
+    return {"election_id": str(election_id), **aggregated}
+
+
+@router.post("/{election_id}/decrypt")
+async def decrypt_encrypted_tally(
+    election_id: str,
+    body: PartialDecryptions,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Combine the trustees' partial decryptions of the encrypted tally (closed elections)."""
+    result = await db.execute(
+        select(Election).where(
+            Election.id == uuid.UUID(election_id),
+            Election.admin_id == current_user.id
+        )
+    )
+    election = result.scalar_one_or_none()
+    if not election:
+        raise HTTPException(status_code=404, detail="Election not found")
+    if election.status not in (ElectionStatus.CLOSED, ElectionStatus.TALLIED):
+        raise HTTPException(status_code=400, detail="Election is not closed")
     try:
-        redis = await get_redis()
-        await redis.setex(f"election:{election_id}:stats", 60, json.dumps(stats))
-    except Exception:
-        pass
-    return stats
+        decrypted = await encrypted_tally.decrypt(db, election, body.partial_decryptions)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    log_event("encrypted_tally_decrypted", {"election_id": election_id, "ballots": decrypted["ballots"]})
+    return decrypted
 
 
-@router.get("/{election_id}", response_model=ElectionResponse)
+@router.get("/{election_id}", response_model=ElectionResponse, dependencies=[Depends(admit_read)])
 async def get_election(election_id: str, db: AsyncSession = Depends(get_db)):
     """Get election details."""
-    result = await db.execute(select(Election).where(Election.id == uuid.UUID(election_id)))
-    election = result.scalar_one_or_none()
+    election = await election_cache.get(db, election_id)
     if not election:
         raise HTTPException(status_code=404, detail="Election not found")
     return election
@@ -284,23 +343,84 @@ async def delete_election(
         raise HTTPException(status_code=404, detail="Election not found")
     
     await db.execute(delete(MagicLink).where(MagicLink.election_id == election.id))
+    await db.execute(delete(BallotChoice).where(BallotChoice.election_id == election.id))
     await db.execute(delete(Ballot).where(Ballot.election_id == election.id))
     await db.execute(delete(Result).where(Result.election_id == election.id))
+    await merkle_board.discard(db, election.id)
     await db.delete(election)
     await db.commit()
+    await tally_service.discard(election_id)
+    await stats_cache.discard(election_id)
+    await ballot_ingest.discard_election(election_id)
+    await election_cache.invalidate(election_id)
     log_event("election_deleted", {"election_id": election_id})
     
     return {"message": "Election deleted successfully"}
 
 
-@router.get("/{election_id}/export")
+def _iter_csv(rows):
+    """Encode CSV rows one at a time instead of buffering the whole file."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+
+def _csv_export_rows(election: Election, results_data: dict):
+    summary = results_data["election"]
+    
+    # Section d'en-tête
+    yield ["ÉLECTION"]
+    yield ["Titre", election.title]
+    yield ["Description", election.description]
+    yield ["Statut", election.status.value]
+    yield ["Début", election.start_date.isoformat() if election.start_date else ""]
+    yield ["Fin", election.end_date.isoformat() if election.end_date else ""]
+    yield ["Votes reçus", summary["total_votes"]]
+    yield ["Invités", summary["total_invited"]]
+    yield ["Taux de participation", f"{summary['participation_rate']:.2f}%"]
+    yield []
+    
+    # Résultats par question
+    for q_idx, q_result in enumerate(results_data["results"]):
+        yield [f"QUESTION {q_idx + 1}: {q_result['question']}"]
+        yield ["Option", "Votes", "Pourcentage"]
+        for option_result in q_result["options"]:
+            yield [
+                option_result["option"],
+                option_result["votes"],
+                f"{option_result['percentage']:.2f}%"
+            ]
+        yield []
+
+
+def _iter_json_export(results_data: dict):
+    """Emit the JSON export one question at a time."""
+    yield b'{"election":' + orjson.dumps(results_data["election"]) + b',"results":['
+    for q_idx, q_result in enumerate(results_data["results"]):
+        yield (b',' if q_idx else b'') + orjson.dumps(q_result)
+    yield b']}'
+
+
+@router.get("/{election_id}/export", dependencies=[Depends(admit_read)])
 async def export_election_results(
     election_id: str,
     format: str = "csv",
+    download: bool = False,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_admin_user)
 ):
-    """Export election results as CSV or JSON (admin only)."""
+    """Export election results as CSV or JSON (admin only).
+
+    JSON is served inline unless ?download=1 asks for an attachment.
+    """
+    export_format = format.lower()
+    if export_format not in ("csv", "json"):
+        raise HTTPException(status_code=400, detail="Format must be 'csv' or 'json'")
+    
     result = await db.execute(
         select(Election).where(
             Election.id == uuid.UUID(election_id),
@@ -312,12 +432,11 @@ async def export_election_results(
     if not election:
         raise HTTPException(status_code=404, detail="Election not found")
     
-    # Récupérer les statistiques complètes
-    ballots_result = await db.execute(select(Ballot).where(Ballot.election_id == uuid.UUID(election_id)))
-    ballots = ballots_result.scalars().all()
-    vote_count = len(ballots)
-    
-    invited_count = len(election.voter_emails) if election.voter_emails else 0
+    # Récupérer les statistiques complètes (figées si l'élection est close)
+    stats = await tally_service.read_snapshot(db, election)
+    if stats is None:
+        counts, vote_count = await tally_service.read(db, election)
+        stats = build_stats(election, counts, vote_count)
     
     results_data = {
         "election": {
@@ -327,107 +446,23 @@ async def export_election_results(
             "status": election.status.value,
             "start_date": election.start_date.isoformat() if election.start_date else None,
             "end_date": election.end_date.isoformat() if election.end_date else None,
-            "total_votes": vote_count,
-            "total_invited": invited_count,
-            "participation_rate": (vote_count / invited_count * 100) if invited_count > 0 else 0
+            "total_votes": stats["votes_received"],
+            "total_invited": stats["voters_invited"],
+            "participation_rate": stats["participation_rate"],
+            "result_hash": stats.get("result_hash")
         },
-        "results": []
+        "results": stats["results_by_question"]
     }
     
-    # Traiter les résultats par question
-    for q_idx, question in enumerate(election.questions):
-        question_title = question.get('question', f'Question {q_idx + 1}')
-        question_type = question.get('type', 'single')
-        options = question.get('options', [])
-        option_counts = {opt: 0 for opt in options}
-        
-        for ballot in ballots:
-            try:
-                choices = ballot.encrypted_ballot.get('choices', [])
-                if q_idx < len(choices):
-                    choice_data = choices[q_idx]
-                    if 'encrypted' in choice_data:
-                        encrypted_value = choice_data['encrypted']
-                        try:
-                            decoded = base64.b64decode(encrypted_value).decode('iso-8859-1')
-                            
-                            try:
-                                decoded_list = json.loads(decoded)
-                                
-                                if question_type == 'multiple' and isinstance(decoded_list, list):
-                                    for selected_option in decoded_list:
-                                        if selected_option in options:
-                                            option_counts[selected_option] += 1
-                                
-                                elif question_type == 'ranking' and isinstance(decoded_list, dict):
-                                    first_choice = decoded_list.get("1")
-                                    if first_choice and first_choice in options:
-                                        option_counts[first_choice] += 1
-                                
-                            except (json.JSONDecodeError, ValueError):
-                                if decoded in options:
-                                    option_counts[decoded] += 1
-                                    
-                        except Exception as decode_err:
-                            logger.error("Failed to decode vote: %s", decode_err)
-            except Exception as e:
-                logger.exception("Error parsing ballot: %s", e)
-                continue
-        
-        question_results = {
-            "question": question_title,
-            "type": question_type,
-            "options": [
-                {
-                    "option": opt,
-                    "votes": option_counts[opt],
-                    "percentage": (option_counts[opt] / vote_count * 100) if vote_count > 0 else 0
-                }
-                for opt in options
-            ]
-        }
-        results_data["results"].append(question_results)
-    
-    # Générer la réponse selon le format demandé
-    if format.lower() == "json":
-        return results_data
+    # Générer la réponse selon le format demandé (émission progressive)
+    if export_format == "json":
+        headers = {}
+        if download:
+            headers["Content-Disposition"] = f"attachment; filename=election_{election_id}_results.json"
+        return StreamingResponse(_iter_json_export(results_data), media_type="application/json", headers=headers)
     
-    elif format.lower() == "csv":
-        # Générer CSV avec en-têtes
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Section d'en-tête
-        writer.writerow(["ÉLECTION"])
-        writer.writerow(["Titre", election.title])
-        writer.writerow(["Description", election.description])
-        writer.writerow(["Statut", election.status.value])
-        writer.writerow(["Début", election.start_date.isoformat() if election.start_date else ""])
-        writer.writerow(["Fin", election.end_date.isoformat() if election.end_date else ""])
-        writer.writerow(["Votes reçus", vote_count])
-        writer.writerow(["Invités", invited_count])
-        writer.writerow(["Taux de participation", f"{(vote_count / invited_count * 100) if invited_count > 0 else 0:.2f}%"])
-        writer.writerow([])
-        
-        # Résultats par question
-        for q_idx, q_result in enumerate(results_data["results"]):
-            writer.writerow([f"QUESTION {q_idx + 1}: {q_result['question']}"])
-            writer.writerow(["Option", "Votes", "Pourcentage"])
-            for option_result in q_result["options"]:
-                writer.writerow([
-                    option_result["option"],
-                    option_result["votes"],
-                    f"{option_result['percentage']:.2f}%"
-                ])
-            writer.writerow([])
-        
-        output.seek(0)
-        return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=election_{election_id}_results.csv"}
-        )
-    
-    else:
-        raise HTTPException(status_code=400, detail="Format must be 'csv' or 'json'")
-
+    return StreamingResponse(
+        _iter_csv(_csv_export_rows(election, results_data)),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=election_{election_id}_results.csv"}
+    )
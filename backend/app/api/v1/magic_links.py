@@ -5,25 +5,26 @@ from datetime import datetime, timedelta
 import secrets
 import logging
 from app.core.database import get_db
+from app.core.admission import admit_vote
 from app.core.config import get_settings
 from app.models.models import Election, MagicLink
 from app.schemas.schemas import AccessLinkRequest, AccessLinkResponse
 from app.services.email_service import email_service
+from app.services.election_cache_service import election_cache
 
 router = APIRouter()
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
 
-@router.post("/generate", response_model=AccessLinkResponse)
+@router.post("/generate", response_model=AccessLinkResponse, dependencies=[Depends(admit_vote)])
 async def generate_magic_link(
     request: AccessLinkRequest,
     db: AsyncSession = Depends(get_db)
 ):
     """Generate and send magic link for voter authentication."""
     # Verify election exists and is open
-    result = await db.execute(select(Election).where(Election.id == request.election_id))
-    election = result.scalar_one_or_none()
+    election = await election_cache.get(db, request.election_id)
     if not election:
         raise HTTPException(status_code=404, detail="Election not found")
     
@@ -62,35 +63,24 @@ async def generate_magic_link(
     )
 
 
-@router.get("/verify/{token}")
+@router.get("/verify/{token}", dependencies=[Depends(admit_vote)])
 async def verify_magic_link(token: str, db: AsyncSession = Depends(get_db)):
     """Verify magic link token and return election details with clear errors."""
-    # Try to find the link ignoring constraints to provide clearer reason
-    any_link_res = await db.execute(select(MagicLink).where(MagicLink.token == token))
-    any_link = any_link_res.scalar_one_or_none()
+    # One lookup; each failed constraint gets its own message
+    link_res = await db.execute(select(MagicLink).where(MagicLink.token == token))
+    magic_link = link_res.scalar_one_or_none()
 
-    if not any_link:
+    if not magic_link:
         raise HTTPException(status_code=400, detail="Lien de vote invalide")
 
-    if any_link.used:
+    if magic_link.used:
         raise HTTPException(status_code=400, detail="Ce lien a déjà été utilisé")
 
-    if any_link.expires_at <= datetime.utcnow():
+    if magic_link.expires_at <= datetime.utcnow():
         raise HTTPException(status_code=400, detail="Lien expiré — demandez un nouvel envoi")
-
-    # Re-check full constraints
-    result = await db.execute(
-        select(MagicLink).where(
-            MagicLink.token == token,
-            MagicLink.used == False,
-            MagicLink.expires_at > datetime.utcnow()
-        )
-    )
-    magic_link = result.scalar_one_or_none()
     
     # Get election
-    election_result = await db.execute(select(Election).where(Election.id == magic_link.election_id))
-    election = election_result.scalar_one_or_none()
+    election = await election_cache.get(db, magic_link.election_id)
     if not election:
         raise HTTPException(status_code=404, detail="Election not found")
     
@@ -106,9 +96,12 @@ async def verify_magic_link(token: str, db: AsyncSession = Depends(get_db)):
     }
 
 
-@router.post("/use/{token}")
+@router.post("/use/{token}", dependencies=[Depends(admit_vote)])
 async def use_magic_link(token: str, db: AsyncSession = Depends(get_db)):
-    """Mark magic link as used after successful ballot submission."""
+    """Mark magic link as used after successful ballot submission.
+
+    Prefer POST /ballots/with-magic-link, which does both atomically.
+    """
     result = await db.execute(
         select(MagicLink).where(
             MagicLink.token == token,
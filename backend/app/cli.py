@@ -0,0 +1,149 @@
+"""
+Maintenance commands.
+Usage: python -m app.cli <command> [options]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import uuid
+from sqlalchemy import select
+from app.core.database import SessionLocal
+from app.models.models import Election
+from app.services.tally_service import tally_service
+from app.services.tally_runner import run_tally, shutdown_executor
+from app.services.storage_service import SegmentLogStorageAdapter
+from app.services.board_audit_service import audit_board as run_board_audit
+from app.services.key_pool_service import unseal_share
+from app.core.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def _elections(db, election_id=None):
+    query = select(Election)
+    if election_id:
+        query = query.where(Election.id == uuid.UUID(election_id))
+    result = await db.execute(query)
+    return result.scalars().all()
+
+
+async def reconcile_tally(args) -> None:
+    """Rebuild running tally counters (Redis + checkpoint) from the ballots table."""
+    async with SessionLocal() as db:
+        for election in await _elections(db, args.election_id):
+            _, vote_count = await tally_service.rebuild(db, election)
+            await tally_service.checkpoint(db, election.id)
+            logger.info("[TALLY] %s reconciled: %d ballots", election.id, vote_count)
+
+
+async def backfill_ballot_choices(args) -> None:
+    """Decode existing ballots once into the ballot_choices side table."""
+    async with SessionLocal() as db:
+        for election in await _elections(db, args.election_id):
+            backfilled = await tally_service.backfill_choices(db, election, args.batch_size)
+            logger.info("[TALLY] %s: %d ballots backfilled", election.id, backfilled)
+
+
+async def tally(args) -> None:
+    """Run the parallel tally and store it in the results table."""
+    async with SessionLocal() as db:
+        try:
+            for election in await _elections(db, args.election_id):
+                result = await run_tally(db, election, args.partitions)
+                logger.info("[TALLY] %s: %d ballots", election.id, result.decrypted_result["votes_received"])
+        finally:
+            shutdown_executor()
+
+
+async def migrate_storage(args) -> None:
+    """Convert the flat {sha256}.json bulletin board directory into segments."""
+    source = args.source or settings.STORAGE_PATH
+    adapter = SegmentLogStorageAdapter(args.target or settings.STORAGE_PATH, settings.STORAGE_SEGMENT_MAX_BYTES)
+    migrated = 0
+    try:
+        for _ in adapter.migrate_flat_directory(source, delete=args.delete):
+            migrated += 1
+            if migrated % 10000 == 0:
+                logger.info("[STORAGE] %d ballots migrated", migrated)
+    finally:
+        adapter.close()
+    logger.info("[STORAGE] %d ballots migrated from %s; set STORAGE_MODE=segments", migrated, source)
+
+
+async def audit_board(args) -> None:
+    """Re-verify every ballot proof and the signed Merkle root of the bulletin board."""
+    async with SessionLocal() as db:
+        try:
+            for election in await _elections(db, args.election_id):
+                report = await run_board_audit(db, election)
+                for tracking_code in report["invalid_proofs"]:
+                    logger.error("[AUDIT] %s: invalid proof for ballot %s", election.id, tracking_code)
+                level = logging.INFO if (
+                    not report["invalid_proofs"] and report["root_matches"] and report["signature_valid"]
+                ) else logging.ERROR
+                logger.log(
+                    level, "[AUDIT] %s: %d ballots, %d invalid proofs, root %s, signature %s, %d unsequenced",
+                    election.id, report["ballots_audited"], len(report["invalid_proofs"]),
+                    "ok" if report["root_matches"] else "MISMATCH",
+                    "ok" if report["signature_valid"] else "INVALID", report["unsequenced"]
+                )
+        finally:
+            shutdown_executor()
+
+
+async def trustee_shares(args) -> None:
+    """Print one trustee's share of an election key (to hand to that trustee) as JSON."""
+    async with SessionLocal() as db:
+        for election in await _elections(db, args.election_id):
+            if not election.sealed_trustee_shares:
+                logger.error("[KEYS] %s has no stored trustee shares", election.id)
+                continue
+            try:
+                share = unseal_share(election.sealed_trustee_shares, args.trustee)
+            except ValueError as e:
+                logger.error("[KEYS] %s: %s", election.id, e)
+                continue
+            print(json.dumps({"election_id": str(election.id), "trustee_share": share}, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    reconcile = subparsers.add_parser("reconcile-tally", help=reconcile_tally.__doc__)
+    reconcile.add_argument("--election-id", help="Only reconcile this election")
+    reconcile.set_defaults(func=reconcile_tally)
+
+    backfill = subparsers.add_parser("backfill-ballot-choices", help=backfill_ballot_choices.__doc__)
+    backfill.add_argument("--election-id", help="Only backfill this election")
+    backfill.add_argument("--batch-size", type=int, default=1000)
+    backfill.set_defaults(func=backfill_ballot_choices)
+
+    tally_parser = subparsers.add_parser("tally", help=tally.__doc__)
+    tally_parser.add_argument("--election-id", required=True)
+    tally_parser.add_argument("--partitions", type=int, help="Key ranges (default: TALLY_PARTITIONS)")
+    tally_parser.set_defaults(func=tally)
+
+    migrate = subparsers.add_parser("migrate-storage", help=migrate_storage.__doc__)
+    migrate.add_argument("--source", help="Flat directory (default: STORAGE_PATH)")
+    migrate.add_argument("--target", help="Storage path receiving segments/ (default: STORAGE_PATH)")
+    migrate.add_argument("--delete", action="store_true", help="Remove migrated files once fsynced")
+    migrate.set_defaults(func=migrate_storage)
+
+    audit = subparsers.add_parser("audit-board", help=audit_board.__doc__)
+    audit.add_argument("--election-id", help="Only audit this election")
+    audit.set_defaults(func=audit_board)
+
+    shares = subparsers.add_parser("trustee-shares", help=trustee_shares.__doc__)
+    shares.add_argument("--election-id", required=True)
+    shares.add_argument("--trustee", type=int, required=True, help="1-based index of the trustee")
+    shares.set_defaults(func=trustee_shares)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Admission control for request surges (per worker).
+At most ADMISSION_MAX_CONCURRENCY admitted requests hold a database connection
+at a time; the others wait in a short queue and get a fast 503 with Retry-After
+when the queue is full or their wait times out. Voter writes are served before
+admin reads, may push queued reads out of a full queue, and
+ADMISSION_RESERVED_FOR_VOTES slots are never given to reads.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Any
+from fastapi import HTTPException
+from app.core.config import settings
+
+VOTE = "vote"
+READ = "read"
+PRIORITIES = (VOTE, READ)  # highest first
+
+
+class AdmissionController:
+    def __init__(self):
+        self.in_flight = 0
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {priority: deque() for priority in PRIORITIES}
+        self._stats = {
+            priority: {"admitted": 0, "queued": 0, "rejected": 0, "shed": 0, "timed_out": 0, "wait_seconds": 0.0}
+            for priority in PRIORITIES
+        }
+
+    @staticmethod
+    def _limit(priority: str) -> int:
+        if priority == VOTE:
+            return settings.ADMISSION_MAX_CONCURRENCY
+        return max(settings.ADMISSION_MAX_CONCURRENCY - settings.ADMISSION_RESERVED_FOR_VOTES, 1)
+
+    def _queued(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def _can_start(self, priority: str) -> bool:
+        # No overtaking of waiters with the same or a higher priority
+        ahead = PRIORITIES[:PRIORITIES.index(priority) + 1]
+        return self.in_flight < self._limit(priority) and not any(self._waiters[p] for p in ahead)
+
+    def _overloaded(self, priority: str, reason: str) -> HTTPException:
+        self._stats[priority][reason] += 1
+        return HTTPException(
+            status_code=503,
+            detail="Service saturé, réessayez dans quelques secondes",
+            headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)}
+        )
+
+    def _shed_below(self, priority: str) -> bool:
+        """Full queue: turn away the newest lower-priority waiter to make room."""
+        for lower in reversed(PRIORITIES[PRIORITIES.index(priority) + 1:]):
+            if self._waiters[lower]:
+                self._waiters[lower].pop().set_exception(self._overloaded(lower, "shed"))
+                return True
+        return False
+
+    async def acquire(self, priority: str) -> None:
+        stats = self._stats[priority]
+        if self._can_start(priority):
+            self.in_flight += 1
+            stats["admitted"] += 1
+            return
+        if self._queued() >= settings.ADMISSION_QUEUE_SIZE and not self._shed_below(priority):
+            raise self._overloaded(priority, "rejected")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(future)
+        stats["queued"] += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), settings.ADMISSION_QUEUE_TIMEOUT_SECONDS)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Slot granted just as we gave up: hand it over
+                self.release()
+            else:
+                future.cancel()
+                self._waiters[priority].remove(future)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise self._overloaded(priority, "timed_out")
+        finally:
+            stats["wait_seconds"] += time.monotonic() - started
+        stats["admitted"] += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        for priority in PRIORITIES:
+            waiters = self._waiters[priority]
+            if waiters and self.in_flight < self._limit(priority):
+                self.in_flight += 1
+                waiters.popleft().set_result(None)
+                return
+            if waiters:
+                # Higher priority waiters block lower ones
+                return
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": settings.ADMISSION_MAX_CONCURRENCY,
+            "queue_depth": {priority: len(self._waiters[priority]) for priority in PRIORITIES},
+            "queue_size": settings.ADMISSION_QUEUE_SIZE,
+            "by_priority": self._stats
+        }
+
+
+admission = AdmissionController()
+
+
+def admit(priority: str):
+    """FastAPI dependency holding an admission slot for the request."""
+    async def dependency():
+        await admission.acquire(priority)
+        try:
+            yield
+        finally:
+            admission.release()
+    return dependency
+
+
+admit_vote = admit(VOTE)
+admit_read = admit(READ)
@@ -39,12 +39,82 @@ class Settings(BaseSettings):
                 return [origin.strip() for origin in v.split(',')]
         return v
     
-    # Crypto
-    CRYPTO_KEY_SIZE: int = 2048
+    # Crypto (ElGamal over the RFC 3526 2048-bit group)
+    CRYPTO_KEY_SIZE: int = 2048  # fixed by the group; kept for existing .env files
+    CRYPTO_FIXED_BASE_WINDOW: int = 6  # bits per digit of the g / h tables (~6 MB each)
+    CRYPTO_TABLE_CACHE_SIZE: int = 16  # election keys whose table is kept per worker
+    CRYPTO_ACCEPT_CLIENT_BALLOTS: bool = True  # accept web client ballots (base64 selections) in ElGamal elections; off once the client sends ElGamal proofs
+    CRYPTO_VERIFY_BATCH_SIZE: int = 500  # ballots per batch proof check (submit micro-batches, board audit)
+    CRYPTO_VERIFY_BATCH_WAIT_MS: int = 5  # longest a submission waits for others to share its proof check
+    CRYPTO_DLOG_BABY_STEPS: int = 1 << 20  # discrete-log table rows (16 MB); one giant step per 2^20 ballots
+    CRYPTO_DLOG_TABLE_PATH: str = ""  # directory of the mmap'ed table; STORAGE_PATH/crypto when empty
+    ELECTION_KEY_POOL_SIZE: int = 20  # ready keypairs kept in Redis for create_election
+    ELECTION_KEY_POOL_REFILL_BATCH: int = 2  # keypairs generated per refill interval, cluster-wide
+    ELECTION_KEY_POOL_REFILL_INTERVAL_SECONDS: int = 10
+    ELECTION_KEY_TRUSTEES: int = 1  # trustees sharing each election key
+    ELECTION_KEY_THRESHOLD: int = 1  # trustee shares needed to decrypt
+    ELECTION_KEY_SEALING_KEY: str = ""  # hex AES-256 key sealing trustee shares; derived from SECRET_KEY when empty
     
     # Storage (IPFS mock for MVP)
-    STORAGE_MODE: str = "local"  # "local" or "ipfs"
+    STORAGE_MODE: str = "local"  # "local" (one file per ballot), "segments" (append-only log) or "ipfs"
     STORAGE_PATH: str = "/app/storage"
+    STORAGE_SEGMENT_MAX_BYTES: int = 256 * 1024 * 1024  # segment rotation size
+    STORAGE_IO_THREADS: int = 8  # thread pool for bulletin board reads/writes
+    STORAGE_FSYNC: str = "none"  # "none", "always" (one fsync per ballot) or "group" (batched)
+    STORAGE_GROUP_COMMIT_WINDOW_MS: int = 0  # extra wait to grow fsync batches
+    
+    # Tally
+    TALLY_MODE: str = "auto"  # "auto" (ballot_choices when backfilled), "python" or "postgres"
+    TALLY_CHECKPOINT_INTERVAL_SECONDS: int = 30
+    TALLY_STREAM_CHUNK_SIZE: int = 5000
+    TALLY_WORKERS: int = 4  # processes used by the CLOSED -> TALLIED tally runner
+    TALLY_PARTITIONS: int = 8  # ballot-id key ranges per tally run
+    
+    # Stats cache
+    STATS_CACHE_SOFT_TTL_SECONDS: int = 60  # older entries are refreshed
+    STATS_CACHE_TTL_SECONDS: int = 3600  # hard expiry
+    STATS_SERVE_STALE: bool = True  # serve stale entries while revalidating
+    STATS_LOCK_TIMEOUT_SECONDS: int = 10
+    
+    # Election metadata cache (per worker)
+    ELECTION_CACHE_SIZE: int = 1024
+    ELECTION_CACHE_TTL_SECONDS: int = 300  # bound on staleness if an invalidation is lost
+    
+    # Ballot ingestion
+    BALLOT_INGEST_MODE: str = "direct"  # "direct" (one transaction per ballot) or "queued" (write-behind)
+    BALLOT_INGEST_BATCH_SIZE: int = 500
+    BALLOT_INGEST_FLUSH_INTERVAL_MS: int = 100  # max wait for a batch to fill
+    BALLOT_INGEST_CLAIM_IDLE_MS: int = 30000  # reclaim entries left pending by a dead worker
+    BALLOT_INGEST_MIN_REPLICAS: int = 0  # WAIT for this many Redis replicas before acknowledging
+    BALLOT_INGEST_WAIT_MS: int = 100
+    
+    # Admission control (per worker; keep max concurrency below the DB pool size)
+    ADMISSION_MAX_CONCURRENCY: int = 12
+    ADMISSION_RESERVED_FOR_VOTES: int = 4  # slots admin reads can never take
+    ADMISSION_QUEUE_SIZE: int = 100
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    ADMISSION_RETRY_AFTER_SECONDS: int = 2
+    
+    # Bulletin board Merkle tree
+    MERKLE_SEQUENCE_BATCH_SIZE: int = 1000  # ballots appended per locked pass (<= 4000: bind parameter cap)
+    MERKLE_SEQUENCE_INTERVAL_MS: int = 200  # sequencer loop period (submit only marks the election dirty)
+    MERKLE_SEQUENCE_ELECTIONS_PER_PASS: int = 100  # dirty elections popped per sequencer pass
+    BULLETIN_SIGNING_KEY: str = ""  # hex Ed25519 seed; derived from SECRET_KEY when empty
+    
+    # Public bulletin board feed (NDJSON)
+    BOARD_FEED_PAGE_SIZE: int = 100000  # default and max ballots per request
+    BOARD_FEED_SETTLE_SECONDS: int = 60  # only ballots older than this are served
+    BOARD_FEED_MAX_STREAMS: int = 2  # concurrent feed streams per worker (one DB connection each)
+    
+    # Tracking-code verification
+    VERIFY_BLOOM_BITS: int = 1 << 27  # all elections (16 MB); ~0.2% false positives at 10M ballots
+    VERIFY_BLOOM_HASHES: int = 7
+    VERIFY_CACHE_SIZE: int = 10000  # recent positive answers kept per worker
+    VERIFY_CACHE_TTL_SECONDS: int = 30  # also bounds the age of cached Merkle roots
+    
+    # Live results (SSE)
+    LIVE_UPDATES_MAX_PER_SECOND: float = 2.0  # coalesced pushes per election
+    LIVE_UPDATES_HEARTBEAT_SECONDS: int = 15
     
     # Email
     MAIL_ENABLED: bool = True
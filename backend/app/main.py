@@ -1,4 +1,4 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import ORJSONResponse
 from slowapi import Limiter
@@ -6,7 +6,21 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from fastapi.exceptions import RequestValidationError
 from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.redis import close_redis
+from app.core.admission import admission
 from app.api.v1 import auth, elections, ballots, magic_links
+from app.api.v1.dependencies import get_current_admin_user
+from app.services.tally_service import tally_service
+from app.services.tally_runner import shutdown_executor
+from app.services.storage_service import shutdown_storage
+from app.services.live_updates_service import live_updates
+from app.services.ballot_ingest_service import ballot_ingest
+from app.services.election_cache_service import election_cache
+from app.services.merkle_service import merkle_board
+from app.services.tracking_code_service import tracking_filter
+from app.services.key_pool_service import key_pool
+import asyncio
 import logging
 
 # Configure logging for production
@@ -62,6 +76,55 @@ app.include_router(ballots.router, prefix=f"{settings.API_V1_PREFIX}/ballots", t
 app.include_router(magic_links.router, prefix=f"{settings.API_V1_PREFIX}/magic-links", tags=["magic-links"])
 
 
+async def _build_tracking_filter():
+    """Rebuild the tracking-code filters if Redis does not have them."""
+    try:
+        async with SessionLocal() as db:
+            await tracking_filter.ensure_built(db)
+    except Exception as e:
+        logger.error("[VERIFY] Tracking-code filter rebuild error: %s", e)
+
+
+async def _tally_checkpoint_loop():
+    """Periodically persist running tally counters, sequence leftover ballots and check the verify filters."""
+    while True:
+        await asyncio.sleep(settings.TALLY_CHECKPOINT_INTERVAL_SECONDS)
+        try:
+            async with SessionLocal() as db:
+                await tally_service.checkpoint_dirty(db)
+        except Exception as e:
+            logger.error("[TALLY] Checkpoint loop error: %s", e)
+        try:
+            async with SessionLocal() as db:
+                await merkle_board.sequence_pending(db)
+        except Exception as e:
+            logger.error("[MERKLE] Sequencing sweep error: %s", e)
+        await _build_tracking_filter()
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    app.state.background_tasks = [
+        asyncio.create_task(_tally_checkpoint_loop()),
+        asyncio.create_task(election_cache.listen()),
+        asyncio.create_task(_build_tracking_filter()),
+        asyncio.create_task(key_pool.run()),
+        asyncio.create_task(merkle_board.run())
+    ]
+    if settings.BALLOT_INGEST_MODE == "queued":
+        app.state.background_tasks.append(asyncio.create_task(ballot_ingest.run()))
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in getattr(app.state, "background_tasks", []):
+        task.cancel()
+    shutdown_executor()
+    shutdown_storage()
+    await live_updates.close()
+    await close_redis()
+
+
 @app.get("/")
 def root():
     return {"message": "NovaVote API", "version": settings.VERSION}
@@ -70,3 +133,9 @@ def root():
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+
+@app.get("/metrics/admission", dependencies=[Depends(get_current_admin_user)])
+def admission_metrics():
+    """Queue depth and admission counters of this worker (admin only)."""
+    return admission.metrics()
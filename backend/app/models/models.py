@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Boolean, Text, JSON, Integer, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, String, DateTime, Boolean, Text, JSON, Integer, BigInteger, SmallInteger, LargeBinary, ForeignKey, Index, Enum as SQLEnum, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -36,6 +36,7 @@ class Election(Base):
     description = Column(Text)
     admin_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     public_key = Column(JSON, nullable=False)  # ElGamal public key
+    sealed_trustee_shares = Column(Text)  # JSON list of AES-GCM sealed trustee shares (key_pool_service)
     status = Column(SQLEnum(ElectionStatus), default=ElectionStatus.DRAFT)
     start_date = Column(DateTime)
     end_date = Column(DateTime)
@@ -67,6 +68,19 @@ class Trustee(Base):
 
 class Ballot(Base):
     __tablename__ = "ballots"
+    __table_args__ = (
+        # One ballot per magic-link voter; enforced by the INSERT ... ON CONFLICT in submit_ballot
+        Index("uq_ballots_election_id_voter_email", "election_id", "voter_email", unique=True,
+              postgresql_where=text("voter_email IS NOT NULL")),
+        # Keyset order of the public bulletin board feed
+        Index("ix_ballots_election_id_timestamp_id", "election_id", "timestamp", "id"),
+        # Ballots still to backfill into ballot_choices (TALLY_MODE=auto probe)
+        Index("ix_ballots_election_id_unmaterialized", "election_id",
+              postgresql_where=text("NOT choices_materialized")),
+        # Ballots waiting for the Merkle sequencer, in append order
+        Index("ix_ballots_election_id_unsequenced", "election_id", "timestamp", "id",
+              postgresql_where=text("leaf_index IS NULL")),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     election_id = Column(UUID(as_uuid=True), ForeignKey("elections.id"), nullable=False)
@@ -77,8 +91,51 @@ class Ballot(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
     voter_fingerprint = Column(String(64), index=True)  # Anonymous unique identifier
     voter_email = Column(String(255))  # Voter email for confirmation (optional)
+    choices_materialized = Column(Boolean, default=False, nullable=False)  # ballot_choices rows written
+    leaf_index = Column(BigInteger)  # position in the election Merkle tree, NULL until sequenced
+    proof_verified = Column(Boolean, default=False, nullable=False)  # ElGamal proof checked: may enter the encrypted tally
 
     election = relationship("Election", back_populates="ballots")
+    choices = relationship("BallotChoice", back_populates="ballot", cascade="all, delete-orphan")
+
+
+class BallotChoice(Base):
+    """Decoded selections of a ballot, one row per (question, option)."""
+    __tablename__ = "ballot_choices"
+    __table_args__ = (
+        Index("ix_ballot_choices_election_question_option", "election_id", "question_idx", "option_idx"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    ballot_id = Column(UUID(as_uuid=True), ForeignKey("ballots.id", ondelete="CASCADE"), nullable=False, index=True)
+    election_id = Column(UUID(as_uuid=True), ForeignKey("elections.id"), nullable=False)
+    question_idx = Column(SmallInteger, nullable=False)
+    option_idx = Column(SmallInteger, nullable=False)
+    rank = Column(SmallInteger)  # 1-based position for ranking questions, NULL otherwise
+
+    ballot = relationship("Ballot", back_populates="choices")
+
+
+class MerkleTree(Base):
+    """Right frontier and signed head of an election's bulletin board tree."""
+    __tablename__ = "merkle_trees"
+
+    election_id = Column(UUID(as_uuid=True), ForeignKey("elections.id"), primary_key=True)
+    size = Column(BigInteger, nullable=False, default=0)
+    frontier = Column(JSON, nullable=False)  # hex hash per level, null where the size bit is 0
+    root_hash = Column(String(64))
+    signature = Column(String(128))  # Ed25519 over the tree head
+    signed_at = Column(DateTime)
+
+
+class MerkleNode(Base):
+    """Completed node of a bulletin board tree (level 0 = leaves)."""
+    __tablename__ = "merkle_nodes"
+
+    election_id = Column(UUID(as_uuid=True), ForeignKey("elections.id"), primary_key=True)
+    level = Column(SmallInteger, primary_key=True)
+    idx = Column(BigInteger, primary_key=True)
+    hash = Column(LargeBinary, nullable=False)
 
 
 class Result(Base):
@@ -88,8 +145,11 @@ class Result(Base):
     election_id = Column(UUID(as_uuid=True), ForeignKey("elections.id"), unique=True, nullable=False)
     aggregated_encrypted = Column(JSON)  # Aggregated encrypted ballots
     decrypted_result = Column(JSON)  # Final plaintext results
+    result_hash = Column(String(64))  # sha256 of the canonical decrypted_result
     proofs = Column(JSON)  # Correctness proofs
     tally_log = Column(JSON)  # Audit trail
+    running_tally = Column(JSON)  # Checkpoint of the live per-option counters
+    running_tally_at = Column(DateTime)
     finalized_at = Column(DateTime)
 
     election = relationship("Election", back_populates="result")
@@ -124,6 +124,10 @@ class BallotResponse(BaseModel):
         return self.tracking_code
 
 
+class PartialDecryptions(BaseModel):
+    partial_decryptions: List[Dict[str, Any]]  # CryptoEngine.partial_decrypt output of each trustee
+
+
 # Magic Link schemas
 class AccessLinkRequest(BaseModel):
     election_id: UUID4
@@ -0,0 +1,359 @@
+"""
+Write-behind ballot ingestion (BALLOT_INGEST_MODE=queued).
+submit_ballot validates the ballot (proof included, see proof_batcher_service),
+appends it to a Redis stream and answers with its tracking code; a background
+flusher inserts queued ballots into Postgres in multi-row batches.
+
+Durability guarantees:
+- A ballot is acknowledged only after XADD returned, i.e. once it is in Redis
+  memory and in the AOF. With `appendfsync everysec` (docker-compose) a crash
+  of the Redis host can lose up to ~1 s of acknowledged ballots; run Redis with
+  `appendfsync always` for no loss, and set BALLOT_INGEST_MIN_REPLICAS to also
+  wait for replicas (WAIT) before acknowledging.
+- Stream entries are only XACK'ed after the Postgres COMMIT. Entries left
+  pending by a dead worker are reclaimed after BALLOT_INGEST_CLAIM_IDLE_MS.
+- Inserts are idempotent (ballot id generated at enqueue, ON CONFLICT DO
+  NOTHING), so a batch replayed after a crash never duplicates ballots.
+- One ballot per voter email: the enqueue script checks the election's voter
+  set atomically with the XADD. The set is seeded once from Postgres and every
+  stored ballot (direct or queued) adds its voter, so it answers for every
+  voter, not only those who went through the queue. A ballot that still loses
+  the (election_id, voter_email) race at insert time is rejected, not dropped.
+- Entries that cannot be inserted (e.g. election deleted) go to a dead-letter
+  stream instead of blocking the queue, and their tracking code is recorded
+  as rejected, with the reason, for the verify endpoint.
+- Closing an election first marks it closed in Redis (the enqueue script
+  refuses it from then on), then drains the queue before the results are
+  frozen: the snapshot covers every acknowledged ballot and nothing more.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.redis import get_redis
+from app.models.models import Ballot, BallotChoice, Election
+from app.services.email_service import email_service
+from app.services.tally_service import tally_service
+from app.services.stats_cache_service import stats_cache
+from app.services.live_updates_service import live_updates
+from app.services.merkle_service import merkle_board
+from app.services.tracking_code_service import tracking_filter
+
+logger = logging.getLogger(__name__)
+
+STREAM = "ballots:ingest"
+DEAD_LETTER_STREAM = "ballots:ingest:dead"
+GROUP = "ballot-writers"
+PENDING_KEY = "ballots:ingest:pending"  # tracking_code -> queued ballot summary
+REJECTED_KEY = "ballots:ingest:rejected"  # tracking_code -> {reason, timestamp} of dead-lettered ballots
+REJECTED_TTL_SECONDS = 30 * 24 * 3600
+VOTERS_KEY = "election:{election_id}:voters"
+VOTERS_SEEDED_KEY = "election:{election_id}:voters:seeded"  # VOTERS_KEY holds every stored voter
+VOTERS_PER_SADD = 5000
+CLOSED_KEY = "election:{election_id}:closed"  # no more ballots queued for this election
+CHOICE_ROWS_PER_INSERT = 5000
+
+# Reject a second ballot for the same voter email even before the first one is
+# flushed, then append to the stream, atomically. 0: voter set not seeded yet,
+# -1: election closed.
+_ENQUEUE = """
+if redis.call('EXISTS', KEYS[5]) == 1 then
+    return -1
+end
+if ARGV[2] ~= '' then
+    if redis.call('EXISTS', KEYS[4]) == 0 then
+        return 0
+    end
+    if redis.call('SADD', KEYS[2], ARGV[2]) == 0 then
+        return false
+    end
+end
+redis.call('HSET', KEYS[3], ARGV[3], ARGV[4])
+return redis.call('XADD', KEYS[1], '*', 'ballot', ARGV[1])
+"""
+
+
+class DuplicateVoteError(Exception):
+    pass
+
+
+class ElectionClosedError(Exception):
+    pass
+
+
+class BallotIngest:
+    def __init__(self):
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._group_ready = False
+        self._flush_lock = asyncio.Lock()
+
+    async def enqueue(self, ballot: Dict[str, Any]) -> None:
+        """Durably queue a validated ballot. Raises DuplicateVoteError, ElectionClosedError."""
+        redis = await get_redis()
+        summary = json.dumps({"id": ballot["id"], "timestamp": ballot["timestamp"], "ipfs_hash": ballot["ipfs_hash"]})
+        election_id = ballot["election_id"]
+        keys = (STREAM, VOTERS_KEY.format(election_id=election_id), PENDING_KEY,
+                VOTERS_SEEDED_KEY.format(election_id=election_id), CLOSED_KEY.format(election_id=election_id))
+        args = (json.dumps(ballot), ballot.get("voter_email") or "", ballot["tracking_code"], summary)
+        entry_id = await redis.eval(_ENQUEUE, 5, *keys, *args)
+        if entry_id == 0:
+            await self._seed_voters(redis, election_id)
+            entry_id = await redis.eval(_ENQUEUE, 5, *keys, *args)
+        if entry_id == -1:
+            raise ElectionClosedError()
+        if entry_id is None:
+            raise DuplicateVoteError()
+        if settings.BALLOT_INGEST_MIN_REPLICAS:
+            replicas = await redis.execute_command("WAIT", settings.BALLOT_INGEST_MIN_REPLICAS, settings.BALLOT_INGEST_WAIT_MS)
+            if int(replicas) < settings.BALLOT_INGEST_MIN_REPLICAS:
+                logger.warning("[INGEST] Ballot %s acknowledged by %s replica(s) only", ballot["tracking_code"], replicas)
+
+    @staticmethod
+    async def _seed_voters(redis, election_id: str) -> None:
+        """Load the voter emails already stored for an election into its voter set."""
+        async with SessionLocal() as db:
+            emails = (await db.execute(
+                select(Ballot.voter_email).where(Ballot.election_id == uuid.UUID(election_id), Ballot.voter_email.isnot(None))
+            )).scalars().all()
+        voters_key = VOTERS_KEY.format(election_id=election_id)
+        for start in range(0, len(emails), VOTERS_PER_SADD):
+            await redis.sadd(voters_key, *emails[start:start + VOTERS_PER_SADD])
+        await redis.set(VOTERS_SEEDED_KEY.format(election_id=election_id), 1)
+        logger.info("[INGEST] Voter set of %s seeded with %d voters", election_id, len(emails))
+
+    async def remember_voter(self, election_id, voter_email: str) -> None:
+        """Add a voter stored by the direct path to the election's voter set."""
+        try:
+            redis = await get_redis()
+            await redis.sadd(VOTERS_KEY.format(election_id=election_id), voter_email)
+        except Exception as e:
+            logger.warning("[INGEST] Could not record voter of %s: %s", election_id, e)
+
+    async def pending(self, tracking_code: str) -> Optional[Dict[str, Any]]:
+        """Summary of a ballot still waiting in the queue."""
+        try:
+            redis = await get_redis()
+            summary = await redis.hget(PENDING_KEY, tracking_code)
+        except Exception:
+            return None
+        return json.loads(summary) if summary else None
+
+    async def rejected(self, tracking_code: str) -> Optional[Dict[str, Any]]:
+        """Reason a queued ballot was dead-lettered instead of stored."""
+        try:
+            redis = await get_redis()
+            entry = await redis.hget(REJECTED_KEY, tracking_code)
+        except Exception:
+            return None
+        return json.loads(entry) if entry else None
+
+    async def oldest_pending(self) -> Optional[datetime]:
+        """Enqueue time of the oldest ballot not yet written to Postgres (stream ids are ms timestamps)."""
+        redis = await get_redis()
+        entries = await redis.xrange(STREAM, count=1)
+        if not entries:
+            return None
+        return datetime.utcfromtimestamp(int(entries[0][0].split("-")[0]) / 1000)
+
+    async def close_election(self, election_id) -> None:
+        """Refuse further ballots for an election; call before draining the queue."""
+        redis = await get_redis()
+        await redis.set(CLOSED_KEY.format(election_id=election_id), 1)
+
+    async def reopen_election(self, election_id) -> None:
+        try:
+            redis = await get_redis()
+            await redis.delete(CLOSED_KEY.format(election_id=election_id))
+        except Exception as e:
+            logger.warning("[INGEST] Could not reopen the queue of %s: %s", election_id, e)
+
+    async def discard_election(self, election_id) -> None:
+        try:
+            redis = await get_redis()
+            await redis.delete(
+                VOTERS_KEY.format(election_id=election_id),
+                VOTERS_SEEDED_KEY.format(election_id=election_id),
+                CLOSED_KEY.format(election_id=election_id)
+            )
+        except Exception:
+            pass
+
+    async def _ensure_group(self, redis) -> None:
+        if self._group_ready:
+            return
+        try:
+            await redis.xgroup_create(STREAM, GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    async def run(self) -> None:
+        """Background flusher."""
+        while True:
+            try:
+                flushed = await self.flush_once(block_ms=settings.BALLOT_INGEST_FLUSH_INTERVAL_MS)
+                if not flushed:
+                    await self.flush_once(claim_idle_ms=settings.BALLOT_INGEST_CLAIM_IDLE_MS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("[INGEST] Flush error: %s", e)
+                await asyncio.sleep(1)
+
+    async def drain(self) -> None:
+        """Flush everything queued, including entries pending on other workers."""
+        while await self.flush_once() or await self.flush_once(claim_idle_ms=0):
+            pass
+
+    async def flush_once(self, block_ms: Optional[int] = None, claim_idle_ms: Optional[int] = None) -> int:
+        """Insert one batch of stream entries; returns the number of entries handled."""
+        redis = await get_redis()
+        await self._ensure_group(redis)
+        count = settings.BALLOT_INGEST_BATCH_SIZE
+        if claim_idle_ms is None:
+            response = await redis.xreadgroup(GROUP, self.consumer, {STREAM: ">"}, count=count, block=block_ms)
+            entries = response[0][1] if response else []
+        else:
+            _, entries, *_ = await redis.xautoclaim(STREAM, GROUP, self.consumer, claim_idle_ms, "0-0", count=count)
+        entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+        if not entries:
+            return 0
+        async with self._flush_lock:
+            await self._flush(redis, entries)
+        return len(entries)
+
+    async def _flush(self, redis, entries: List[Tuple[str, Dict[str, str]]]) -> None:
+        pairs = [(entry, json.loads(entry[1]["ballot"])) for entry in entries]
+        reasons: Dict[str, str] = {}
+        async with SessionLocal() as db:
+            election_ids = {uuid.UUID(b["election_id"]) for _, b in pairs}
+            existing = {
+                str(election_id) for election_id in
+                (await db.execute(select(Election.id).where(Election.id.in_(election_ids)))).scalars()
+            }
+            rejected = [(entry, b) for entry, b in pairs if b["election_id"] not in existing]
+            accepted = [(entry, b) for entry, b in pairs if b["election_id"] in existing]
+            for _, ballot in rejected:
+                reasons[ballot["id"]] = "election not found"
+            try:
+                inserted, duplicates = await self._insert(db, [b for _, b in accepted])
+                await db.commit()
+            except (IntegrityError, DataError) as e:
+                # Un bulletin invalide ne doit pas bloquer le lot: on réessaie un par un.
+                # Toute autre erreur (base indisponible) laisse le lot en attente.
+                await db.rollback()
+                logger.warning("[INGEST] Batch insert failed (%s), retrying row by row", e)
+                inserted, duplicates = set(), set()
+                for entry, ballot in accepted:
+                    try:
+                        row_inserted, row_duplicates = await self._insert(db, [ballot])
+                        await db.commit()
+                        inserted |= row_inserted
+                        duplicates |= row_duplicates
+                    except (IntegrityError, DataError) as row_error:
+                        await db.rollback()
+                        rejected.append((entry, ballot))
+                        reasons[ballot["id"]] = "invalid ballot"
+                        logger.error("[INGEST] Ballot %s rejected: %s", ballot["tracking_code"], row_error)
+            for entry, ballot in accepted:
+                if ballot["id"] in duplicates:
+                    rejected.append((entry, ballot))
+                    reasons[ballot["id"]] = "already voted"
+                    logger.error("[INGEST] Ballot %s rejected: voter already voted", ballot["tracking_code"])
+
+        stored = [ballot["tracking_code"] for _, ballot in accepted if ballot["id"] in inserted]
+        now = datetime.utcnow().isoformat()
+        async with redis.pipeline(transaction=True) as pipe:
+            # Filtre des codes avant de retirer les bulletins de la table pending
+            tracking_filter.add_to_pipeline(pipe, stored)
+            for (_, fields), ballot in rejected:
+                pipe.xadd(DEAD_LETTER_STREAM, fields)
+                pipe.hset(REJECTED_KEY, ballot["tracking_code"], json.dumps({"reason": reasons[ballot["id"]], "timestamp": now}))
+            if rejected:
+                pipe.expire(REJECTED_KEY, REJECTED_TTL_SECONDS)
+            entry_ids = [entry_id for entry_id, _ in entries]
+            pipe.xack(STREAM, GROUP, *entry_ids)
+            pipe.xdel(STREAM, *entry_ids)
+            pipe.hdel(PENDING_KEY, *[b["tracking_code"] for _, b in pairs])
+            await pipe.execute()
+
+        await self._after_commit([b for _, b in accepted if b["id"] in inserted])
+        logger.info("[INGEST] Flushed %d ballots (%d rejected)", len(inserted), len(rejected))
+
+    @staticmethod
+    async def _insert(db, ballots: List[Dict[str, Any]]) -> Tuple[set, set]:
+        """Multi-row INSERT of ballots and their ballot_choices.
+
+        Returns (inserted ids, ids that conflicted with another ballot of the
+        same voter). Ids already stored by a replayed batch are in neither.
+        """
+        if not ballots:
+            return set(), set()
+        rows = [{
+            "id": uuid.UUID(b["id"]),
+            "election_id": uuid.UUID(b["election_id"]),
+            "encrypted_ballot": b["encrypted_ballot"],
+            "proof": b["proof"],
+            "tracking_code": b["tracking_code"],
+            "ipfs_hash": b["ipfs_hash"],
+            "timestamp": datetime.fromisoformat(b["timestamp"]),
+            "voter_fingerprint": b["voter_fingerprint"],
+            "voter_email": b["voter_email"],
+            "choices_materialized": True,
+            "proof_verified": b.get("proof_verified", False)
+        } for b in ballots]
+        # No conflict target: covers both the primary key (replay) and the
+        # unique (election_id, voter_email) index (second ballot of a voter)
+        result = await db.execute(
+            pg_insert(Ballot).values(rows).on_conflict_do_nothing().returning(Ballot.id)
+        )
+        inserted = {str(ballot_id) for ballot_id in result.scalars()}
+        conflicted = {row["id"] for row in rows if str(row["id"]) not in inserted}
+        replayed = set()
+        if conflicted:
+            replayed = {
+                str(ballot_id) for ballot_id in
+                (await db.execute(select(Ballot.id).where(Ballot.id.in_(conflicted)))).scalars()
+            }
+        choice_rows = [
+            {"ballot_id": uuid.UUID(b["id"]), "election_id": uuid.UUID(b["election_id"]),
+             "question_idx": q_idx, "option_idx": o_idx, "rank": rank}
+            for b in ballots if b["id"] in inserted
+            for q_idx, o_idx, rank in b["choices"]
+        ]
+        # asyncpg caps a statement at 32767 bind parameters
+        for start in range(0, len(choice_rows), CHOICE_ROWS_PER_INSERT):
+            await db.execute(pg_insert(BallotChoice).values(choice_rows[start:start + CHOICE_ROWS_PER_INSERT]))
+        return inserted, {str(ballot_id) for ballot_id in conflicted} - replayed
+
+    @staticmethod
+    async def _after_commit(ballots: List[Dict[str, Any]]) -> None:
+        """Same side effects as the direct path, once per election for the counters."""
+        by_election: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for ballot in ballots:
+            by_election[ballot["election_id"]].append(ballot)
+        for election_id, election_ballots in by_election.items():
+            credited = await tally_service.record_batch(election_id, [b["choices"] for b in election_ballots])
+            await stats_cache.invalidate(election_id)
+            for fields in credited:
+                await live_updates.publish_ballot(election_id, fields)
+            await merkle_board.notify(election_id)
+            for ballot in election_ballots:
+                if ballot["voter_email"]:
+                    asyncio.create_task(email_service.send_vote_confirmation(
+                        ballot["voter_email"], ballot["election_title"], election_id, ballot["tracking_code"]
+                    ))
+
+
+ballot_ingest = BallotIngest()
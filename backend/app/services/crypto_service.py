@@ -1,75 +1,704 @@
 """
-Placeholder crypto engine for ElGamal encryption and Zero-Knowledge Proofs.
-In production, replace with proper implementations using pycryptodome, py-ecc, or zksk.
+Crypto engine: exponential ElGamal over the RFC 3526 2048-bit MODP group.
+A value m is encrypted in the exponent, Enc(m) = (g^r, g^m h^r), so multiplying
+ciphertexts adds the plaintexts: per-option counts are aggregated without
+decrypting a single ballot, then decrypted jointly by the trustees.
+Every election reuses the same two bases (g and its key h): exponentiations by
+them go through windowed fixed-base tables, built once and cached per election
+key. A ballot proves that each ciphertext encrypts 0 or 1 and that each
+question has an allowed number of selections. Ballots of the current web
+client (base64 selections, placeholder proofs) are accepted in ElGamal
+elections while CRYPTO_ACCEPT_CLIENT_BALLOTS is on (default, until the client
+encrypts and proves its ballots); they never enter the encrypted tally and an
+ElGamal ballot always needs a valid proof. Decrypted totals (g^count) are
+turned back into counts by a baby-step giant-step table shared by all workers.
 """
-import json
+import fcntl
 import hashlib
-from typing import Dict, Any
-from Crypto.PublicKey import RSA
+import os
+import secrets
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core.config import settings
+
+# RFC 3526 group 14: p = 2^2048 - 2^1984 - 1 + 2^64 * (floor(2^1918 * pi) + 124476), a safe prime
+P = int(
+    "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD129024E088A67CC74"
+    "020BBEA63B139B22514A08798E3404DDEF9519B3CD3A431B302B0A6DF25F1437"
+    "4FE1356D6D51C245E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+    "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3DC2007CB8A163BF05"
+    "98DA48361C55D39A69163FA8FD24CF5F83655D23DCA3AD961C62F356208552BB"
+    "9ED529077096966D670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B"
+    "E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9DE2BCBF695581718"
+    "3995497CEA956AE515D2261898FA051015728E5A8AACAA68FFFFFFFFFFFFFFFF",
+    16
+)
+Q = (P - 1) // 2  # prime order of the subgroup generated by G (2 is a quadratic residue mod P)
+G = 2
+G_INV = pow(G, -1, P)
+GROUP = "modp2048"
+CHALLENGE_BITS = 256  # Fiat-Shamir challenges; keeps the variable-base exponents short
+BATCH_BITS = 64  # random weights of batch verification: a bad proof passes with probability 2^-64
+PROOF_TYPE = "disjunctive_chaum_pedersen"
+
+Ciphertext = Tuple[int, int]
+# (a, b, [(plaintext j, A, B, c, v) per branch]) of a parsed membership proof
+Statement = Tuple[int, int, List[Tuple[int, int, int, int, int]]]
+
+
+class FixedBase:
+    """Windowed fixed-base exponentiation: table[i][d] = base^(d * 2^(w*i)) mod P.
+
+    An exponentiation is then one multiplication per non-zero w-bit digit of
+    the exponent, instead of ~1.5 per bit for square-and-multiply.
+    """
+
+    def __init__(self, base: int, window: int):
+        self.window = window
+        self._mask = (1 << window) - 1
+        self._table: List[List[int]] = []
+        step = base
+        for _ in range((Q.bit_length() + window - 1) // window):
+            row = [1] * (1 << window)
+            for digit in range(1, 1 << window):
+                row[digit] = row[digit - 1] * step % P
+            self._table.append(row)
+            step = row[-1] * step % P
+
+    def pow(self, exponent: int) -> int:
+        exponent %= Q
+        result = 1
+        for row in self._table:
+            if not exponent:
+                break
+            digit = exponent & self._mask
+            if digit:
+                result = result * row[digit] % P
+            exponent >>= self.window
+        return result
+
+
+@lru_cache(maxsize=1)
+def _g_table() -> FixedBase:
+    return FixedBase(G, settings.CRYPTO_FIXED_BASE_WINDOW)
+
+
+@lru_cache(maxsize=settings.CRYPTO_TABLE_CACHE_SIZE)
+def _h_table(h: int) -> FixedBase:
+    return FixedBase(h, settings.CRYPTO_FIXED_BASE_WINDOW)
+
+
+def g_pow(exponent: int) -> int:
+    return _g_table().pow(exponent)
+
+
+def h_pow(public_key: Dict[str, Any], exponent: int) -> int:
+    return _h_table(int(public_key["h"])).pow(exponent)
+
+
+def _random_exponent() -> int:
+    return secrets.randbelow(Q - 1) + 1
+
+
+def _challenge(*values: int) -> int:
+    digest = hashlib.sha256("|".join(str(v) for v in values).encode()).digest()
+    return int.from_bytes(digest, "big") % (1 << CHALLENGE_BITS)
+
+
+def _jacobi(a: int, n: int) -> int:
+    result = 1
+    a %= n
+    while a:
+        # Strip all factors of 2 at once: (2/n) = -1 iff n = 3, 5 mod 8
+        zeros = (a & -a).bit_length() - 1
+        a >>= zeros
+        if zeros & 1 and n & 7 in (3, 5):
+            result = -result
+        a, n = n, a
+        if a & 3 == 3 and n & 3 == 3:
+            result = -result
+        a %= n
+    return result if n == 1 else 0
+
+
+def is_group_element(value: int) -> bool:
+    """Member of the order-Q subgroup: the quadratic residues mod the safe prime P."""
+    return 0 < value < P and _jacobi(value, P) == 1
+
+
+def _to_ciphertext(data: Dict[str, Any]) -> Ciphertext:
+    return int(data["a"]), int(data["b"])
+
+
+def _from_ciphertext(ciphertext: Ciphertext) -> Dict[str, str]:
+    return {"a": str(ciphertext[0]), "b": str(ciphertext[1])}
+
+
+def _lagrange_at_zero(index: int, indices: Sequence[int]) -> int:
+    numerator, denominator = 1, 1
+    for other in indices:
+        if other != index:
+            numerator = numerator * other % Q
+            denominator = denominator * (other - index) % Q
+    return numerator * pow(denominator, -1, Q) % Q
+
+
+def _row_product(row: List[Dict[str, Any]]) -> Ciphertext:
+    """Encryption of a question's number of selections: product of its ciphertexts."""
+    a, b = 1, 1
+    for ct in row:
+        a, b = a * int(ct["a"]) % P, b * int(ct["b"]) % P
+    return a, b
+
+
+def allowed_sums(question: Dict[str, Any]) -> List[int]:
+    """Numbers of selected options a valid answer can have: exactly one for
+    single choice (blank vote is an option), any number otherwise."""
+    if question.get("type", "single") == "single":
+        return [1]
+    return list(range(len(question.get("options", [])) + 1))
+
+
+def multi_exp(pairs: Sequence[Tuple[int, int]]) -> int:
+    """Product of base^exponent mod P (Pippenger's bucket method).
+
+    Each c-bit window costs one multiplication per base plus 2^(c+1) for the
+    buckets, so thousands of bases share the squarings.
+    """
+    if not pairs:
+        return 1
+    max_bits = max(exponent.bit_length() for _, exponent in pairs)
+    window = min(max(len(pairs).bit_length() - 3, 1), 12)
+    mask = (1 << window) - 1
+    result = 1
+    for shift in range((max_bits - 1) // window * window, -1, -window):
+        for _ in range(window if result != 1 else 0):
+            result = result * result % P
+        buckets = [1] * (mask + 1)
+        for base, exponent in pairs:
+            digit = (exponent >> shift) & mask
+            if digit:
+                buckets[digit] = buckets[digit] * base % P
+        # sum of digit * bucket[digit], as running products from the top digit down
+        running, window_value = 1, 1
+        for digit in range(mask, 0, -1):
+            if buckets[digit] != 1:
+                running = running * buckets[digit] % P
+            if running != 1:
+                window_value = window_value * running % P
+        result = result * window_value % P
+    return result
+
+
+class DiscreteLogTable:
+    """Baby-step giant-step solver for g^m = value, 0 <= m <= max_value.
+
+    The baby steps g^0 .. g^(size - 1) are stored as (low 64 bits, exponent)
+    rows sorted by fingerprint in a .npy file, built once by whichever process
+    needs it first and then mapped read-only: every worker shares the same
+    pages, 16 bytes per baby step. A lookup costs one multiplication and one
+    binary search per `size` of range, so a million-ballot total takes one step.
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+        self._giant = pow(G_INV, size, P)  # g^-size
+        self._table: Optional[np.ndarray] = None
+
+    def _build(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # other processes wait for this build
+            if os.path.exists(self.path):
+                return
+            fingerprints = np.empty(self.size, dtype=np.uint64)
+            value = 1
+            for j in range(self.size):
+                fingerprints[j] = value & 0xFFFFFFFFFFFFFFFF
+                value <<= 1  # G = 2
+                if value >= P:
+                    value -= P
+            order = np.argsort(fingerprints, kind="stable")
+            table = np.stack([fingerprints[order], order.astype(np.uint64)], axis=1)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, table)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    def _load(self) -> np.ndarray:
+        if self._table is None:
+            if not os.path.exists(self.path):
+                self._build()
+            self._table = np.load(self.path, mmap_mode="r")
+        return self._table
+
+    def solve(self, value: int, max_value: int) -> int:
+        table = self._load()
+        fingerprints = table[:, 0]
+        current = value
+        for step in range(max_value // self.size + 1):
+            fingerprint = np.uint64(current & 0xFFFFFFFFFFFFFFFF)
+            k = int(np.searchsorted(fingerprints, fingerprint))
+            # Equal fingerprints are checked in full: the answer is always exact
+            while k < self.size and fingerprints[k] == fingerprint:
+                candidate = step * self.size + int(table[k, 1])
+                if candidate <= max_value and g_pow(candidate) == value:
+                    return candidate
+                k += 1
+            current = current * self._giant % P
+        raise ValueError("Plaintext out of range")
+
+
+@lru_cache(maxsize=1)
+def _dlog_table() -> DiscreteLogTable:
+    size = settings.CRYPTO_DLOG_BABY_STEPS
+    path = settings.CRYPTO_DLOG_TABLE_PATH or os.path.join(settings.STORAGE_PATH, "crypto")
+    return DiscreteLogTable(os.path.join(path, f"bsgs-{GROUP}-{size}.npy"), size)
+
+
+def _discrete_log(value: int, max_value: int) -> int:
+    """m such that g^m = value, 0 <= m <= max_value."""
+    return _dlog_table().solve(value, max_value)
 
 
 class CryptoEngine:
     @staticmethod
-    def generate_keypair(key_size: int = 2048) -> Dict[str, Any]:
-        """Generate RSA keypair for encryption."""
-        key = RSA.generate(key_size)
-        
-        # Export public key components
+    def is_elgamal(public_key: Optional[Dict[str, Any]]) -> bool:
+        return bool(public_key) and public_key.get("scheme") == "elgamal"
+
+    @staticmethod
+    def generate_keypair(threshold: int = 1, trustees: int = 1) -> Dict[str, Any]:
+        """Election key, Shamir-shared between trustees (any `threshold` of them decrypt)."""
+        if not 1 <= threshold <= trustees:
+            raise ValueError("threshold must be between 1 and the number of trustees")
+        coefficients = [_random_exponent() for _ in range(threshold)]
+
+        def share(index: int) -> int:
+            value = 0
+            for coefficient in reversed(coefficients):
+                value = (value * index + coefficient) % Q
+            return value
+
+        shares = [share(index) for index in range(1, trustees + 1)]
         public_key = {
-            "n": str(key.n),  # modulus
-            "e": str(key.e)   # public exponent
+            "scheme": "elgamal",
+            "group": GROUP,
+            "g": str(G),
+            "h": str(g_pow(coefficients[0])),
+            "threshold": threshold,
+            "shares": [str(g_pow(x)) for x in shares]  # public verification key of each trustee
         }
-        
-        # In production, store private_key securely (HSM, KMS, encrypted storage)
-        # For this demo, we just acknowledge it exists but don't return it
+        # The election secret x = coefficients[0] is dropped here: only the trustee shares leave
         return {
             "public_key": public_key,
-            "private_key": {
-                "d": str(key.d),  # private exponent
-                "p": str(key.p),  # prime 1
-                "q": str(key.q)   # prime 2
-            }
+            "trustee_shares": [{"index": index, "x": str(x)} for index, x in enumerate(shares, start=1)]
         }
 
     @staticmethod
-    def encrypt_ballot(ballot_data: Dict[str, Any], public_key: Dict[str, Any]) -> Dict[str, Any]:
-        """Encrypt ballot using ElGamal (placeholder)."""
-        ciphertext = json.dumps(ballot_data)
+    def encrypt(m: int, public_key: Dict[str, Any], nonce: Optional[int] = None) -> Ciphertext:
+        r = nonce if nonce is not None else _random_exponent()
+        return g_pow(r), g_pow(m) * h_pow(public_key, r) % P
+
+    @staticmethod
+    def reencrypt(ciphertext: Ciphertext, public_key: Dict[str, Any], nonce: Optional[int] = None) -> Ciphertext:
+        """Same plaintext, fresh randomness: multiply by an encryption of 0."""
+        r = nonce if nonce is not None else _random_exponent()
+        return ciphertext[0] * g_pow(r) % P, ciphertext[1] * h_pow(public_key, r) % P
+
+    @staticmethod
+    def encrypt_ballot(ballot_data: Dict[str, Any], public_key: Dict[str, Any]) -> Tuple[Dict[str, Any], List[List[int]]]:
+        """Encrypt {"selections": [[0/1 per option] per question]}.
+
+        Returns the encrypted ballot and the nonces, which only the encrypting
+        side keeps (generate_zkp needs them).
+        """
+        nonces = [[_random_exponent() for _ in question] for question in ballot_data["selections"]]
+        ciphertexts = [
+            [_from_ciphertext(CryptoEngine.encrypt(m, public_key, r)) for m, r in zip(question, question_nonces)]
+            for question, question_nonces in zip(ballot_data["selections"], nonces)
+        ]
+        return {"scheme": "elgamal", "ciphertexts": ciphertexts}, nonces
+
+    @staticmethod
+    def _prove_member(
+        m: int,
+        allowed: Sequence[int],
+        nonce: int,
+        ciphertext: Ciphertext,
+        public_key: Dict[str, Any],
+        statement: Sequence[int] = ()
+    ) -> Tuple[List[int], List[int], List[int], List[int]]:
+        """CDS proof that the ciphertext encrypts one of `allowed`, without telling which.
+
+        One Chaum-Pedersen branch per allowed value, all but the real one
+        simulated; returns the commitments A, B, challenges c and responses v.
+        """
+        if m not in allowed:
+            raise ValueError(f"{m} is not an allowed plaintext")
+        a, b = ciphertext
+        h = int(public_key["h"])
+        A, B, c, v = [], [], [], []
+        w = _random_exponent()
+        for j in allowed:
+            if j == m:
+                A.append(g_pow(w))
+                B.append(h_pow(public_key, w))
+                c.append(0)
+                v.append(0)
+                continue
+            c_fake = secrets.randbits(CHALLENGE_BITS)
+            v_fake = _random_exponent()
+            b_j = b * pow(G_INV, j, P) % P
+            A.append(g_pow(v_fake) * pow(pow(a, c_fake, P), -1, P) % P)
+            B.append(h_pow(public_key, v_fake) * pow(pow(b_j, c_fake, P), -1, P) % P)
+            c.append(c_fake)
+            v.append(v_fake)
+        real = list(allowed).index(m)
+        total = _challenge(h, a, b, *statement, *(x for pair in zip(A, B) for x in pair))
+        c[real] = (total - sum(c)) % (1 << CHALLENGE_BITS)
+        v[real] = (w + c[real] * nonce) % Q
+        return A, B, c, v
+
+    @staticmethod
+    def prove_bit(m: int, nonce: int, ciphertext: Ciphertext, public_key: Dict[str, Any]) -> Dict[str, str]:
+        """CDS proof that the ciphertext encrypts 0 or 1, without telling which."""
+        if m not in (0, 1):
+            raise ValueError("Only 0/1 selections can be proven")
+        (A0, A1), (B0, B1), (c0, c1), (v0, v1) = CryptoEngine._prove_member(m, (0, 1), nonce, ciphertext, public_key)
+        return {key: str(value) for key, value in
+                dict(A0=A0, B0=B0, A1=A1, B1=B1, c0=c0, c1=c1, v0=v0, v1=v1).items()}
+
+    @staticmethod
+    def prove_sum(
+        m: int,
+        allowed: Sequence[int],
+        nonce: int,
+        ciphertext: Ciphertext,
+        public_key: Dict[str, Any]
+    ) -> Dict[str, List[str]]:
+        """Proof that the product of a question's ciphertexts encrypts an allowed number of selections."""
+        A, B, c, v = CryptoEngine._prove_member(m, allowed, nonce, ciphertext, public_key, allowed)
+        return {"A": [str(x) for x in A], "B": [str(x) for x in B],
+                "c": [str(x) for x in c], "v": [str(x) for x in v]}
+
+    @staticmethod
+    def _parse_member(
+        ciphertext: Ciphertext,
+        allowed: Sequence[int],
+        A: List[int], B: List[int], c: List[int], v: List[int],
+        h: int,
+        statement: Sequence[int] = ()
+    ) -> Optional[Statement]:
+        """Statement of a membership proof once the cheap checks pass (ranges, group membership, challenge).
+
+        Challenge shares must be reduced (< 2^CHALLENGE_BITS) and responses
+        lie in [0, Q): with unreduced shares the branch equations can be met
+        for any plaintext while the shares still sum to the hash.
+        """
+        a, b = ciphertext
+        if not len(A) == len(B) == len(c) == len(v) == len(allowed):
+            return None
+        if not all(0 <= x < (1 << CHALLENGE_BITS) for x in c) or not all(0 <= x < Q for x in v):
+            return None
+        if not all(is_group_element(x) for x in (a, b, *A, *B)):
+            return None
+        if sum(c) % (1 << CHALLENGE_BITS) != _challenge(h, a, b, *statement, *(x for pair in zip(A, B) for x in pair)):
+            return None
+        return a, b, list(zip(allowed, A, B, c, v))
+
+    @staticmethod
+    def _parse_bit(ciphertext: Dict[str, Any], proof: Dict[str, str], h: int) -> Optional[Statement]:
+        A0, B0, A1, B1, c0, c1, v0, v1 = (int(proof[key]) for key in ("A0", "B0", "A1", "B1", "c0", "c1", "v0", "v1"))
+        return CryptoEngine._parse_member(_to_ciphertext(ciphertext), (0, 1), [A0, A1], [B0, B1], [c0, c1], [v0, v1], h)
+
+    @staticmethod
+    def _parse_sum(ciphertext: Ciphertext, allowed: Sequence[int], proof: Dict[str, List[str]], h: int) -> Optional[Statement]:
+        A, B, c, v = ([int(x) for x in proof[key]] for key in ("A", "B", "c", "v"))
+        return CryptoEngine._parse_member(ciphertext, allowed, A, B, c, v, h, allowed)
+
+    @staticmethod
+    def _check_statement(statement: Statement, public_key: Dict[str, Any]) -> bool:
+        """Every branch: g^v = A a^c and h^v = B (b / g^j)^c."""
+        a, b, branches = statement
+        for j, A, B, c, v in branches:
+            b_j = b * pow(G_INV, j, P) % P
+            if g_pow(v) != A * pow(a, c, P) % P or h_pow(public_key, v) != B * pow(b_j, c, P) % P:
+                return False
+        return True
+
+    @staticmethod
+    def verify_bit(ciphertext: Ciphertext, proof: Dict[str, str], public_key: Dict[str, Any]) -> bool:
+        statement = CryptoEngine._parse_bit(_from_ciphertext(ciphertext), proof, int(public_key["h"]))
+        return statement is not None and CryptoEngine._check_statement(statement, public_key)
+
+    @staticmethod
+    def _combined_check(statements: List[Statement], public_key: Dict[str, Any]) -> bool:
+        """Both equations of every branch, weighted by random 64-bit d, as one equation.
+
+        g^v = A a^c and h^v g^(jc) = B b^c become g^(sum) h^(sum) = product of
+        A, B, a, b powers, evaluated with two fixed-base exponentiations and two
+        multi-exponentiations.
+        """
+        e_g, e_h = 0, 0
+        short, long = [], []
+        for a, b, branches in statements:
+            e_a, e_b = 0, 0
+            for j, A, B, c, v in branches:
+                d1, d2 = secrets.randbits(BATCH_BITS), secrets.randbits(BATCH_BITS)
+                e_g += d1 * v + d2 * j * c
+                e_h += d2 * v
+                e_a += d1 * c
+                e_b += d2 * c
+                short += [(A, d1), (B, d2)]
+            long += [(a, e_a), (b, e_b)]
+        return g_pow(e_g) * h_pow(public_key, e_h) % P == multi_exp(short) * multi_exp(long) % P
+
+    @staticmethod
+    def _ballot_statements(
+        encrypted_ballot: Dict[str, Any],
+        proof: Dict[str, Any],
+        public_key: Dict[str, Any],
+        questions: List[Dict[str, Any]]
+    ) -> Optional[List[Statement]]:
+        """Every bit proof plus one sum proof per question; None when a cheap check fails."""
+        if encrypted_ballot.get("scheme") != "elgamal":
+            return None
+        ciphertexts, proofs, sums = encrypted_ballot["ciphertexts"], proof["proofs"], proof["sums"]
+        if not len(ciphertexts) == len(proofs) == len(sums) == len(questions):
+            return None
+        h = int(public_key["h"])
+        statements = []
+        for question, row, row_proofs, sum_proof in zip(questions, ciphertexts, proofs, sums):
+            if not len(row) == len(row_proofs) == len(question.get("options", [])):
+                return None
+            for ct, bit_proof in zip(row, row_proofs):
+                statement = CryptoEngine._parse_bit(ct, bit_proof, h)
+                if statement is None:
+                    return None
+                statements.append(statement)
+            statement = CryptoEngine._parse_sum(_row_product(row), allowed_sums(question), sum_proof, h)
+            if statement is None:
+                return None
+            statements.append(statement)
+        return statements
+
+    @staticmethod
+    def generate_zkp(
+        ballot_data: Dict[str, Any],
+        public_key: Dict[str, Any],
+        encrypted_ballot: Dict[str, Any],
+        nonces: List[List[int]],
+        questions: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Proof of ballot validity: every ciphertext encrypts 0 or 1, and every
+        question has an allowed number of selections (allowed_sums)."""
+        sums = []
+        for question, selections, row_nonces, row in zip(
+            questions, ballot_data["selections"], nonces, encrypted_ballot["ciphertexts"]
+        ):
+            sums.append(CryptoEngine.prove_sum(
+                sum(selections), allowed_sums(question), sum(row_nonces) % Q, _row_product(row), public_key
+            ))
         return {
-            "c1": "ciphertext_part1_placeholder",
-            "c2": "ciphertext_part2_placeholder",
-            "plaintext_hash": hashlib.sha256(ciphertext.encode()).hexdigest()
+            "proof_type": PROOF_TYPE,
+            "proofs": [
+                [CryptoEngine.prove_bit(m, r, _to_ciphertext(ct), public_key)
+                 for m, r, ct in zip(question, question_nonces, question_ciphertexts)]
+                for question, question_nonces, question_ciphertexts
+                in zip(ballot_data["selections"], nonces, encrypted_ballot["ciphertexts"])
+            ],
+            "sums": sums
         }
 
     @staticmethod
-    def generate_zkp(ballot_data: Dict[str, Any], public_key: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate Zero-Knowledge Proof of ballot validity (placeholder)."""
+    def _unproven(encrypted_ballot: Dict[str, Any], proof: Dict[str, Any], public_key: Dict[str, Any]) -> Optional[bool]:
+        """Verdict on a ballot that carries no ElGamal proof to check; None when it does."""
+        elgamal_ballot = isinstance(encrypted_ballot, dict) and encrypted_ballot.get("scheme") == "elgamal"
+        if not CryptoEngine.is_elgamal(public_key):
+            # Legacy election key: only plaintext web client ballots make sense
+            return not elgamal_ballot
+        if not isinstance(proof, dict) or proof.get("proof_type") != PROOF_TYPE:
+            # Web client ballots (base64 selections, placeholder proofs) only when allowed
+            return not elgamal_ballot and settings.CRYPTO_ACCEPT_CLIENT_BALLOTS
+        return None
+
+    @staticmethod
+    def has_real_proof(encrypted_ballot: Dict[str, Any], proof: Dict[str, Any], public_key: Dict[str, Any]) -> bool:
+        """True when verifying the ballot takes exponentiations (worth a process pool)."""
+        return CryptoEngine._unproven(encrypted_ballot, proof, public_key) is None
+
+    @staticmethod
+    def verify_zkp(
+        encrypted_ballot: Dict[str, Any],
+        proof: Dict[str, Any],
+        public_key: Dict[str, Any],
+        questions: List[Dict[str, Any]]
+    ) -> bool:
+        """Verify Zero-Knowledge Proof of ballot validity."""
+        verdict = CryptoEngine._unproven(encrypted_ballot, proof, public_key)
+        if verdict is not None:
+            return verdict
+        try:
+            statements = CryptoEngine._ballot_statements(encrypted_ballot, proof, public_key, questions)
+            return statements is not None and all(
+                CryptoEngine._check_statement(statement, public_key) for statement in statements
+            )
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return False
+
+    @staticmethod
+    def verify_zkp_batch(
+        items: Sequence[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any], List[Dict[str, Any]]]]
+    ) -> List[bool]:
+        """verify_zkp for many (encrypted_ballot, proof, public_key, questions) at once.
+
+        The proofs of each election key are checked together with a
+        small-exponent random linear combination; when it fails, bisection over
+        the ballots finds the bad ones. Same answers as verify_zkp, except with
+        probability 2^-64 per failing combination. Only statements that passed
+        _parse_member (reduced challenges and responses) enter a combination:
+        the weighted equation is only sound for those.
+        """
+        results = [False] * len(items)
+        by_key: Dict[str, List[Tuple[int, List[Statement]]]] = {}
+        for position, (encrypted_ballot, proof, public_key, questions) in enumerate(items):
+            verdict = CryptoEngine._unproven(encrypted_ballot, proof, public_key)
+            if verdict is not None:
+                results[position] = verdict
+                continue
+            try:
+                statements = CryptoEngine._ballot_statements(encrypted_ballot, proof, public_key, questions)
+            except (KeyError, TypeError, ValueError, AttributeError):
+                statements = None
+            if statements is not None:
+                results[position] = True
+                by_key.setdefault(public_key["h"], []).append((position, statements))
+
+        def bisect(ballots: List[Tuple[int, List[Statement]]], public_key: Dict[str, Any]) -> None:
+            if CryptoEngine._combined_check([s for _, statements in ballots for s in statements], public_key):
+                return
+            if len(ballots) == 1:
+                results[ballots[0][0]] = False
+                return
+            middle = len(ballots) // 2
+            bisect(ballots[:middle], public_key)
+            bisect(ballots[middle:], public_key)
+
+        for h, ballots in by_key.items():
+            bisect(ballots, {"h": h})
+        return results
+
+    @staticmethod
+    def empty_aggregate(questions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Aggregate of no ballot: Enc(0) with nonce 0, (1, 1), for every option."""
         return {
-            "commitment": "commitment_placeholder",
-            "challenge": "challenge_placeholder",
-            "response": "response_placeholder",
-            "proof_type": "schnorr_placeholder"
+            "scheme": "elgamal",
+            "ciphertexts": [[_from_ciphertext((1, 1)) for _ in q.get("options", [])] for q in questions],
+            "count": 0
         }
 
     @staticmethod
-    def verify_zkp(encrypted_ballot: Dict[str, Any], proof: Dict[str, Any], public_key: Dict[str, Any]) -> bool:
-        """Verify Zero-Knowledge Proof (placeholder)."""
-        # In production: actual cryptographic verification
-        return True
+    def aggregate_ballots(ballots: list, aggregated: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Homomorphic aggregation: componentwise product of the ballots' ciphertexts.
 
-    @staticmethod
-    def aggregate_ballots(ballots: list) -> Dict[str, Any]:
-        """Homomorphic aggregation of encrypted ballots (placeholder)."""
+        Continues from `aggregated` (an earlier result) when given, so a running
+        tally only multiplies in the new ballots.
+        """
+        ciphertexts: Optional[List[List[Ciphertext]]] = None
+        count = 0
+        if aggregated is not None:
+            ciphertexts = [[_to_ciphertext(ct) for ct in question] for question in aggregated["ciphertexts"]]
+            count = aggregated["count"]
+        for ballot in ballots:
+            current = [[_to_ciphertext(ct) for ct in question] for question in ballot["ciphertexts"]]
+            count += 1
+            if ciphertexts is None:
+                ciphertexts = current
+                continue
+            ciphertexts = [
+                [(a1 * a2 % P, b1 * b2 % P) for (a1, b1), (a2, b2) in zip(question, other)]
+                for question, other in zip(ciphertexts, current)
+            ]
         return {
-            "aggregated_c1": "aggregated_ciphertext_part1",
-            "aggregated_c2": "aggregated_ciphertext_part2",
-            "count": len(ballots)
+            "scheme": "elgamal",
+            "ciphertexts": [[_from_ciphertext(ct) for ct in question] for question in ciphertexts or []],
+            "count": count
         }
 
     @staticmethod
-    def threshold_decrypt(aggregated: Dict[str, Any], trustee_shares: list) -> Dict[str, Any]:
-        """Threshold decryption using Shamir's Secret Sharing (placeholder)."""
+    def partial_decrypt(aggregated: Dict[str, Any], trustee_share: Dict[str, Any]) -> Dict[str, Any]:
+        """One trustee's share of the decryption, with Chaum-Pedersen proofs of correctness."""
+        index, x = trustee_share["index"], int(trustee_share["x"])
+        public_share = g_pow(x)
+        partials, proofs = [], []
+        for question in aggregated["ciphertexts"]:
+            question_partials, question_proofs = [], []
+            for ct in question:
+                a = int(ct["a"])
+                partial = pow(a, x, P)
+                w = _random_exponent()
+                A, B = g_pow(w), pow(a, w, P)
+                c = _challenge(public_share, a, partial, A, B)
+                question_partials.append(str(partial))
+                question_proofs.append({"A": str(A), "B": str(B), "v": str((w + c * x) % Q)})
+            partials.append(question_partials)
+            proofs.append(question_proofs)
+        return {"index": index, "partials": partials, "proofs": proofs}
+
+    @staticmethod
+    def _verify_partial(a: int, partial: int, public_share: int, proof: Dict[str, str]) -> bool:
+        A, B, v = int(proof["A"]), int(proof["B"]), int(proof["v"])
+        c = _challenge(public_share, a, partial, A, B)
+        return g_pow(v) == A * pow(public_share, c, P) % P and pow(a, v, P) == B * pow(partial, c, P) % P
+
+    @staticmethod
+    def threshold_decrypt(
+        aggregated: Dict[str, Any],
+        trustee_shares: list,
+        public_key: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Combine partial decryptions (Lagrange interpolation in the exponent).
+
+        trustee_shares: partial_decrypt outputs of at least `threshold` distinct
+        trustees. Their proofs are checked against the trustees' public shares
+        when the election public key is given. Raises ValueError on a duplicate
+        or out-of-range trustee index, or too few shares.
+        """
+        indices = [share["index"] for share in trustee_shares]
+        # Lagrange coefficients are only defined for distinct, non-zero indices
+        trustees = len(public_key["shares"]) if public_key is not None else Q - 1
+        for index in indices:
+            if not isinstance(index, int) or isinstance(index, bool) or not 1 <= index <= trustees:
+                raise ValueError(f"Invalid trustee index {index!r}")
+        if len(set(indices)) != len(indices):
+            raise ValueError("Duplicate trustee shares")
+        threshold = public_key.get("threshold", 1) if public_key is not None else 1
+        if len(indices) < threshold:
+            raise ValueError(f"Not enough trustee shares: {len(indices)} of {threshold}")
+        if public_key is not None:
+            for share in trustee_shares:
+                public_share = int(public_key["shares"][share["index"] - 1])
+                for question, partials, proofs in zip(aggregated["ciphertexts"], share["partials"], share["proofs"]):
+                    for ct, partial, proof in zip(question, partials, proofs):
+                        if not CryptoEngine._verify_partial(int(ct["a"]), int(partial), public_share, proof):
+                            raise ValueError(f"Invalid partial decryption from trustee {share['index']}")
+
+        coefficients = {index: _lagrange_at_zero(index, indices) for index in indices}
+        counts = []
+        for q_idx, question in enumerate(aggregated["ciphertexts"]):
+            row = []
+            for o_idx, ct in enumerate(question):
+                combined = 1
+                for share in trustee_shares:
+                    combined = combined * pow(int(share["partials"][q_idx][o_idx]), coefficients[share["index"]], P) % P
+                g_m = int(ct["b"]) * pow(combined, -1, P) % P
+                row.append(_discrete_log(g_m, aggregated["count"]))
+            counts.append(row)
         return {
-            "decrypted_result": {"option_a": 10, "option_b": 15},
-            "proof_of_decryption": "decryption_proof_placeholder"
+            "decrypted_result": counts,
+            "proof_of_decryption": [{"index": share["index"], "proofs": share["proofs"]} for share in trustee_shares]
         }
@@ -0,0 +1,136 @@
+"""
+Per-worker election metadata cache for the voter hot path.
+Holds a slim view of each election (no voter_emails) in an LRU with a TTL.
+Admin changes publish the election id on a Redis channel; every worker drops
+its copy when the message arrives. The TTL only bounds staleness if a message
+is lost (the listener also clears everything after a reconnection).
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.models.models import Election, ElectionStatus
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "elections:invalidate"
+
+
+@dataclass(frozen=True)
+class ElectionView:
+    """Election columns needed by voter endpoints. Shared between requests: read-only."""
+    id: uuid.UUID
+    title: str
+    description: Optional[str]
+    admin_id: uuid.UUID
+    public_key: Dict[str, Any]
+    status: ElectionStatus
+    start_date: Optional[datetime]
+    end_date: Optional[datetime]
+    questions: List[Dict[str, Any]]
+    created_at: datetime
+    updated_at: datetime
+
+
+_VIEW_COLUMNS = [getattr(Election, name) for name in ElectionView.__dataclass_fields__]
+
+
+class ElectionCache:
+    def __init__(self):
+        self._entries: "OrderedDict[uuid.UUID, Tuple[float, ElectionView]]" = OrderedDict()
+        self._stale_loads: Set[uuid.UUID] = set()  # invalidated while being loaded
+        self._inflight: Dict[uuid.UUID, asyncio.Future] = {}
+
+    async def get(self, db: AsyncSession, election_id) -> Optional[ElectionView]:
+        election_id = uuid.UUID(str(election_id))
+        entry = self._entries.get(election_id)
+        if entry is not None and time.monotonic() - entry[0] < settings.ELECTION_CACHE_TTL_SECONDS:
+            self._entries.move_to_end(election_id)
+            return entry[1]
+
+        inflight = self._inflight.get(election_id)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[election_id] = future
+        try:
+            row = (await db.execute(select(*_VIEW_COLUMNS).where(Election.id == election_id))).one_or_none()
+            view = ElectionView(*row) if row else None
+            # Invalidé pendant la lecture: ne pas mettre en cache une vue périmée
+            if view is not None and election_id not in self._stale_loads:
+                self._put(election_id, view)
+            future.set_result(view)
+            return view
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._inflight.pop(election_id, None)
+            self._stale_loads.discard(election_id)
+
+    def _put(self, election_id: uuid.UUID, view: ElectionView) -> None:
+        self._entries[election_id] = (time.monotonic(), view)
+        self._entries.move_to_end(election_id)
+        while len(self._entries) > settings.ELECTION_CACHE_SIZE:
+            self._entries.popitem(last=False)
+
+    def _drop(self, election_id: uuid.UUID) -> None:
+        self._entries.pop(election_id, None)
+        if election_id in self._inflight:
+            self._stale_loads.add(election_id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._stale_loads.update(self._inflight)
+
+    async def invalidate(self, election_id) -> None:
+        """Drop an election everywhere (status or content changed, deleted)."""
+        election_id = uuid.UUID(str(election_id))
+        self._drop(election_id)
+        try:
+            redis = await get_redis()
+            await redis.publish(INVALIDATION_CHANNEL, str(election_id))
+        except Exception as e:
+            logger.warning("[CACHE] Failed to publish invalidation for %s: %s", election_id, e)
+
+    async def listen(self) -> None:
+        """Background task: apply invalidations published by any worker."""
+        while True:
+            pubsub = None
+            try:
+                redis = await get_redis()
+                pubsub = redis.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Messages may have been missed while disconnected
+                self.clear()
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self._drop(uuid.UUID(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("[CACHE] Invalidation listener error: %s", e)
+                self.clear()
+                await asyncio.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+
+
+election_cache = ElectionCache()
@@ -0,0 +1,129 @@
+"""
+Encrypted running tally.
+The ElGamal ciphertexts of accepted ballots are multiplied, per (question,
+option), into results.aggregated_encrypted as the bulletin board sequences
+them: same transaction and same election lock as the Merkle append, so every
+ballot is folded exactly once and the aggregate always covers the first
+`size` leaves of the tree. Only ballots stored with proof_verified (their
+proof passed verify_zkp / verify_zkp_batch) are multiplied in. Closing an
+election only catches up the last batch; the trustees then decrypt the
+aggregate, never a single ballot.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.models import Ballot, Election, Result
+from app.services.crypto_service import CryptoEngine
+
+logger = logging.getLogger(__name__)
+
+
+def _fits(questions: List[Dict[str, Any]], encrypted_ballot: Any) -> bool:
+    """ElGamal ballot with one ciphertext per option of every question."""
+    if not isinstance(encrypted_ballot, dict) or encrypted_ballot.get("scheme") != "elgamal":
+        return False
+    ciphertexts = encrypted_ballot.get("ciphertexts")
+    return (
+        isinstance(ciphertexts, list)
+        and len(ciphertexts) == len(questions)
+        and all(
+            isinstance(row, list) and len(row) == len(question.get("options", []))
+            for row, question in zip(ciphertexts, questions)
+        )
+    )
+
+
+class EncryptedTally:
+    @staticmethod
+    async def _locked_result(db: AsyncSession, election_id: uuid.UUID) -> Result:
+        await db.execute(
+            pg_insert(Result).values(id=uuid.uuid4(), election_id=election_id)
+            .on_conflict_do_nothing(index_elements=["election_id"])
+        )
+        return (await db.execute(
+            select(Result).where(Result.election_id == election_id)
+            .with_for_update().execution_options(populate_existing=True)
+        )).scalar_one()
+
+    @staticmethod
+    async def _recompute(db: AsyncSession, election_id: uuid.UUID, questions: List[Dict[str, Any]], size: int) -> Dict[str, Any]:
+        """Aggregate of leaves [0, size) from the ballots table (first fold after an upgrade)."""
+        aggregated = CryptoEngine.empty_aggregate(questions)
+        stream = await db.stream(
+            select(Ballot.encrypted_ballot)
+            .where(Ballot.election_id == election_id, Ballot.leaf_index < size, Ballot.proof_verified.is_(True))
+            .execution_options(yield_per=settings.TALLY_STREAM_CHUNK_SIZE)
+        )
+        async for chunk in stream.scalars().partitions():
+            aggregated = CryptoEngine.aggregate_ballots([b for b in chunk if _fits(questions, b)], aggregated)
+        return aggregated
+
+    async def fold(self, db: AsyncSession, election_id: uuid.UUID, size: int, encrypted_ballots: List[Any]) -> None:
+        """Multiply the ballots appended at leaves [size, size + n) into the aggregate (caller commits).
+
+        encrypted_ballots: one entry per leaf, None for ballots without a verified proof.
+        """
+        election = (await db.execute(
+            select(Election.public_key, Election.questions).where(Election.id == election_id)
+        )).one_or_none()
+        if election is None or not CryptoEngine.is_elgamal(election.public_key):
+            return
+        result = await self._locked_result(db, election_id)
+        aggregated = result.aggregated_encrypted
+        if aggregated is None or aggregated.get("size") != size:
+            aggregated = await self._recompute(db, election_id, election.questions, size)
+        aggregated = CryptoEngine.aggregate_ballots(
+            [b for b in encrypted_ballots if b is not None and _fits(election.questions, b)], aggregated
+        )
+        result.aggregated_encrypted = {**aggregated, "size": size + len(encrypted_ballots)}
+
+    @staticmethod
+    async def read(db: AsyncSession, election_id) -> Optional[Dict[str, Any]]:
+        result = await db.execute(
+            select(Result.aggregated_encrypted).where(Result.election_id == uuid.UUID(str(election_id)))
+        )
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def decrypt(db: AsyncSession, election: Election, partial_decryptions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Combine the trustees' partial decryptions of the aggregate and record the counts.
+
+        Raises ValueError when there is no aggregate or a share does not verify.
+        """
+        result = (await db.execute(select(Result).where(Result.election_id == election.id))).scalar_one_or_none()
+        if result is None or result.aggregated_encrypted is None:
+            raise ValueError("No encrypted tally for this election")
+        aggregated = result.aggregated_encrypted
+        try:
+            decrypted = await asyncio.to_thread(
+                CryptoEngine.threshold_decrypt, aggregated, partial_decryptions, election.public_key
+            )
+        except (KeyError, IndexError, TypeError) as e:
+            raise ValueError(f"Malformed partial decryption: {e}")
+        result.proofs = {
+            **(result.proofs or {}),
+            "threshold_decryption": {
+                "ballots": aggregated["count"],
+                "tree_size": aggregated["size"],
+                "counts": decrypted["decrypted_result"],
+                "partial_decryptions": partial_decryptions
+            }
+        }
+        result.tally_log = (result.tally_log or []) + [{
+            "event": "threshold_decryption",
+            "timestamp": datetime.utcnow().isoformat(),
+            "ballots": aggregated["count"],
+            "trustees": sorted(share["index"] for share in partial_decryptions)
+        }]
+        await db.commit()
+        logger.info("[TALLY] %s: encrypted tally of %d ballots decrypted", election.id, aggregated["count"])
+        return {"ballots": aggregated["count"], "counts": decrypted["decrypted_result"]}
+
+
+encrypted_tally = EncryptedTally()
@@ -0,0 +1,109 @@
+"""
+Pool of pre-generated election keypairs.
+create_election pops a ready keypair from a Redis list (O(1)) instead of
+generating one on the event loop. Keypairs are generated in the tally process
+pool by one worker at a time, at most ELECTION_KEY_POOL_REFILL_BATCH per
+ELECTION_KEY_POOL_REFILL_INTERVAL_SECONDS. The election secret is dropped once
+split between ELECTION_KEY_TRUSTEES trustees, and each trustee share is sealed
+(AES-256-GCM) on its own: the pool, and the election row that finally receives
+it, never hold the election secret, nor a share in clear.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Tuple
+from Crypto.Cipher import AES
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.services.crypto_service import CryptoEngine
+from app.services.tally_runner import _get_executor
+
+logger = logging.getLogger(__name__)
+
+POOL_KEY = "keys:pool"
+REFILL_LOCK_KEY = "keys:pool:refill"
+
+
+def _sealing_key() -> bytes:
+    if settings.ELECTION_KEY_SEALING_KEY:
+        return bytes.fromhex(settings.ELECTION_KEY_SEALING_KEY)
+    return hashlib.sha256(b"novavote-election-keys:" + settings.SECRET_KEY.encode()).digest()
+
+
+def seal(share: Dict[str, Any]) -> str:
+    cipher = AES.new(_sealing_key(), AES.MODE_GCM)
+    ciphertext, tag = cipher.encrypt_and_digest(json.dumps(share).encode())
+    return base64.b64encode(cipher.nonce + tag + ciphertext).decode()
+
+
+def unseal(sealed: str) -> Dict[str, Any]:
+    """One sealed trustee share. Raises ValueError if tampered with."""
+    data = base64.b64decode(sealed)
+    cipher = AES.new(_sealing_key(), AES.MODE_GCM, nonce=data[:16])
+    return json.loads(cipher.decrypt_and_verify(data[32:], data[16:32]))
+
+
+def unseal_share(sealed_shares: str, index: int) -> Dict[str, Any]:
+    """Share of trustee `index` (1-based) only; the other shares stay sealed."""
+    shares = json.loads(sealed_shares)
+    if not 1 <= index <= len(shares):
+        raise ValueError(f"trustee index must be between 1 and {len(shares)}")
+    return unseal(shares[index - 1])
+
+
+def generate_sealed() -> Tuple[Dict[str, Any], str]:
+    """(public key, sealed trustee shares) of a new keypair. Runs in a worker process."""
+    keypair = CryptoEngine.generate_keypair(settings.ELECTION_KEY_THRESHOLD, settings.ELECTION_KEY_TRUSTEES)
+    return keypair["public_key"], json.dumps([seal(share) for share in keypair["trustee_shares"]])
+
+
+class KeyPool:
+    async def pop(self) -> Tuple[Dict[str, Any], str]:
+        """A ready keypair; generated off the event loop when the pool is empty."""
+        try:
+            redis = await get_redis()
+            entry = await redis.lpop(POOL_KEY)
+            if entry:
+                entry = json.loads(entry)
+                return entry["public_key"], entry["sealed"]
+            logger.warning("[KEYS] Key pool empty, generating a keypair on demand")
+        except Exception as e:
+            logger.warning("[KEYS] Key pool unavailable: %s", e)
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), generate_sealed)
+
+    async def refill(self) -> int:
+        """Top the pool up by at most one batch; returns the keypairs added."""
+        redis = await get_redis()
+        missing = settings.ELECTION_KEY_POOL_SIZE - await redis.llen(POOL_KEY)
+        if missing <= 0:
+            return 0
+        # Never released: one batch per interval across all workers
+        if not await redis.set(REFILL_LOCK_KEY, 1, nx=True, ex=settings.ELECTION_KEY_POOL_REFILL_INTERVAL_SECONDS):
+            return 0
+        loop = asyncio.get_running_loop()
+        keypairs = await asyncio.gather(*[
+            loop.run_in_executor(_get_executor(), generate_sealed)
+            for _ in range(min(missing, settings.ELECTION_KEY_POOL_REFILL_BATCH))
+        ])
+        await redis.rpush(POOL_KEY, *[
+            json.dumps({"public_key": public_key, "sealed": sealed}) for public_key, sealed in keypairs
+        ])
+        return len(keypairs)
+
+    async def run(self) -> None:
+        """Background refill."""
+        while True:
+            try:
+                added = await self.refill()
+                if added:
+                    logger.info("[KEYS] %d keypairs added to the pool", added)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("[KEYS] Key pool refill error: %s", e)
+            await asyncio.sleep(settings.ELECTION_KEY_POOL_REFILL_INTERVAL_SECONDS)
+
+
+key_pool = KeyPool()
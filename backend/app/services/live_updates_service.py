@@ -0,0 +1,171 @@
+"""
+Live election updates (Server-Sent Events).
+Ballot submissions and status changes are published to a per-election Redis
+channel. Each API worker holds a single pub/sub connection, subscribed to the
+channels of elections that have local clients, and fans events out to them.
+Ballot events are coalesced so a client receives at most
+LIVE_UPDATES_MAX_PER_SECOND updates per second; each update carries the deltas
+since the previous one and, when the running tally is seeded, the absolute
+counts read once per flush (clients resynchronise on every update).
+"""
+import asyncio
+import json
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.services.tally_service import tally_service
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "election:{election_id}:events"
+CLIENT_QUEUE_SIZE = 64
+
+
+class _ElectionFeed:
+    """Local clients of one election plus the deltas waiting to be flushed."""
+
+    def __init__(self, election_id: str, questions: List[Dict[str, Any]]):
+        self.election_id = election_id
+        self.questions = questions
+        self.clients: Set[asyncio.Queue] = set()
+        self.pending_ballots = 0
+        self.pending_deltas: Counter = Counter()
+        self.dirty = asyncio.Event()
+        self.flusher: Optional[asyncio.Task] = None
+
+    def broadcast(self, event: Dict[str, Any]) -> None:
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too slow to keep up with deltas: drop it, the browser reconnects
+                # and starts again from a full stats event.
+                self.clients.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def flush_loop(self) -> None:
+        interval = 1 / settings.LIVE_UPDATES_MAX_PER_SECOND
+        while True:
+            await self.dirty.wait()
+            self.dirty.clear()
+            event = {
+                "type": "tally",
+                "new_ballots": self.pending_ballots,
+                "deltas": dict(self.pending_deltas)
+            }
+            self.pending_ballots = 0
+            self.pending_deltas.clear()
+            counters = await tally_service.read_counters(self.election_id, self.questions)
+            if counters:
+                event["counts"], event["votes_received"] = counters
+            self.broadcast(event)
+            await asyncio.sleep(interval)
+
+
+class LiveUpdates:
+    def __init__(self):
+        self._feeds: Dict[str, _ElectionFeed] = {}
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def publish_ballot(self, election_id, fields: List[str]) -> None:
+        """fields: running tally counter fields credited by the ballot."""
+        await self._publish(election_id, {"type": "ballot", "fields": fields})
+
+    async def publish_status(self, election_id, status: str) -> None:
+        await self._publish(election_id, {"type": "status", "status": status})
+
+    async def _publish(self, election_id, event: Dict[str, Any]) -> None:
+        try:
+            redis = await get_redis()
+            await redis.publish(CHANNEL.format(election_id=election_id), json.dumps(event))
+        except Exception as e:
+            logger.warning("[LIVE] Failed to publish to %s: %s", election_id, e)
+
+    async def subscribe(self, election_id: str, questions: List[Dict[str, Any]]) -> asyncio.Queue:
+        """Register a local client; events (or None on eviction) arrive on the queue."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        async with self._lock:
+            feed = self._feeds.get(election_id)
+            if feed is None:
+                # Registered only once subscribed: a Redis error leaves no orphan feed or flusher
+                await self._ensure_pubsub()
+                await self._pubsub.subscribe(CHANNEL.format(election_id=election_id))
+                feed = self._feeds[election_id] = _ElectionFeed(election_id, questions)
+                feed.flusher = asyncio.create_task(feed.flush_loop())
+            feed.clients.add(queue)
+        return queue
+
+    async def unsubscribe(self, election_id: str, queue: asyncio.Queue) -> None:
+        async with self._lock:
+            feed = self._feeds.get(election_id)
+            if feed is None:
+                return
+            feed.clients.discard(queue)
+            if not feed.clients:
+                del self._feeds[election_id]
+                feed.flusher.cancel()
+                try:
+                    await self._pubsub.unsubscribe(CHANNEL.format(election_id=election_id))
+                except Exception:
+                    pass
+
+    async def _ensure_pubsub(self) -> None:
+        if self._pubsub is None:
+            redis = await get_redis()
+            self._pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self) -> None:
+        while self._pubsub is not None:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self._pubsub is None:
+                    return
+                logger.warning("[LIVE] Pub/sub read error: %s", e)
+                await asyncio.sleep(1)
+                continue
+            if message is None or message.get("type") != "message":
+                continue
+            election_id = message["channel"].split(":")[1]
+            feed = self._feeds.get(election_id)
+            if feed is None:
+                continue
+            event = json.loads(message["data"])
+            if event["type"] == "ballot":
+                feed.pending_ballots += 1
+                feed.pending_deltas.update(event["fields"])
+                feed.dirty.set()
+            else:
+                feed.broadcast(event)
+
+    def local_clients(self) -> int:
+        return sum(len(feed.clients) for feed in self._feeds.values())
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        for feed in self._feeds.values():
+            feed.flusher.cancel()
+            for queue in feed.clients:
+                if queue.empty():
+                    queue.put_nowait(None)
+        self._feeds.clear()
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+            self._pubsub = None
+
+
+live_updates = LiveUpdates()
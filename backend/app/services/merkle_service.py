@@ -0,0 +1,404 @@
+"""
+Merkle-tree bulletin board.
+The ballots of each election are the leaves of an append-only Merkle tree
+(RFC 9162 hashing). Appending only needs the right frontier, one pending hash
+per level kept in merkle_trees, so sequencing a ballot is O(log n). Completed
+nodes are written to merkle_nodes, so an inclusion proof is a primary-key
+lookup of O(log n) nodes and never rebuilds the tree; so is a consistency
+proof between two signed heads.
+Submitting a ballot only marks its election dirty (Redis set); every worker
+runs a sequencer loop that pops dirty elections and appends their ballots,
+in (timestamp, id) order, under the election's advisory lock. The periodic
+sweep picks up any ballot left behind. Every pass signs the new root (Ed25519 tree head) and, in
+the same transaction, folds the batch into the encrypted tally.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from Crypto.PublicKey import ECC
+from Crypto.Signature import eddsa
+from sqlalchemy import select, insert, update, delete, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.redis import get_redis
+from app.models.models import Ballot, MerkleNode, MerkleTree
+from app.services.encrypted_tally_service import encrypted_tally
+
+logger = logging.getLogger(__name__)
+
+DIRTY_SET = "merkle:dirty"  # elections with ballots waiting to be sequenced
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+EMPTY_ROOT = hashlib.sha256(b"").digest()
+
+
+def leaf_hash(election_id, tracking_code: str, encrypted_ballot: Dict[str, Any], proof: Dict[str, Any]) -> bytes:
+    """Leaf of a ballot: sha256(0x00 || canonical JSON of what the voter can see)."""
+    data = json.dumps({
+        "election_id": str(election_id),
+        "tracking_code": tracking_code,
+        "encrypted_ballot": encrypted_ballot,
+        "proof": proof
+    }, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(LEAF_PREFIX + data).digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def _fold(hashes: List[bytes]) -> bytes:
+    """Root over consecutive perfect subtrees, left to right (RFC 9162 split rule)."""
+    root = hashes[-1]
+    for left in reversed(hashes[:-1]):
+        root = node_hash(left, root)
+    return root
+
+
+def _subtrees(start: int, end: int) -> List[Tuple[int, int]]:
+    """Aligned perfect subtrees (level, idx) covering leaves [start, end), left to right."""
+    nodes = []
+    while start < end:
+        level = (end - start).bit_length() - 1
+        nodes.append((level, start >> level))
+        start += 1 << level
+    return nodes
+
+
+def _audit_ranges(index: int, size: int) -> List[Tuple[int, int]]:
+    """Leaf ranges whose roots form the audit path of a leaf, bottom-up."""
+    ranges = []
+    lo, hi = 0, size
+    while hi - lo > 1:
+        k = 1 << ((hi - lo - 1).bit_length() - 1)
+        if index < lo + k:
+            ranges.append((lo + k, hi))
+            hi = lo + k
+        else:
+            ranges.append((lo, lo + k))
+            lo += k
+    ranges.reverse()
+    return ranges
+
+
+def _consistency_ranges(old_size: int, size: int) -> List[Tuple[int, int]]:
+    """Leaf ranges whose roots form the consistency proof old_size -> size, bottom-up."""
+    ranges = []
+    lo, hi, m, whole = 0, size, old_size, True
+    while m != hi - lo:
+        k = 1 << ((hi - lo - 1).bit_length() - 1)
+        if m <= k:
+            ranges.append((lo + k, hi))
+            hi = lo + k
+        else:
+            ranges.append((lo, lo + k))
+            lo += k
+            m -= k
+            whole = False
+    if not whole:
+        ranges.append((lo, hi))
+    ranges.reverse()
+    return ranges
+
+
+def _append(frontier: List[Optional[bytes]], size: int, leaf: bytes, nodes: List[Tuple[int, int, bytes]]) -> int:
+    """Add a leaf to the frontier; completed nodes are appended to `nodes`. Returns the new size."""
+    level, idx, current = 0, size, leaf
+    nodes.append((level, idx, current))
+    while size >> level & 1:
+        current = node_hash(frontier[level], current)
+        frontier[level] = None
+        level += 1
+        idx >>= 1
+        nodes.append((level, idx, current))
+    if level == len(frontier):
+        frontier.append(current)
+    else:
+        frontier[level] = current
+    return size + 1
+
+
+def frontier_root(frontier: List[Optional[bytes]]) -> bytes:
+    peaks = [h for h in reversed(frontier) if h is not None]
+    return _fold(peaks) if peaks else EMPTY_ROOT
+
+
+def verify_inclusion(leaf: bytes, index: int, size: int, path: List[bytes], root: bytes) -> bool:
+    """RFC 9162 section 2.1.3.2 inclusion proof check."""
+    if index >= size:
+        return False
+    fn, sn, current = index, size - 1, leaf
+    for sibling in path:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            current = node_hash(sibling, current)
+            while not fn & 1 and fn != 0:
+                fn >>= 1
+                sn >>= 1
+        else:
+            current = node_hash(current, sibling)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and current == root
+
+
+def verify_consistency(old_size: int, size: int, old_root: bytes, root: bytes, path: List[bytes]) -> bool:
+    """RFC 9162 section 2.1.4.2 consistency proof check."""
+    if old_size == size:
+        return not path and old_root == root
+    if old_size == 0:
+        return not path and old_root == EMPTY_ROOT
+    if old_size > size or not path:
+        return False
+    if old_size & (old_size - 1) == 0:
+        path = [old_root] + path
+    fn, sn = old_size - 1, size - 1
+    while fn & 1:
+        fn >>= 1
+        sn >>= 1
+    fr = sr = path[0]
+    for node in path[1:]:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            fr = node_hash(node, fr)
+            sr = node_hash(node, sr)
+            while not fn & 1 and fn != 0:
+                fn >>= 1
+                sn >>= 1
+        else:
+            sr = node_hash(sr, node)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and fr == old_root and sr == root
+
+
+def _lock_key(election_id: uuid.UUID) -> int:
+    return int.from_bytes(election_id.bytes[:8], "big", signed=True)
+
+
+class MerkleBoard:
+    def __init__(self):
+        self._signing_key = None
+
+    def _key(self):
+        if self._signing_key is None:
+            if settings.BULLETIN_SIGNING_KEY:
+                seed = bytes.fromhex(settings.BULLETIN_SIGNING_KEY)
+            else:
+                # Same key in every worker without extra configuration
+                seed = hashlib.sha256(b"novavote-bulletin-board:" + settings.SECRET_KEY.encode()).digest()
+            self._signing_key = ECC.construct(curve="Ed25519", seed=seed)
+        return self._signing_key
+
+    def public_key(self) -> str:
+        return self._key().public_key().export_key(format="raw").hex()
+
+    @staticmethod
+    def tree_head(election_id, size: int, root_hash: str, signed_at: datetime) -> bytes:
+        """Canonical bytes covered by the signature."""
+        return json.dumps({
+            "election_id": str(election_id),
+            "tree_size": size,
+            "root_hash": root_hash,
+            "signed_at": signed_at.isoformat()
+        }, sort_keys=True, separators=(",", ":")).encode()
+
+    def _sign(self, tree: MerkleTree) -> None:
+        tree.signed_at = datetime.utcnow()
+        message = self.tree_head(tree.election_id, tree.size, tree.root_hash, tree.signed_at)
+        tree.signature = eddsa.new(self._key(), "rfc8032").sign(message).hex()
+
+    async def sequence(self, db: AsyncSession, election_id) -> int:
+        """Append the election's unsequenced ballots to its tree; returns how many.
+
+        Returns at once if another worker holds the election lock: that worker
+        (or the sweep) will append our ballots.
+        """
+        return (await self._sequence(db, election_id))[0]
+
+    async def _sequence(self, db: AsyncSession, election_id) -> Tuple[int, bool]:
+        """(ballots sequenced, whether the election lock was held by another worker)."""
+        election_id = uuid.UUID(str(election_id))
+        sequenced = 0
+        while True:
+            locked = (await db.execute(select(func.pg_try_advisory_xact_lock(_lock_key(election_id))))).scalar()
+            batch = []
+            if locked:
+                batch = (await db.execute(
+                    select(Ballot.id, Ballot.tracking_code, Ballot.encrypted_ballot, Ballot.proof, Ballot.proof_verified)
+                    .where(Ballot.election_id == election_id, Ballot.leaf_index.is_(None))
+                    .order_by(Ballot.timestamp, Ballot.id)
+                    .limit(settings.MERKLE_SEQUENCE_BATCH_SIZE)
+                )).all()
+            if not batch:
+                await db.rollback()
+                return sequenced, not locked
+
+            tree = (await db.execute(select(MerkleTree).where(MerkleTree.election_id == election_id))).scalar_one_or_none()
+            if tree is None:
+                tree = MerkleTree(election_id=election_id, size=0, frontier=[])
+                db.add(tree)
+            frontier = [bytes.fromhex(h) if h else None for h in tree.frontier]
+            size = tree.size
+            await encrypted_tally.fold(db, election_id, size, [
+                encrypted_ballot if verified else None for _, _, encrypted_ballot, _, verified in batch
+            ])
+            nodes: List[Tuple[int, int, bytes]] = []
+            positions = []
+            for ballot_id, tracking_code, encrypted_ballot, proof, _ in batch:
+                positions.append({"id": ballot_id, "leaf_index": size})
+                size = _append(frontier, size, leaf_hash(election_id, tracking_code, encrypted_ballot, proof), nodes)
+
+            await db.execute(insert(MerkleNode), [
+                {"election_id": election_id, "level": level, "idx": idx, "hash": node}
+                for level, idx, node in nodes
+            ])
+            await db.execute(update(Ballot), positions)
+            tree.size = size
+            tree.frontier = [h.hex() if h else None for h in frontier]
+            tree.root_hash = frontier_root(frontier).hex()
+            self._sign(tree)
+            await db.commit()
+            sequenced += len(batch)
+
+    async def sequence_pending(self, db: AsyncSession) -> int:
+        """Sweep: sequence every election that still has unsequenced ballots."""
+        election_ids = (await db.execute(
+            select(Ballot.election_id).where(Ballot.leaf_index.is_(None)).distinct().limit(1000)
+        )).scalars().all()
+        await db.rollback()
+        sequenced = 0
+        for election_id in election_ids:
+            try:
+                sequenced += await self.sequence(db, election_id)
+            except Exception as e:
+                await db.rollback()
+                logger.error("[MERKLE] Sequencing failed for %s: %s", election_id, e)
+        return sequenced
+
+    async def try_sequence(self, db: AsyncSession, election_id) -> None:
+        """Best-effort sequencing in the caller's task (election close)."""
+        try:
+            await self.sequence(db, election_id)
+        except Exception as e:
+            await db.rollback()
+            logger.warning("[MERKLE] Deferred sequencing of %s to the sweep: %s", election_id, e)
+
+    @staticmethod
+    async def notify(election_id) -> None:
+        """Mark an election as having committed ballots to sequence (called after commit)."""
+        try:
+            redis = await get_redis()
+            await redis.sadd(DIRTY_SET, str(election_id))
+        except Exception as e:
+            logger.warning("[MERKLE] Deferred sequencing of %s to the sweep: %s", election_id, e)
+
+    async def run(self) -> None:
+        """Background sequencer: appends the ballots of elections marked by notify()."""
+        while True:
+            try:
+                redis = await get_redis()
+                election_ids = await redis.spop(DIRTY_SET, settings.MERKLE_SEQUENCE_ELECTIONS_PER_PASS)
+                for election_id in election_ids or []:
+                    try:
+                        async with SessionLocal() as db:
+                            _, busy = await self._sequence(db, election_id)
+                    except Exception as e:
+                        logger.error("[MERKLE] Sequencing failed for %s: %s", election_id, e)
+                        continue
+                    if busy:
+                        # The lock holder may have read its last batch before our commit
+                        await redis.sadd(DIRTY_SET, election_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("[MERKLE] Sequencer error: %s", e)
+            await asyncio.sleep(settings.MERKLE_SEQUENCE_INTERVAL_MS / 1000)
+
+    @staticmethod
+    def _signed_head(tree: MerkleTree) -> Dict[str, Any]:
+        return {
+            "tree_size": tree.size,
+            "root_hash": tree.root_hash,
+            "signed_at": tree.signed_at.isoformat(),
+            "signature": tree.signature
+        }
+
+    async def head(self, db: AsyncSession, election_id) -> Optional[Dict[str, Any]]:
+        """Latest signed tree head of an election."""
+        tree = (await db.execute(
+            select(MerkleTree).where(MerkleTree.election_id == uuid.UUID(str(election_id)))
+        )).scalar_one_or_none()
+        if tree is None:
+            return None
+        return {"election_id": str(tree.election_id), **self._signed_head(tree), "public_key": self.public_key()}
+
+    @staticmethod
+    async def _range_roots(db: AsyncSession, election_id, ranges: List[Tuple[int, int]]) -> List[bytes]:
+        """Roots of leaf ranges, folded from the stored perfect subtrees."""
+        wanted = {node for start, end in ranges for node in _subtrees(start, end)}
+        stored = {}
+        if wanted:
+            result = await db.execute(
+                select(MerkleNode.level, MerkleNode.idx, MerkleNode.hash).where(
+                    MerkleNode.election_id == election_id,
+                    tuple_(MerkleNode.level, MerkleNode.idx).in_(list(wanted))
+                )
+            )
+            stored = {(level, idx): node for level, idx, node in result.all()}
+        return [_fold([stored[node] for node in _subtrees(start, end)]) for start, end in ranges]
+
+    async def inclusion_proof(self, db: AsyncSession, ballot: Ballot) -> Optional[Dict[str, Any]]:
+        """Audit path of a ballot against the latest signed root; None until sequenced."""
+        if ballot.leaf_index is None:
+            return None
+        tree = (await db.execute(
+            select(MerkleTree).where(MerkleTree.election_id == ballot.election_id)
+        )).scalar_one_or_none()
+        if tree is None or tree.size <= ballot.leaf_index:
+            return None
+
+        path = await self._range_roots(db, ballot.election_id, _audit_ranges(ballot.leaf_index, tree.size))
+        return {
+            "leaf_index": ballot.leaf_index,
+            "leaf_hash": leaf_hash(ballot.election_id, ballot.tracking_code, ballot.encrypted_ballot, ballot.proof).hex(),
+            "audit_path": [node.hex() for node in path],
+            **self._signed_head(tree),
+            "public_key": self.public_key()
+        }
+
+    async def consistency_proof(self, db: AsyncSession, election_id, old_size: int) -> Optional[Dict[str, Any]]:
+        """Proof that the latest signed tree extends the tree of `old_size` leaves; None past its size."""
+        election_id = uuid.UUID(str(election_id))
+        tree = (await db.execute(
+            select(MerkleTree).where(MerkleTree.election_id == election_id)
+        )).scalar_one_or_none()
+        if tree is None or old_size > tree.size:
+            return None
+        path = []
+        if 0 < old_size < tree.size:
+            path = await self._range_roots(db, election_id, _consistency_ranges(old_size, tree.size))
+        return {
+            "election_id": str(election_id),
+            "from_size": old_size,
+            "consistency_path": [node.hex() for node in path],
+            **self._signed_head(tree),
+            "public_key": self.public_key()
+        }
+
+    @staticmethod
+    async def discard(db: AsyncSession, election_id) -> None:
+        """Delete an election's tree (caller commits)."""
+        election_id = uuid.UUID(str(election_id))
+        await db.execute(delete(MerkleNode).where(MerkleNode.election_id == election_id))
+        await db.execute(delete(MerkleTree).where(MerkleTree.election_id == election_id))
+
+
+merkle_board = MerkleBoard()
@@ -0,0 +1,74 @@
+"""
+Request-path ballot proof checks, batched.
+Concurrent submissions of one worker wait at most CRYPTO_VERIFY_BATCH_WAIT_MS
+for each other, then their proofs are checked together by
+CryptoEngine.verify_zkp_batch in the tally process pool. Every voter still
+gets the verdict on their own ballot before any tracking code is issued, and
+the event loop never runs an exponentiation.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.services.crypto_service import CryptoEngine
+from app.services.tally_runner import _get_executor
+
+logger = logging.getLogger(__name__)
+
+Item = Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any], List[Dict[str, Any]]]
+
+
+class ProofBatcher:
+    def __init__(self):
+        self._pending: List[Tuple[Item, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def verify(
+        self,
+        encrypted_ballot: Dict[str, Any],
+        proof: Dict[str, Any],
+        public_key: Dict[str, Any],
+        questions: List[Dict[str, Any]]
+    ) -> bool:
+        """Same verdict as CryptoEngine.verify_zkp."""
+        item = (encrypted_ballot, proof, public_key, questions)
+        if not CryptoEngine.has_real_proof(encrypted_ballot, proof, public_key):
+            return CryptoEngine.verify_zkp(*item)  # no exponentiation involved
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= settings.CRYPTO_VERIFY_BATCH_SIZE:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(settings.CRYPTO_VERIFY_BATCH_WAIT_MS / 1000, self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    @staticmethod
+    async def _run(batch: List[Tuple[Item, asyncio.Future]]) -> None:
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                _get_executor(), CryptoEngine.verify_zkp_batch, [item for item, _ in batch]
+            )
+        except Exception as e:
+            logger.error("[VERIFY] Batch proof check failed: %s", e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), ok in zip(batch, results):
+            if not future.done():  # cancelled when the client went away
+                future.set_result(ok)
+
+
+proof_batcher = ProofBatcher()
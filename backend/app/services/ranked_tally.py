@@ -0,0 +1,185 @@
+"""
+Ranked-choice tallies (instant-runoff, Borda, Condorcet/Schulze).
+Rankings are encoded once into a compact preference matrix: one row per distinct
+ranking, candidate indexes by position (-1 padded), with a weight per row.
+IRV keeps every row in the pile of the candidate it currently counts for, and an
+elimination only re-points the rows of the eliminated candidate's pile.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+
+EXHAUSTED = -1
+
+
+class RankedBallots:
+    def __init__(self, n_candidates: int, preferences: np.ndarray, weights: np.ndarray):
+        self.n_candidates = n_candidates
+        self.preferences = preferences  # rows x n_candidates, EXHAUSTED padded
+        self.weights = weights  # ballots per row
+
+    @classmethod
+    def from_patterns(cls, n_candidates: int, patterns: Dict[Tuple[int, ...], int]) -> "RankedBallots":
+        """Build from {ranking tuple: ballot count}, as produced by TallyEngine."""
+        rows = [(ranking, count) for ranking, count in patterns.items() if count > 0]
+        dtype = np.int16 if n_candidates < np.iinfo(np.int16).max else np.int32
+        preferences = np.full((len(rows), max(n_candidates, 1)), EXHAUSTED, dtype=dtype)
+        weights = np.zeros(len(rows), dtype=np.int64)
+        for row, (ranking, count) in enumerate(rows):
+            # dict.fromkeys: drop repeated candidates, keep first position
+            ranked = [c for c in dict.fromkeys(ranking) if 0 <= c < n_candidates]
+            preferences[row, :len(ranked)] = ranked
+            weights[row] = count
+        return cls(n_candidates, preferences, weights)
+
+    @property
+    def ballot_count(self) -> int:
+        return int(self.weights.sum())
+
+    def positions(self) -> np.ndarray:
+        """rows x candidates: 0-based rank position, n_candidates when unranked."""
+        n_rows = self.preferences.shape[0]
+        dtype = np.int8 if self.n_candidates < np.iinfo(np.int8).max else np.int32
+        positions = np.full((n_rows, self.n_candidates), self.n_candidates, dtype=dtype)
+        rows, cols = np.nonzero(self.preferences[:, :self.n_candidates] != EXHAUSTED)
+        positions[rows, self.preferences[rows, cols]] = cols
+        return positions
+
+
+def instant_runoff(ballots: RankedBallots) -> Dict[str, Any]:
+    if ballots.ballot_count == 0:
+        return {"winner": None, "rounds": []}
+    n = ballots.n_candidates
+    prefs = ballots.preferences
+    weights = ballots.weights
+    n_rows = prefs.shape[0]
+    pointer = np.zeros(n_rows, dtype=np.int32)
+    current = prefs[:, 0].astype(np.int32) if n_rows else np.zeros(0, dtype=np.int32)
+
+    eliminated = np.zeros(n, dtype=bool)
+    counts = np.zeros(n, dtype=np.int64)
+    piles: List[List[np.ndarray]] = [[] for _ in range(n)]
+    exhausted = 0
+
+    def assign(rows: np.ndarray) -> int:
+        """Add rows to the piles of their current candidate; return exhausted weight."""
+        targets = current[rows]
+        live = targets != EXHAUSTED
+        counts[:] += np.bincount(targets[live], weights=weights[rows][live], minlength=n).astype(np.int64)
+        order = np.argsort(targets[live], kind="stable")
+        live_rows, live_targets = rows[live][order], targets[live][order]
+        bounds = np.searchsorted(live_targets, np.arange(n + 1))
+        for candidate in range(n):
+            if bounds[candidate] < bounds[candidate + 1]:
+                piles[candidate].append(live_rows[bounds[candidate]:bounds[candidate + 1]])
+        return int(weights[rows][~live].sum())
+
+    exhausted += assign(np.arange(n_rows))
+    rounds = []
+    winner = None
+    while True:
+        active = np.flatnonzero(~eliminated)
+        if len(active) == 0:
+            break
+        active_counts = counts[active]
+        total = int(active_counts.sum())
+        round_info = {"counts": counts.tolist(), "exhausted": exhausted, "eliminated": None}
+        rounds.append(round_info)
+
+        leader = int(active[np.argmax(active_counts)])
+        if len(active) == 1 or (total > 0 and counts[leader] * 2 > total):
+            winner = leader if total > 0 else None
+            break
+
+        loser = int(active[np.argmin(active_counts)])
+        round_info["eliminated"] = loser
+        round_info["tie"] = bool((active_counts == counts[loser]).sum() > 1)
+        eliminated[loser] = True
+        counts[loser] = 0
+        moved = np.concatenate(piles[loser]) if piles[loser] else np.zeros(0, dtype=np.int64)
+        piles[loser] = []
+
+        # Re-point only the moved rows past eliminated candidates
+        pending = moved
+        while len(pending):
+            pointer[pending] += 1
+            at_end = pointer[pending] >= n
+            next_candidate = np.full(len(pending), EXHAUSTED, dtype=np.int32)
+            next_candidate[~at_end] = prefs[pending[~at_end], pointer[pending[~at_end]]]
+            current[pending] = next_candidate
+            still_eliminated = (next_candidate != EXHAUSTED) & eliminated[np.maximum(next_candidate, 0)]
+            pending = pending[still_eliminated]
+        exhausted += assign(moved)
+
+    return {"winner": winner, "rounds": rounds}
+
+
+def borda(ballots: RankedBallots) -> List[int]:
+    """n-1 points for a first place, n-2 for second, ..., 0 for unranked."""
+    n = ballots.n_candidates
+    prefs = ballots.preferences[:, :n]
+    rows, cols = np.nonzero(prefs != EXHAUSTED)
+    points = (n - 1 - cols) * ballots.weights[rows]
+    return np.bincount(prefs[rows, cols], weights=points, minlength=n).astype(np.int64).tolist()
+
+
+def pairwise_matrix(ballots: RankedBallots) -> np.ndarray:
+    """d[i, j] = ballots ranking i above j (ranked above unranked)."""
+    n = ballots.n_candidates
+    positions = ballots.positions()
+    # float64 matmul is exact for ballot counts below 2**53 and much faster than int64
+    weights = ballots.weights.astype(np.float64)
+    d = np.zeros((n, n), dtype=np.float64)
+    for i in range(n):
+        d[i] = weights @ (positions[:, i:i + 1] < positions).astype(np.float64)
+    return d.astype(np.int64)
+
+
+def condorcet_winner(d: np.ndarray) -> Optional[int]:
+    n = d.shape[0]
+    for i in range(n):
+        if all(d[i, j] > d[j, i] for j in range(n) if j != i):
+            return i
+    return None
+
+
+def schulze(d: np.ndarray) -> List[int]:
+    """Candidates ordered by the Schulze method (widest paths)."""
+    n = d.shape[0]
+    p = np.where(d > d.T, d, 0)
+    for k in range(n):
+        p = np.maximum(p, np.minimum(p[:, k:k + 1], p[k:k + 1, :]))
+    np.fill_diagonal(p, 0)
+    wins = (p > p.T).sum(axis=1)
+    return sorted(range(n), key=lambda c: (-wins[c], c))
+
+
+def ranked_results(options: List[str], patterns: Dict[Tuple[int, ...], int]) -> Dict[str, Any]:
+    """Payload for a ranking question, with option names instead of indexes."""
+    ballots = RankedBallots.from_patterns(len(options), patterns)
+
+    def name(candidate: Optional[int]) -> Optional[str]:
+        return options[candidate] if candidate is not None else None
+
+    irv = instant_runoff(ballots)
+    d = pairwise_matrix(ballots)
+    return {
+        "irv": {
+            "winner": name(irv["winner"]),
+            "rounds": [
+                {
+                    "round": number,
+                    "counts": {options[c]: count for c, count in enumerate(r["counts"])},
+                    "exhausted": r["exhausted"],
+                    "eliminated": name(r["eliminated"]),
+                    "tie": r.get("tie", False)
+                }
+                for number, r in enumerate(irv["rounds"], start=1)
+            ]
+        },
+        "borda": dict(zip(options, borda(ballots))),
+        "condorcet": {
+            "winner": name(condorcet_winner(d)),
+            "pairwise": {options[i]: dict(zip(options, d[i].tolist())) for i in range(len(options))},
+            "schulze_ranking": [options[c] for c in schulze(d)]
+        }
+    }
@@ -0,0 +1,172 @@
+"""
+Election stats cache.
+Entries are versioned: ballot submissions and status changes bump the election's
+version instead of waiting for a TTL. Recomputation is single-flight, both inside
+a worker (shared future) and across workers (Redis lock, waiters poll for the
+holder's result). Stale entries can be served while a refresh runs in background.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = "election:{election_id}:stats"
+VERSION_KEY = "election:{election_id}:stats:version"
+LOCK_KEY = "election:{election_id}:stats:lock"
+
+LOCK_POLL_SECONDS = 0.05
+
+_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+ComputeStats = Callable[[AsyncSession], Awaitable[Dict[str, Any]]]
+
+
+class StatsCache:
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _decode(cached: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not cached:
+            return None
+        envelope = json.loads(cached)
+        return envelope if isinstance(envelope, dict) and "stats" in envelope else None
+
+    async def get(self, db: AsyncSession, election_id: str, compute: ComputeStats) -> Dict[str, Any]:
+        """Return stats for an election, recomputing at most once at a time."""
+        try:
+            redis = await get_redis()
+            cached, version = await redis.mget(
+                STATS_KEY.format(election_id=election_id),
+                VERSION_KEY.format(election_id=election_id)
+            )
+            envelope = self._decode(cached)
+        except Exception:
+            return await compute(db)
+
+        if envelope:
+            is_current = envelope.get("version") == (version or "0")
+            is_fresh = time.time() - envelope.get("computed_at", 0) < settings.STATS_CACHE_SOFT_TTL_SECONDS
+            if is_current and is_fresh:
+                return envelope["stats"]
+            if settings.STATS_SERVE_STALE:
+                self._revalidate(election_id, compute)
+                return envelope["stats"]
+        return await self._single_flight(db, election_id, compute)
+
+    async def invalidate(self, election_id) -> None:
+        """Mark cached stats stale (ballot accepted, status changed)."""
+        try:
+            redis = await get_redis()
+            version_key = VERSION_KEY.format(election_id=election_id)
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.incr(version_key)
+                pipe.expire(version_key, settings.STATS_CACHE_TTL_SECONDS)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("[STATS] Failed to invalidate stats for %s: %s", election_id, e)
+
+    async def discard(self, election_id) -> None:
+        try:
+            redis = await get_redis()
+            await redis.delete(
+                STATS_KEY.format(election_id=election_id),
+                VERSION_KEY.format(election_id=election_id)
+            )
+        except Exception:
+            pass
+
+    def _revalidate(self, election_id: str, compute: ComputeStats) -> None:
+        if election_id in self._inflight:
+            return
+
+        async def refresh():
+            try:
+                async with SessionLocal() as db:
+                    await self._single_flight(db, election_id, compute)
+            except Exception as e:
+                logger.warning("[STATS] Background refresh failed for %s: %s", election_id, e)
+
+        task = asyncio.create_task(refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _single_flight(self, db: AsyncSession, election_id: str, compute: ComputeStats) -> Dict[str, Any]:
+        inflight = self._inflight.get(election_id)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        # Avoid "exception was never retrieved" when nobody else was waiting
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[election_id] = future
+        try:
+            stats = await self._compute_locked(db, election_id, compute)
+            future.set_result(stats)
+            return stats
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._inflight.pop(election_id, None)
+
+    async def _compute_locked(self, db: AsyncSession, election_id: str, compute: ComputeStats) -> Dict[str, Any]:
+        lock_key = LOCK_KEY.format(election_id=election_id)
+        token = uuid.uuid4().hex
+        lock_ms = settings.STATS_LOCK_TIMEOUT_SECONDS * 1000
+        try:
+            redis = await get_redis()
+            acquired = await redis.set(lock_key, token, nx=True, px=lock_ms)
+        except Exception:
+            return await compute(db)
+
+        if not acquired:
+            waited_from = time.time()
+            deadline = asyncio.get_running_loop().time() + settings.STATS_LOCK_TIMEOUT_SECONDS
+            while asyncio.get_running_loop().time() < deadline:
+                await asyncio.sleep(LOCK_POLL_SECONDS)
+                lock_held = await redis.exists(lock_key)
+                envelope = self._decode(await redis.get(STATS_KEY.format(election_id=election_id)))
+                if envelope and envelope.get("computed_at", 0) >= waited_from:
+                    return envelope["stats"]
+                if not lock_held:
+                    break
+            # Holder died or timed out: compute without the lock
+            return await self._compute_and_store(db, election_id, compute)
+
+        try:
+            return await self._compute_and_store(db, election_id, compute)
+        finally:
+            await redis.eval(_RELEASE_LOCK, 1, lock_key, token)
+
+    async def _compute_and_store(self, db: AsyncSession, election_id: str, compute: ComputeStats) -> Dict[str, Any]:
+        redis = await get_redis()
+        # Read the version first: a bump during computation leaves the entry stale
+        version = await redis.get(VERSION_KEY.format(election_id=election_id))
+        stats = await compute(db)
+        envelope = {"version": version or "0", "computed_at": time.time(), "stats": stats}
+        try:
+            await redis.setex(STATS_KEY.format(election_id=election_id), settings.STATS_CACHE_TTL_SECONDS, json.dumps(envelope))
+        except Exception:
+            pass
+        return stats
+
+
+stats_cache = StatsCache()
@@ -1,13 +1,84 @@
 """
 Storage service with adapter pattern.
-MVP uses local filesystem, production switches to IPFS.
+MVP uses local filesystem (one file per ballot, or append-only segments),
+production switches to IPFS.
+Async callers use astore/aretrieve, which run the blocking I/O on a dedicated
+thread pool; STORAGE_FSYNC=group batches the fsyncs of concurrent writes.
 """
+import asyncio
+import fcntl
+import glob
+import mmap
 import os
 import json
 import hashlib
-from typing import Dict, Any
+import logging
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+_io_executor: Optional[ThreadPoolExecutor] = None
+_adapter: Optional["StorageAdapter"] = None
+
+
+def _get_io_executor() -> ThreadPoolExecutor:
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(max_workers=settings.STORAGE_IO_THREADS, thread_name_prefix="storage-io")
+    return _io_executor
+
+
+async def _run_io(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_get_io_executor(), func, *args)
+
+
+def _fsync_paths(paths: List[str]) -> None:
+    for path in dict.fromkeys(paths):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class GroupCommit:
+    """Coalesce fsync requests: writes that arrive while a sync runs share the next one."""
+
+    def __init__(self, directory: str, window_ms: int = 0):
+        self.directory = directory
+        self.window = window_ms / 1000
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._syncer: Optional[asyncio.Task] = None
+
+    async def sync(self, path: str) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((path, future))
+        if self._syncer is None or self._syncer.done():
+            self._syncer = asyncio.create_task(self._run())
+        await future
+
+    async def _run(self) -> None:
+        while self._pending:
+            if self.window:
+                await asyncio.sleep(self.window)
+            batch, self._pending = self._pending, []
+            try:
+                # Fichiers puis répertoire: les nouveaux noms de fichiers doivent aussi survivre
+                await _run_io(_fsync_paths, [path for path, _ in batch] + [self.directory])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
 
 class StorageAdapter:
     def store(self, data: Dict[str, Any]) -> str:
@@ -16,31 +87,373 @@ class StorageAdapter:
     def retrieve(self, content_hash: str) -> Dict[str, Any]:
         raise NotImplementedError
 
+    async def astore(self, data: Dict[str, Any]) -> str:
+        return await _run_io(self.store, data)
+
+    async def aretrieve(self, content_hash: str) -> Dict[str, Any]:
+        return await _run_io(self.retrieve, content_hash)
+
 
 class LocalStorageAdapter(StorageAdapter):
-    def __init__(self, storage_path: str):
+    def __init__(self, storage_path: str, fsync: str = "none", group_commit_window_ms: int = 0):
         self.storage_path = storage_path
+        self.fsync = fsync  # "none", "always" or "group"
+        self._group_commit = GroupCommit(storage_path, group_commit_window_ms) if fsync == "group" else None
         os.makedirs(storage_path, exist_ok=True)
 
-    def store(self, data: Dict[str, Any]) -> str:
+    @staticmethod
+    def _encode(data: Dict[str, Any]) -> Tuple[str, str]:
         content = json.dumps(data, sort_keys=True)
-        content_hash = hashlib.sha256(content.encode()).hexdigest()
+        return hashlib.sha256(content.encode()).hexdigest(), content
+
+    def _write(self, content_hash: str, content: str, fsync: bool) -> str:
         file_path = os.path.join(self.storage_path, f"{content_hash}.json")
-        
         with open(file_path, "w") as f:
             f.write(content)
-        
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        return file_path
+
+    def store(self, data: Dict[str, Any]) -> str:
+        content_hash, content = self._encode(data)
+        self._write(content_hash, content, fsync=self.fsync != "none")
         return content_hash
 
     def retrieve(self, content_hash: str) -> Dict[str, Any]:
         file_path = os.path.join(self.storage_path, f"{content_hash}.json")
-        
+
         if not os.path.exists(file_path):
             return None
-        
+
         with open(file_path, "r") as f:
             return json.load(f)
 
+    async def astore(self, data: Dict[str, Any]) -> str:
+        content_hash, content = self._encode(data)
+        file_path = await _run_io(self._write, content_hash, content, self.fsync == "always")
+        if self._group_commit is not None:
+            await self._group_commit.sync(file_path)
+        return content_hash
+
+
+# Segment record: sha256 digest + content length, then the JSON content
+RECORD_HEADER = struct.Struct(">32sI")
+# Index entry: digest, segment number, offset of the content, content length
+INDEX_ENTRY = struct.Struct(">32sIQI")
+# Sealed segment index: index.bin position it covers and entry count, then
+# the segment's INDEX_ENTRY records sorted by digest
+SEALED_HEADER = struct.Struct(">QQ")
+
+
+class _SealedIndex:
+    """Sorted index of a full segment, mmap'ed: binary search, nothing held in memory."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index_position, self.count = SEALED_HEADER.unpack_from(self._map)
+        if len(self._map) != SEALED_HEADER.size + self.count * INDEX_ENTRY.size:
+            self._map.close()
+            raise ValueError(f"{path} is truncated")
+
+    def get(self, digest: bytes) -> Optional[Tuple[int, int, int]]:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = SEALED_HEADER.size + middle * INDEX_ENTRY.size
+            key = self._map[start:start + 32]
+            if key < digest:
+                low = middle + 1
+            elif key > digest:
+                high = middle
+            else:
+                _, segment, offset, length = INDEX_ENTRY.unpack_from(self._map, start)
+                return segment, offset, length
+        return None
+
+    def close(self) -> None:
+        self._map.close()
+
+
+class SegmentLogStorageAdapter(StorageAdapter):
+    """Ballots appended to size-rotated segment files instead of one file each.
+
+    Content hashes are the same as LocalStorageAdapter's (sha256 of the JSON),
+    so existing ipfs_hash values keep resolving after migrate_flat_directory().
+    index.bin holds one INDEX_ENTRY per record. Several API workers share the
+    files: appends hold an flock on the index, and each process catches up with
+    the index entries written by the others before appending or on a lookup miss.
+    Only the active segment is indexed in memory: a segment that fills up is
+    sealed with a sorted segment-N.idx, searched through mmap, and startup only
+    reads index.bin past the position the last sealed index covers. Records the
+    index missed (crash between the two appends) are re-indexed from the active
+    segment on startup; full segments without a valid .idx (written before this
+    layout, or a crash while sealing) are sealed again from their records.
+    """
+
+    def __init__(self, storage_path: str, max_segment_bytes: int, fsync: str = "none", group_commit_window_ms: int = 0):
+        self.directory = os.path.join(storage_path, "segments")
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync = fsync
+        self._group_commit = GroupCommit(self.directory, group_commit_window_ms) if fsync == "group" else None
+        self._lock = threading.Lock()
+        # Active segment only: digest -> (segment, offset, length)
+        self._index: Dict[bytes, Tuple[int, int, int]] = {}
+        self._sealed: Dict[int, _SealedIndex] = {}
+        self._index_position = 0
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._segment = 1
+        self._segment_fd: Optional[int] = None
+        self._segment_fd_number = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self.index_path = os.path.join(self.directory, "index.bin")
+        self._index_fd = os.open(self.index_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        with self._lock, self._exclusive():
+            self._recover()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment:06d}.log")
+
+    def _sealed_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment:06d}.idx")
+
+    @contextmanager
+    def _exclusive(self):
+        """Cross-process writer lock."""
+        fcntl.flock(self._index_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._index_fd, fcntl.LOCK_UN)
+
+    def _catch_up(self) -> None:
+        """Load index entries appended since the last read (by any process)."""
+        size = os.fstat(self._index_fd).st_size
+        size -= (size - self._index_position) % INDEX_ENTRY.size
+        if size <= self._index_position:
+            return
+        data = os.pread(self._index_fd, size - self._index_position, self._index_position)
+        for digest, segment, offset, length in INDEX_ENTRY.iter_unpack(data):
+            if segment > self._segment:
+                # Another process filled the active segment: it sealed it before moving on
+                for sealed in range(self._segment, segment):
+                    self._open_sealed(sealed)
+                self._index.clear()
+                self._segment = segment
+            if segment == self._segment:
+                self._index[digest] = (segment, offset, length)
+        self._index_position = size
+
+    def _open_sealed(self, segment: int) -> Optional[_SealedIndex]:
+        if segment not in self._sealed:
+            try:
+                self._sealed[segment] = _SealedIndex(self._sealed_path(segment))
+            except (OSError, ValueError):
+                return None
+        return self._sealed[segment]
+
+    def _seal(self, segment: int, entries: List[Tuple[bytes, int, int]], index_position: int) -> _SealedIndex:
+        """Write the sorted index of a full segment (atomic rename)."""
+        path = self._sealed_path(segment)
+        with open(path + ".tmp", "wb") as f:
+            f.write(SEALED_HEADER.pack(index_position, len(entries)))
+            f.write(b"".join(INDEX_ENTRY.pack(digest, segment, offset, length) for digest, offset, length in sorted(entries)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self._sealed.pop(segment, None)
+        return self._open_sealed(segment)
+
+    def _recover(self) -> None:
+        """Seal full segments, drop index entries past the end of the active one, re-index unindexed records."""
+        segments = sorted(
+            int(os.path.basename(path)[len("segment-"):-len(".log")])
+            for path in glob.glob(os.path.join(self.directory, "segment-*.log"))
+        )
+        index_size = os.fstat(self._index_fd).st_size
+        if index_size % INDEX_ENTRY.size:
+            os.ftruncate(self._index_fd, index_size - index_size % INDEX_ENTRY.size)
+        position = 0
+        for segment in segments[:-1]:
+            sealed = self._open_sealed(segment)
+            if sealed is None:
+                sealed = self._seal(segment, self._scan(segment, 0), position)
+                logger.info("[STORAGE] Sealed segment %d (%d records)", segment, sealed.count)
+            position = max(position, sealed.index_position)
+        if segments:
+            self._segment = segments[-1]
+        self._index_position = position
+        self._catch_up()
+        # Entrées pointant au-delà de la fin du segment (segment non synchronisé): ignorées
+        path = self._segment_path(self._segment)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        for digest, (segment, offset, length) in list(self._index.items()):
+            if offset + length > size:
+                del self._index[digest]
+        indexed_end = max((offset + length for _, offset, length in self._index.values()), default=0)
+        recovered = self._scan(self._segment, indexed_end) if size else []
+        for digest, offset, length in recovered:
+            self._write_index(digest, self._segment, offset, length)
+        if recovered:
+            logger.info("[STORAGE] Re-indexed %d records of segment %d", len(recovered), self._segment)
+
+    def _scan(self, segment: int, start: int) -> List[Tuple[bytes, int, int]]:
+        """(digest, offset, length) of the valid records from start; truncates a torn tail."""
+        records = []
+        path = self._segment_path(segment)
+        size = os.path.getsize(path)
+        if start >= size:
+            return records
+        with open(path, "r+b") as f:
+            position = start
+            while position + RECORD_HEADER.size <= size:
+                f.seek(position)
+                digest, length = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+                content = f.read(length)
+                if len(content) < length or hashlib.sha256(content).digest() != digest:
+                    break
+                records.append((digest, position + RECORD_HEADER.size, length))
+                position += RECORD_HEADER.size + length
+            if position < size:
+                logger.warning("[STORAGE] Truncating torn record in segment %d at offset %d", segment, position)
+                f.truncate(position)
+        return records
+
+    def _write_index(self, digest: bytes, segment: int, offset: int, length: int) -> None:
+        os.write(self._index_fd, INDEX_ENTRY.pack(digest, segment, offset, length))
+        self._index[digest] = (segment, offset, length)
+        self._index_position = os.fstat(self._index_fd).st_size
+
+    def _locate(self, digest: bytes) -> Optional[Tuple[int, int, int]]:
+        location = self._index.get(digest)
+        if location is None:
+            for segment in sorted(self._sealed, reverse=True):
+                location = self._sealed[segment].get(digest)
+                if location is not None:
+                    break
+        return location
+
+    def _rotate(self) -> None:
+        """Seal the full active segment and start the next one (writer lock held)."""
+        os.fsync(self._segment_fd)
+        self._seal(
+            self._segment,
+            [(digest, offset, length) for digest, (_, offset, length) in self._index.items()],
+            self._index_position
+        )
+        self._index.clear()
+        self._segment += 1
+
+    def _open_segment(self) -> int:
+        if self._segment_fd is None or self._segment_fd_number != self._segment:
+            if self._segment_fd is not None:
+                os.close(self._segment_fd)
+            self._segment_fd = os.open(self._segment_path(self._segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            self._segment_fd_number = self._segment
+        return self._segment_fd
+
+    def append(self, content_hash: str, content: bytes, fsync: bool = False) -> str:
+        """Append one record (no-op if already stored); returns its segment path."""
+        digest = bytes.fromhex(content_hash)
+        with self._lock, self._exclusive():
+            self._catch_up()
+            location = self._locate(digest)
+            if location is not None:
+                return self._segment_path(location[0])
+            record_size = RECORD_HEADER.size + len(content)
+            size = os.fstat(self._open_segment()).st_size
+            if size and size + record_size > self.max_segment_bytes:
+                self._rotate()
+                size = os.fstat(self._open_segment()).st_size
+            os.write(self._segment_fd, RECORD_HEADER.pack(digest, len(content)) + content)
+            self._write_index(digest, self._segment, size + RECORD_HEADER.size, len(content))
+            if fsync:
+                os.fsync(self._segment_fd)
+                os.fsync(self._index_fd)
+            return self._segment_path(self._segment)
+
+    def _map(self, segment: int, end: int) -> mmap.mmap:
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < end:
+            # The active segment grows: remap when a record lies past the mapping
+            with open(self._segment_path(segment), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return mapped
+
+    def store(self, data: Dict[str, Any]) -> str:
+        content_hash, content = LocalStorageAdapter._encode(data)
+        self.append(content_hash, content.encode(), fsync=self.fsync != "none")
+        return content_hash
+
+    def retrieve(self, content_hash: str) -> Dict[str, Any]:
+        try:
+            digest = bytes.fromhex(content_hash)
+        except ValueError:
+            return None
+        with self._lock:
+            location = self._locate(digest)
+            if location is None:
+                self._catch_up()
+                location = self._locate(digest)
+            if location is None:
+                return None
+            segment, offset, length = location
+            mapped = self._map(segment, offset + length)
+        return json.loads(mapped[offset:offset + length])
+
+    async def astore(self, data: Dict[str, Any]) -> str:
+        content_hash, content = LocalStorageAdapter._encode(data)
+        path = await _run_io(self.append, content_hash, content.encode(), self.fsync == "always")
+        if self._group_commit is not None:
+            # One fsync of the segment and the index for all concurrent writes
+            await asyncio.gather(self._group_commit.sync(path), self._group_commit.sync(self.index_path))
+        return content_hash
+
+    def __len__(self) -> int:
+        return sum(sealed.count for sealed in self._sealed.values()) + len(self._index)
+
+    def migrate_flat_directory(self, source: str, delete: bool = False) -> Iterator[str]:
+        """Append every {sha256}.json of a LocalStorageAdapter directory; yields migrated hashes.
+
+        With delete, source files are removed once the segments are fsynced.
+        """
+        migrated = []
+        for path in sorted(glob.glob(os.path.join(source, "*.json"))):
+            content_hash = os.path.basename(path)[:-len(".json")]
+            with open(path, "rb") as f:
+                content = f.read()
+            if hashlib.sha256(content).hexdigest() != content_hash:
+                logger.warning("[STORAGE] Skipping %s: content does not match its hash", path)
+                continue
+            self.append(content_hash, content)
+            migrated.append(path)
+            yield content_hash
+        self.sync()
+        if delete:
+            for path in migrated:
+                os.remove(path)
+
+    def sync(self) -> None:
+        with self._lock:
+            if self._segment_fd is not None:
+                os.fsync(self._segment_fd)
+            os.fsync(self._index_fd)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._segment_fd is not None:
+                os.close(self._segment_fd)
+                self._segment_fd = None
+            os.close(self._index_fd)
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+            for sealed in self._sealed.values():
+                sealed.close()
+            self._sealed.clear()
+
 
 class IPFSStorageAdapter(StorageAdapter):
     """Placeholder for future IPFS integration."""
@@ -54,6 +467,29 @@ class IPFSStorageAdapter(StorageAdapter):
 
 
 def get_storage_adapter() -> StorageAdapter:
-    if settings.STORAGE_MODE == "ipfs":
-        return IPFSStorageAdapter()
-    return LocalStorageAdapter(settings.STORAGE_PATH)
+    """Process-wide adapter (built once, not per request)."""
+    global _adapter
+    if _adapter is None:
+        if settings.STORAGE_MODE == "ipfs":
+            _adapter = IPFSStorageAdapter()
+        elif settings.STORAGE_MODE == "segments":
+            _adapter = SegmentLogStorageAdapter(
+                settings.STORAGE_PATH,
+                settings.STORAGE_SEGMENT_MAX_BYTES,
+                fsync=settings.STORAGE_FSYNC,
+                group_commit_window_ms=settings.STORAGE_GROUP_COMMIT_WINDOW_MS
+            )
+        else:
+            _adapter = LocalStorageAdapter(
+                settings.STORAGE_PATH,
+                fsync=settings.STORAGE_FSYNC,
+                group_commit_window_ms=settings.STORAGE_GROUP_COMMIT_WINDOW_MS
+            )
+    return _adapter
+
+
+def shutdown_storage() -> None:
+    global _io_executor
+    if _io_executor is not None:
+        _io_executor.shutdown(wait=True)
+        _io_executor = None
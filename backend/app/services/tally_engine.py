@@ -0,0 +1,231 @@
+"""
+Vectorized tally engine.
+Each ballot is decoded once; every distinct selection of a question is mapped to
+a small integer pattern id, and counting reduces to a NumPy bincount of pattern
+ids multiplied by a pattern x option incidence matrix.
+"""
+import base64
+import json
+import logging
+from array import array
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Ciphertext -> pattern id cache bound per question. Selections themselves are
+# few (2^options at most for multiple choice), ciphertexts may not be.
+MAX_CACHED_CIPHERTEXTS = 65536
+
+# Pattern ids are folded into per-pattern frequencies every FLUSH_EVERY ballots,
+# so memory stays bounded however many ballots are streamed through the engine.
+FLUSH_EVERY = 8192
+
+
+def decode_selection(question: Dict[str, Any], encrypted_value: str) -> Tuple[int, ...]:
+    """Decode one choice into option indexes (ranking: ordered by position)."""
+    question_type = question.get('type', 'single')
+    options = question.get('options', [])
+    decoded = base64.b64decode(encrypted_value).decode('iso-8859-1')
+    try:
+        decoded_value = json.loads(decoded)
+    except (json.JSONDecodeError, ValueError):
+        # Pas du JSON → Vote Simple (single choice)
+        if decoded in options:
+            return (options.index(decoded),)
+        logger.warning("Vote value not found in options: %s", decoded)
+        return ()
+
+    # TYPE: CHOIX MULTIPLE → toutes les options sélectionnées
+    if question_type == 'multiple' and isinstance(decoded_value, list):
+        selected = []
+        for selected_option in decoded_value:
+            if selected_option in options:
+                selected.append(options.index(selected_option))
+            else:
+                logger.warning("Multiple vote option not found: %s", selected_option)
+        return tuple(selected)
+
+    # TYPE: CLASSEMENT (RANKING)
+    # Format: {"1": "Option A", "2": "Option B", "3": "Option C"}
+    if question_type == 'ranking' and isinstance(decoded_value, dict):
+        ranked = []
+        for position in sorted(decoded_value, key=lambda p: int(p) if str(p).isdigit() else 1 << 30):
+            choice = decoded_value[position]
+            if choice in options:
+                ranked.append(options.index(choice))
+            else:
+                logger.warning("Ranking choice not found: %s", choice)
+        if decoded_value.get("1") not in options:
+            # Sans 1er choix valide, le bulletin ne compte pas pour ce classement
+            return ()
+        return tuple(ranked)
+
+    logger.warning("Unexpected vote format for type %s: %s", question_type, type(decoded_value))
+    return ()
+
+
+def counted_options(question: Dict[str, Any], selection: Tuple[int, ...]) -> Tuple[int, ...]:
+    """Options credited in the per-option counts.
+
+    Ranking questions only credit the first choice (scrutin majoritaire à 1 tour).
+    """
+    if question.get('type', 'single') == 'ranking':
+        return selection[:1]
+    return selection
+
+
+def materialize_ballot(questions: List[Dict[str, Any]], encrypted_ballot: Optional[Dict[str, Any]]) -> List[Tuple[int, int, Optional[int]]]:
+    """Decode a ballot once into (question_idx, option_idx, rank) rows.
+
+    rank is the 1-based position for ranking questions and None otherwise.
+    """
+    rows = []
+    choices = encrypted_ballot.get('choices', []) if encrypted_ballot else []
+    for q_idx in range(min(len(choices), len(questions))):
+        question = questions[q_idx]
+        try:
+            encrypted_value = choices[q_idx].get('encrypted')
+            if encrypted_value is None:
+                continue
+            selection = decode_selection(question, encrypted_value)
+        except Exception as decode_err:
+            logger.error("Failed to decode vote: %s", decode_err)
+            continue
+        is_ranking = question.get('type', 'single') == 'ranking'
+        for position, o_idx in enumerate(selection, start=1):
+            rows.append((q_idx, o_idx, position if is_ranking else None))
+    return rows
+
+
+def count_encrypted_values(
+    questions: List[Dict[str, Any]],
+    grouped: Iterable[Tuple[int, str, int]]
+) -> List[List[int]]:
+    """Per-option counts from (question_idx, encrypted value, ballots) rows."""
+    counts = [[0] * len(q.get('options', [])) for q in questions]
+    for q_idx, encrypted_value, ballots in grouped:
+        if q_idx >= len(questions):
+            continue
+        question = questions[q_idx]
+        try:
+            selection = decode_selection(question, encrypted_value)
+        except Exception as decode_err:
+            logger.error("Failed to decode vote: %s", decode_err)
+            continue
+        for o_idx in counted_options(question, selection):
+            counts[q_idx][o_idx] += ballots
+    return counts
+
+
+def counted_rows(rows: List[Tuple[int, int, Optional[int]]]) -> List[Tuple[int, int]]:
+    """(question_idx, option_idx) pairs credited by materialized rows."""
+    return [(q_idx, o_idx) for q_idx, o_idx, rank in rows if rank is None or rank == 1]
+
+
+class TallyResult:
+    def __init__(
+        self,
+        ballot_count: int,
+        counts: List[np.ndarray],
+        rank_counts: Dict[int, np.ndarray],
+        preferences: Dict[int, Dict[Tuple[int, ...], int]]
+    ):
+        self.ballot_count = ballot_count
+        self.counts = counts  # per question: votes per option
+        self.rank_counts = rank_counts  # ranking questions: options x positions
+        self.preferences = preferences  # ranking questions: {ranking: ballots}
+
+    def counts_as_lists(self) -> List[List[int]]:
+        return [row.tolist() for row in self.counts]
+
+
+class TallyEngine:
+    def __init__(self, questions: List[Dict[str, Any]]):
+        self.questions = questions
+        self.ballot_count = 0
+        self._ciphertext_patterns: List[Dict[str, int]] = [{} for _ in questions]
+        self._selection_patterns: List[Dict[Tuple[int, ...], int]] = [{} for _ in questions]
+        self._pattern_ids = [array('i') for _ in questions]
+        self._frequencies = [np.zeros(0, dtype=np.int64) for _ in questions]
+
+    def _pattern_for(self, q_idx: int, encrypted_value: str) -> int:
+        cache = self._ciphertext_patterns[q_idx]
+        pattern = cache.get(encrypted_value)
+        if pattern is not None:
+            return pattern
+        selection = decode_selection(self.questions[q_idx], encrypted_value)
+        patterns = self._selection_patterns[q_idx]
+        pattern = patterns.setdefault(selection, len(patterns))
+        if len(cache) < MAX_CACHED_CIPHERTEXTS:
+            cache[encrypted_value] = pattern
+        return pattern
+
+    def add(self, encrypted_ballot: Optional[Dict[str, Any]]) -> None:
+        """Decode one ballot (once, for every question)."""
+        self.ballot_count += 1
+        try:
+            choices = encrypted_ballot.get('choices', []) if encrypted_ballot else []
+            for q_idx in range(min(len(choices), len(self.questions))):
+                try:
+                    encrypted_value = choices[q_idx].get('encrypted')
+                    if encrypted_value is None:
+                        continue
+                    self._pattern_ids[q_idx].append(self._pattern_for(q_idx, encrypted_value))
+                except Exception as decode_err:
+                    logger.error("Failed to decode vote: %s", decode_err)
+        except Exception as e:
+            logger.exception("Error parsing ballot: %s", e)
+        if self.ballot_count % FLUSH_EVERY == 0:
+            self._flush()
+
+    def _flush(self) -> None:
+        """Fold buffered pattern ids into per-pattern frequencies."""
+        for q_idx, ids in enumerate(self._pattern_ids):
+            n_patterns = len(self._selection_patterns[q_idx])
+            frequency = self._frequencies[q_idx]
+            if len(frequency) < n_patterns:
+                frequency = np.pad(frequency, (0, n_patterns - len(frequency)))
+            if ids:
+                frequency += np.bincount(np.frombuffer(ids, dtype=np.int32), minlength=n_patterns)
+                self._pattern_ids[q_idx] = array('i')
+            self._frequencies[q_idx] = frequency
+
+    def add_many(self, encrypted_ballots: Iterable[Optional[Dict[str, Any]]]) -> "TallyEngine":
+        for encrypted_ballot in encrypted_ballots:
+            self.add(encrypted_ballot)
+        return self
+
+    def _incidence(self, q_idx: int) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        question = self.questions[q_idx]
+        n_options = len(question.get('options', []))
+        patterns = self._selection_patterns[q_idx]
+        counted = np.zeros((len(patterns), n_options), dtype=np.int64)
+        ranked = None
+        if question.get('type', 'single') == 'ranking':
+            ranked = np.zeros((len(patterns), n_options, max(n_options, 1)), dtype=np.int64)
+        for selection, pattern in patterns.items():
+            for o_idx in counted_options(question, selection):
+                counted[pattern, o_idx] += 1
+            if ranked is not None:
+                for position, o_idx in enumerate(selection[:n_options]):
+                    ranked[pattern, o_idx, position] += 1
+        return counted, ranked
+
+    def result(self) -> TallyResult:
+        self._flush()
+        counts = []
+        rank_counts = {}
+        preferences = {}
+        for q_idx, question in enumerate(self.questions):
+            counted, ranked = self._incidence(q_idx)
+            frequency = self._frequencies[q_idx]
+            counts.append(frequency @ counted)
+            if ranked is not None:
+                rank_counts[q_idx] = np.tensordot(frequency, ranked, axes=1)
+                preferences[q_idx] = {
+                    selection: int(frequency[pattern])
+                    for selection, pattern in self._selection_patterns[q_idx].items()
+                    if selection and frequency[pattern]
+                }
+        return TallyResult(self.ballot_count, counts, rank_counts, preferences)
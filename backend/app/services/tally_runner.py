@@ -0,0 +1,148 @@
+"""
+Parallel tally runner.
+Splits an election's ballots into ballot-id key ranges, counts each range in a
+separate process with TallyEngine, merges the partial count vectors and stores
+the final tally in the results table.
+"""
+import asyncio
+import logging
+import multiprocessing
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.pool import NullPool
+from app.core.config import settings
+from app.models.models import Ballot, Election, Result
+from app.services.tally_engine import TallyEngine
+from app.services.tally_service import build_stats, content_hash
+
+logger = logging.getLogger(__name__)
+
+# (counts per question/option, ballot count, ranking preferences)
+Partial = Tuple[List[List[int]], int, Dict[int, Dict[Tuple[int, ...], int]]]
+
+_tally_executor: Optional[ProcessPoolExecutor] = None
+_worker_engine = None
+
+
+def _sync_database_url() -> str:
+    return settings.DATABASE_URL.replace("postgresql+asyncpg", "postgresql")
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _tally_executor
+    if _tally_executor is None:
+        # spawn: never fork a process that owns an event loop and DB connections
+        _tally_executor = ProcessPoolExecutor(
+            max_workers=settings.TALLY_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _tally_executor
+
+
+def key_ranges(partitions: int) -> List[Tuple[Optional[uuid.UUID], Optional[uuid.UUID]]]:
+    """Split the UUID space into contiguous [lo, hi) ranges (uuid4 ids are uniform)."""
+    bounds = [uuid.UUID(int=(i << 128) // partitions) for i in range(1, partitions)]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def count_partition(
+    election_id: uuid.UUID,
+    questions: List[Dict[str, Any]],
+    lo: Optional[uuid.UUID],
+    hi: Optional[uuid.UUID]
+) -> Partial:
+    """Count one key range. Runs in a worker process with its own sync connection."""
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = create_engine(_sync_database_url(), poolclass=NullPool)
+
+    query = select(Ballot.encrypted_ballot).where(Ballot.election_id == election_id)
+    if lo is not None:
+        query = query.where(Ballot.id >= lo)
+    if hi is not None:
+        query = query.where(Ballot.id < hi)
+
+    engine = TallyEngine(questions)
+    with _worker_engine.connect() as conn:
+        rows = conn.execution_options(yield_per=settings.TALLY_STREAM_CHUNK_SIZE).execute(query)
+        for chunk in rows.scalars().partitions():
+            engine.add_many(chunk)
+    tally = engine.result()
+    return tally.counts_as_lists(), tally.ballot_count, tally.preferences
+
+
+def merge_counts(partials: List[Partial], questions: List[Dict[str, Any]]) -> Partial:
+    counts = [[0] * len(q.get('options', [])) for q in questions]
+    vote_count = 0
+    preferences: Dict[int, Counter] = {}
+    for partial_counts, partial_ballots, partial_preferences in partials:
+        vote_count += partial_ballots
+        for q_idx, row in enumerate(partial_counts):
+            for o_idx, value in enumerate(row):
+                counts[q_idx][o_idx] += value
+        for q_idx, patterns in partial_preferences.items():
+            preferences.setdefault(q_idx, Counter()).update(patterns)
+    return counts, vote_count, preferences
+
+
+async def run_tally(db: AsyncSession, election: Election, partitions: Optional[int] = None) -> Result:
+    """Count every ballot off the event loop and freeze the stats into the results table."""
+    partitions = partitions or settings.TALLY_PARTITIONS
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    partials = await asyncio.gather(*[
+        loop.run_in_executor(executor, count_partition, election.id, election.questions, lo, hi)
+        for lo, hi in key_ranges(partitions)
+    ])
+    counts, vote_count, preferences = merge_counts(partials, election.questions)
+    duration_ms = int((time.perf_counter() - started) * 1000)
+
+    result = (await db.execute(select(Result).where(Result.election_id == election.id))).scalar_one_or_none()
+    if result is None:
+        result = Result(election_id=election.id)
+        db.add(result)
+    payload = await asyncio.to_thread(build_stats, election, counts, vote_count, preferences)
+    result.decrypted_result = payload
+    result.result_hash = content_hash(payload)
+    result.tally_log = (result.tally_log or []) + [{
+        "event": "tally",
+        "timestamp": datetime.utcnow().isoformat(),
+        "partitions": partitions,
+        "ballots_per_partition": [partial[1] for partial in partials],
+        "ballots": vote_count,
+        "duration_ms": duration_ms,
+        "result_hash": result.result_hash
+    }]
+    result.finalized_at = datetime.utcnow()
+    await db.commit()
+    logger.info("[TALLY] %s tallied: %d ballots, %d partitions, %d ms", election.id, vote_count, partitions, duration_ms)
+    return result
+
+
+async def discard_snapshot(db: AsyncSession, election: Election) -> None:
+    """Drop a frozen result when an election is reopened."""
+    result = (await db.execute(select(Result).where(Result.election_id == election.id))).scalar_one_or_none()
+    if result is None or result.decrypted_result is None:
+        return
+    result.tally_log = (result.tally_log or []) + [{
+        "event": "snapshot_discarded",
+        "timestamp": datetime.utcnow().isoformat(),
+        "result_hash": result.result_hash
+    }]
+    result.decrypted_result = None
+    result.result_hash = None
+    result.finalized_at = None
+
+
+def shutdown_executor() -> None:
+    global _tally_executor
+    if _tally_executor is not None:
+        _tally_executor.shutdown(wait=False, cancel_futures=True)
+        _tally_executor = None
@@ -0,0 +1,413 @@
+"""
+Running tally service.
+Per-option counters are kept in a Redis hash that is incremented when a ballot
+is accepted, checkpointed periodically into the results table, and rebuilt
+from the ballots table whenever they are missing or have drifted.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import select, func, or_, update, text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.models.models import Ballot, BallotChoice, Election, ElectionStatus, Result
+from app.services.tally_engine import TallyEngine, materialize_ballot, counted_rows, count_encrypted_values
+from app.services.ranked_tally import ranked_results
+
+logger = logging.getLogger(__name__)
+
+TALLY_KEY = "election:{election_id}:tally"
+DIRTY_SET = "tally:dirty"
+BALLOTS_FIELD = "ballots"
+
+# Increment only if the hash already exists: a missing hash means the counters
+# have not been seeded yet and the next read will rebuild them from Postgres.
+_INCR_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for i = 1, #ARGV do
+    redis.call('HINCRBY', KEYS[1], ARGV[i], 1)
+end
+return 1
+"""
+
+# TALLY_MODE=postgres: ballots are grouped and counted in Postgres, one row per
+# distinct (question, encrypted value). Each distinct value is then classified
+# by tally_engine.decode_selection, so both modes apply exactly the same rules.
+JSONB_TALLY_SQL = text("""
+SELECT (c.ordinality - 1)::int AS question_idx, c.value ->> 'encrypted' AS encrypted, count(*)
+FROM ballots b
+CROSS JOIN LATERAL jsonb_array_elements(
+    CASE WHEN jsonb_typeof(b.encrypted_ballot::jsonb -> 'choices') = 'array'
+         THEN b.encrypted_ballot::jsonb -> 'choices' ELSE '[]'::jsonb END
+) WITH ORDINALITY AS c(value, ordinality)
+WHERE b.election_id = :election_id
+  AND jsonb_typeof(c.value -> 'encrypted') = 'string'
+GROUP BY 1, 2
+""")
+
+
+def _field(q_idx: int, o_idx: int) -> str:
+    return f"q{q_idx}:o{o_idx}"
+
+
+def empty_counts(questions: List[Dict[str, Any]]) -> List[List[int]]:
+    return [[0] * len(q.get('options', [])) for q in questions]
+
+
+def build_question_results(
+    questions: List[Dict[str, Any]],
+    counts: List[List[int]],
+    vote_count: int,
+    preferences: Optional[Dict[int, Dict[Tuple[int, ...], int]]] = None
+) -> List[Dict[str, Any]]:
+    """Shape per-option counts into the payload shared by stats and export.
+
+    When ranking preferences are given, ranking questions also get IRV, Borda
+    and Condorcet/Schulze results under "ranked".
+    """
+    results_by_question = []
+    for q_idx, question in enumerate(questions):
+        options = question.get('options', [])
+        question_results = {
+            "question": question.get('question', f'Question {q_idx + 1}'),
+            "type": question.get('type', 'single'),
+            "options": [
+                {
+                    "option": opt,
+                    "votes": counts[q_idx][o_idx],
+                    "percentage": (counts[q_idx][o_idx] / vote_count * 100) if vote_count > 0 else 0
+                }
+                for o_idx, opt in enumerate(options)
+            ]
+        }
+        if preferences is not None and q_idx in preferences:
+            question_results["ranked"] = ranked_results(options, preferences[q_idx])
+        results_by_question.append(question_results)
+    return results_by_question
+
+
+def build_stats(
+    election: Election,
+    counts: List[List[int]],
+    vote_count: int,
+    preferences: Optional[Dict[int, Dict[Tuple[int, ...], int]]] = None
+) -> Dict[str, Any]:
+    """Stats payload served by /stats and frozen into results on close."""
+    invited_count = len(election.voter_emails) if election.voter_emails else 0
+    return {
+        "election_id": str(election.id),
+        "votes_received": vote_count,
+        "voters_invited": invited_count,
+        "participation_rate": (vote_count / invited_count * 100) if invited_count > 0 else 0,
+        "results_by_question": build_question_results(election.questions, counts, vote_count, preferences)
+    }
+
+
+def content_hash(payload: Dict[str, Any]) -> str:
+    """sha256 of the canonical JSON encoding of a results payload."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+class TallyService:
+    @staticmethod
+    def _to_mapping(counts: List[List[int]], vote_count: int) -> Dict[str, int]:
+        mapping = {BALLOTS_FIELD: vote_count}
+        for q_idx, row in enumerate(counts):
+            for o_idx, value in enumerate(row):
+                mapping[_field(q_idx, o_idx)] = value
+        return mapping
+
+    @staticmethod
+    def _from_mapping(questions: List[Dict[str, Any]], mapping: Dict[str, Any]) -> Tuple[List[List[int]], int]:
+        counts = empty_counts(questions)
+        for q_idx, row in enumerate(counts):
+            for o_idx in range(len(row)):
+                row[o_idx] = int(mapping.get(_field(q_idx, o_idx), 0))
+        return counts, int(mapping.get(BALLOTS_FIELD, 0))
+
+    @staticmethod
+    def materialize(election: Election, encrypted_ballot: Dict[str, Any]) -> List[BallotChoice]:
+        """Decoded ballot_choices rows to attach to a new Ballot."""
+        return [
+            BallotChoice(election_id=election.id, question_idx=q_idx, option_idx=o_idx, rank=rank)
+            for q_idx, o_idx, rank in materialize_ballot(election.questions, encrypted_ballot)
+        ]
+
+    @staticmethod
+    async def record_batch(election_id, ballots: List[List[Tuple[int, int, Optional[int]]]]) -> List[List[str]]:
+        """Increment the running counters for accepted ballots of one election (best-effort).
+
+        ballots: materialized (question_idx, option_idx, rank) rows per ballot.
+        Returns the option counter fields credited by each ballot.
+        """
+        credited = [[_field(q, o) for q, o in counted_rows(rows)] for rows in ballots]
+        fields = [field for ballot_fields in credited for field in [BALLOTS_FIELD] + ballot_fields]
+        try:
+            redis = await get_redis()
+            await redis.eval(_INCR_IF_EXISTS, 1, TALLY_KEY.format(election_id=election_id), *fields)
+            await redis.sadd(DIRTY_SET, str(election_id))
+        except Exception as e:
+            logger.warning("[TALLY] Failed to update running tally for %s: %s", election_id, e)
+        return credited
+
+    @staticmethod
+    async def compute_from_ballots(db: AsyncSession, election: Election) -> Tuple[List[List[int]], int]:
+        """Full recount from the ballots table, using the configured TALLY_MODE."""
+        if settings.TALLY_MODE == "postgres":
+            try:
+                async with db.begin_nested():
+                    return await TallyService._count_in_postgres(db, election)
+            except Exception as e:
+                logger.warning("[TALLY] Postgres aggregation failed for %s, using Python engine: %s", election.id, e)
+        elif settings.TALLY_MODE == "auto" and await TallyService.is_materialized(db, election.id):
+            return await TallyService._count_materialized(db, election)
+
+        return await TallyService._count_with_engine(db, election)
+
+    @staticmethod
+    async def _stream_engine(db: AsyncSession, election: Election) -> TallyEngine:
+        engine = TallyEngine(election.questions)
+        # Server-side cursor: only encrypted_ballot is fetched, one chunk at a time
+        ballots_stream = await db.stream(
+            select(Ballot.encrypted_ballot)
+            .where(Ballot.election_id == election.id)
+            .execution_options(yield_per=settings.TALLY_STREAM_CHUNK_SIZE)
+        )
+        async for chunk in ballots_stream.scalars().partitions():
+            # Decoding is CPU-bound: the event loop only waits for the rows
+            await asyncio.to_thread(engine.add_many, chunk)
+        return engine
+
+    @staticmethod
+    async def _count_with_engine(db: AsyncSession, election: Election) -> Tuple[List[List[int]], int]:
+        tally = (await TallyService._stream_engine(db, election)).result()
+        return tally.counts_as_lists(), tally.ballot_count
+
+    @staticmethod
+    async def read_preferences(db: AsyncSession, election: Election) -> Dict[int, Dict[Tuple[int, ...], int]]:
+        """Full rankings of every ranking question, as {ranking: ballots}.
+
+        Grouped in Postgres from the ballot_choices rank rows; ballots are only
+        decoded (off the event loop) while ballot_choices is not backfilled.
+        """
+        ranking = [q_idx for q_idx, q in enumerate(election.questions) if q.get('type') == 'ranking']
+        if not ranking:
+            return {}
+        if not await TallyService.is_materialized(db, election.id):
+            return (await TallyService._stream_engine(db, election)).result().preferences
+        per_ballot = (
+            select(
+                BallotChoice.question_idx,
+                func.array_agg(aggregate_order_by(BallotChoice.option_idx, BallotChoice.rank)).label("ranking")
+            )
+            .where(
+                BallotChoice.election_id == election.id,
+                BallotChoice.question_idx.in_(ranking),
+                BallotChoice.rank.isnot(None)
+            )
+            .group_by(BallotChoice.ballot_id, BallotChoice.question_idx)
+            .subquery()
+        )
+        result = await db.execute(
+            select(per_ballot.c.question_idx, per_ballot.c.ranking, func.count())
+            .group_by(per_ballot.c.question_idx, per_ballot.c.ranking)
+        )
+        preferences: Dict[int, Dict[Tuple[int, ...], int]] = {q_idx: {} for q_idx in ranking}
+        for q_idx, pattern, count in result.all():
+            preferences[q_idx][tuple(pattern)] = count
+        return preferences
+
+    @staticmethod
+    async def _count_in_postgres(db: AsyncSession, election: Election) -> Tuple[List[List[int]], int]:
+        """Count inside Postgres; only (question, encrypted value, count) rows cross the wire."""
+        result = await db.execute(JSONB_TALLY_SQL, {"election_id": election.id})
+        counts = count_encrypted_values(election.questions, result.all())
+        return counts, await TallyService.count_ballots(db, election.id)
+
+    @staticmethod
+    async def is_materialized(db: AsyncSession, election_id) -> bool:
+        """True once every ballot of the election has its ballot_choices rows."""
+        result = await db.execute(
+            select(Ballot.id)
+            .where(Ballot.election_id == election_id, Ballot.choices_materialized.is_(False))
+            .limit(1)
+        )
+        return result.first() is None
+
+    @staticmethod
+    async def _count_materialized(db: AsyncSession, election: Election) -> Tuple[List[List[int]], int]:
+        """Single GROUP BY over ballot_choices; no ballot decoding."""
+        counts = empty_counts(election.questions)
+        result = await db.execute(
+            select(BallotChoice.question_idx, BallotChoice.option_idx, func.count())
+            .where(
+                BallotChoice.election_id == election.id,
+                or_(BallotChoice.rank.is_(None), BallotChoice.rank == 1)
+            )
+            .group_by(BallotChoice.question_idx, BallotChoice.option_idx)
+        )
+        for q_idx, o_idx, count in result.all():
+            if q_idx < len(counts) and o_idx < len(counts[q_idx]):
+                counts[q_idx][o_idx] = count
+        return counts, await TallyService.count_ballots(db, election.id)
+
+    @staticmethod
+    async def backfill_choices(db: AsyncSession, election: Election, batch_size: int = 1000) -> int:
+        """Materialize ballot_choices for ballots submitted before the side table existed."""
+        backfilled = 0
+        while True:
+            result = await db.execute(
+                select(Ballot.id, Ballot.encrypted_ballot)
+                .where(Ballot.election_id == election.id, Ballot.choices_materialized.is_(False))
+                .limit(batch_size)
+            )
+            batch = result.all()
+            if not batch:
+                return backfilled
+            for ballot_id, encrypted_ballot in batch:
+                for choice in TallyService.materialize(election, encrypted_ballot):
+                    choice.ballot_id = ballot_id
+                    db.add(choice)
+            await db.execute(
+                update(Ballot)
+                .where(Ballot.id.in_([ballot_id for ballot_id, _ in batch]))
+                .values(choices_materialized=True)
+            )
+            await db.commit()
+            backfilled += len(batch)
+
+    @staticmethod
+    async def count_ballots(db: AsyncSession, election_id) -> int:
+        result = await db.execute(select(func.count()).select_from(Ballot).where(Ballot.election_id == election_id))
+        return result.scalar_one()
+
+    @staticmethod
+    async def _store(election_id, counts: List[List[int]], vote_count: int) -> None:
+        redis = await get_redis()
+        key = TALLY_KEY.format(election_id=election_id)
+        tmp_key = f"{key}:rebuild"
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.delete(tmp_key)
+            pipe.hset(tmp_key, mapping=TallyService._to_mapping(counts, vote_count))
+            pipe.rename(tmp_key, key)
+            await pipe.execute()
+
+    @staticmethod
+    async def rebuild(db: AsyncSession, election: Election) -> Tuple[List[List[int]], int]:
+        """Reconcile the Redis counters with the ballots table."""
+        counts, vote_count = await TallyService.compute_from_ballots(db, election)
+        try:
+            await TallyService._store(election.id, counts, vote_count)
+        except Exception as e:
+            logger.warning("[TALLY] Failed to store rebuilt tally for %s: %s", election.id, e)
+        return counts, vote_count
+
+    @staticmethod
+    async def _seed_from_checkpoint(db: AsyncSession, election: Election) -> Optional[Tuple[List[List[int]], int]]:
+        """Reuse the Postgres checkpoint when it still matches the ballot count."""
+        result = await db.execute(select(Result.running_tally).where(Result.election_id == election.id))
+        checkpoint = result.scalar_one_or_none()
+        if not checkpoint:
+            return None
+        counts, vote_count = TallyService._from_mapping(election.questions, checkpoint)
+        if vote_count != await TallyService.count_ballots(db, election.id):
+            return None
+        await TallyService._store(election.id, counts, vote_count)
+        return counts, vote_count
+
+    @staticmethod
+    async def read(db: AsyncSession, election: Election) -> Tuple[List[List[int]], int]:
+        """Return (counts per question/option, ballot count) in O(options)."""
+        try:
+            redis = await get_redis()
+            mapping = await redis.hgetall(TALLY_KEY.format(election_id=election.id))
+            if mapping:
+                return TallyService._from_mapping(election.questions, mapping)
+            seeded = await TallyService._seed_from_checkpoint(db, election)
+            if seeded:
+                return seeded
+        except Exception as e:
+            logger.warning("[TALLY] Running tally unavailable for %s: %s", election.id, e)
+        return await TallyService.rebuild(db, election)
+
+    @staticmethod
+    async def read_counters(election_id, questions: List[Dict[str, Any]]) -> Optional[Tuple[List[List[int]], int]]:
+        """Running counters straight from Redis, None when not seeded (no Postgres fallback)."""
+        try:
+            redis = await get_redis()
+            mapping = await redis.hgetall(TALLY_KEY.format(election_id=election_id))
+        except Exception:
+            return None
+        return TallyService._from_mapping(questions, mapping) if mapping else None
+
+    @staticmethod
+    async def checkpoint(db: AsyncSession, election_id) -> None:
+        """Persist the Redis counters into results.running_tally, reconciling on drift."""
+        election_id = uuid.UUID(str(election_id))
+        election = (await db.execute(select(Election).where(Election.id == election_id))).scalar_one_or_none()
+        if not election:
+            return
+        redis = await get_redis()
+        mapping = await redis.hgetall(TALLY_KEY.format(election_id=election_id))
+        if mapping:
+            counts, vote_count = TallyService._from_mapping(election.questions, mapping)
+            if vote_count != await TallyService.count_ballots(db, election_id):
+                logger.warning("[TALLY] Drift detected for %s, rebuilding counters", election_id)
+                counts, vote_count = await TallyService.rebuild(db, election)
+        else:
+            counts, vote_count = await TallyService.rebuild(db, election)
+
+        result = (await db.execute(select(Result).where(Result.election_id == election_id))).scalar_one_or_none()
+        if result is None:
+            result = Result(election_id=election_id)
+            db.add(result)
+        result.running_tally = TallyService._to_mapping(counts, vote_count)
+        result.running_tally_at = datetime.utcnow()
+        await db.commit()
+
+    @staticmethod
+    async def checkpoint_dirty(db: AsyncSession) -> int:
+        """Checkpoint every election whose counters changed since the last pass."""
+        redis = await get_redis()
+        election_ids = await redis.spop(DIRTY_SET, 1000) or []
+        for election_id in election_ids:
+            try:
+                await TallyService.checkpoint(db, election_id)
+            except Exception as e:
+                await db.rollback()
+                await redis.sadd(DIRTY_SET, election_id)
+                logger.error("[TALLY] Checkpoint failed for %s: %s", election_id, e)
+        return len(election_ids)
+
+    @staticmethod
+    async def read_snapshot(db: AsyncSession, election: Election) -> Optional[Dict[str, Any]]:
+        """Frozen stats of a closed election, with its content hash; None if not frozen."""
+        if election.status not in (ElectionStatus.CLOSED, ElectionStatus.TALLIED):
+            return None
+        result = await db.execute(
+            select(Result.decrypted_result, Result.result_hash).where(Result.election_id == election.id)
+        )
+        row = result.first()
+        if row is None or not row.decrypted_result or "results_by_question" not in row.decrypted_result:
+            return None
+        return {**row.decrypted_result, "result_hash": row.result_hash}
+
+    @staticmethod
+    async def discard(election_id) -> None:
+        try:
+            redis = await get_redis()
+            await redis.delete(TALLY_KEY.format(election_id=election_id))
+            await redis.srem(DIRTY_SET, str(election_id))
+        except Exception:
+            pass
+
+
+tally_service = TallyService()
@@ -0,0 +1,162 @@
+"""
+Front line of /ballots/verify: keeps tracking-code probes away from Postgres.
+- TrackingCodeFilter: one Bloom filter over the codes of all elections, as a
+  Redis bitmap shared by all workers. A probe reads k bits of one declared key
+  (plus the ready flag, same hash slot), whatever the number of elections. It
+  is set before the voter sees the tracking code (and before a queued ballot
+  leaves the pending hash), and rebuilt from the ballots table by one worker at
+  startup or whenever Redis lost it. Until the rebuild is done every probe goes
+  to the database; a "no" from the filter is always right. Codes of deleted
+  elections stay set (false positives) until the next rebuild.
+- RecentVerifications: per-worker LRU of recent positive answers.
+"""
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.models.models import Ballot
+
+logger = logging.getLogger(__name__)
+
+# Hash tag: the probe and rebuild keys live in one cluster slot
+FILTER_KEY = "{codes:bloom}:bits"
+READY_KEY = "{codes:bloom}:ready"  # filter parameters, once the rebuild is done
+PARAMS_KEY = "{codes:bloom}:params"  # parameters the bitmap was built with
+REBUILD_KEY = "{codes:bloom}:rebuild"
+REBUILD_LOCK_KEY = "codes:bloom:rebuild"
+
+# -1: filter not built (ask the database), 0: no such code, 1: maybe present
+_PROBE = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return -1
+end
+for i = 2, #ARGV do
+    if redis.call('GETBIT', KEYS[2], ARGV[i]) == 0 then
+        return 0
+    end
+end
+return 1
+"""
+
+
+def bit_positions(tracking_code: str) -> List[int]:
+    """k positions by double hashing of sha256(code)."""
+    digest = hashlib.sha256(tracking_code.encode()).digest()
+    h1 = int.from_bytes(digest[:8], "big")
+    h2 = int.from_bytes(digest[8:16], "big") | 1
+    return [(h1 + i * h2) % settings.VERIFY_BLOOM_BITS for i in range(settings.VERIFY_BLOOM_HASHES)]
+
+
+def _params() -> str:
+    return f"{settings.VERIFY_BLOOM_BITS}:{settings.VERIFY_BLOOM_HASHES}"
+
+
+class TrackingCodeFilter:
+    def __init__(self):
+        self._reset_pending = False  # an add failed: filters must not answer misses
+
+    @staticmethod
+    def add_to_pipeline(pipe, tracking_codes: List[str]) -> None:
+        for tracking_code in tracking_codes:
+            for position in bit_positions(tracking_code):
+                pipe.setbit(FILTER_KEY, position, 1)
+
+    async def add(self, tracking_code: str) -> None:
+        try:
+            redis = await get_redis()
+            async with redis.pipeline(transaction=False) as pipe:
+                self.add_to_pipeline(pipe, [tracking_code])
+                await pipe.execute()
+        except Exception as e:
+            # Ce code manque au filtre: plus de réponse négative jusqu'à la reconstruction
+            logger.warning("[VERIFY] Failed to add %s to the filter: %s", tracking_code, e)
+            self._reset_pending = True
+
+    async def might_contain(self, tracking_code: str) -> bool:
+        """False only when no ballot can have this tracking code."""
+        try:
+            redis = await get_redis()
+            if self._reset_pending:
+                await redis.delete(READY_KEY)
+                self._reset_pending = False
+                return True
+            return await redis.eval(_PROBE, 2, READY_KEY, FILTER_KEY, _params(), *bit_positions(tracking_code)) != 0
+        except Exception as e:
+            logger.warning("[VERIFY] Filter unavailable: %s", e)
+            return True
+
+    @staticmethod
+    async def _store(redis, bits: bytearray) -> None:
+        # OR with the live bitmap: keeps codes added while the snapshot was read
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.set(REBUILD_KEY, bytes(bits))
+            pipe.bitop("OR", REBUILD_KEY, REBUILD_KEY, FILTER_KEY)
+            pipe.rename(REBUILD_KEY, FILTER_KEY)
+            await pipe.execute()
+
+    async def rebuild(self, db: AsyncSession) -> int:
+        """Rebuild the filter from the ballots table; returns codes indexed."""
+        redis = await get_redis()
+        if await redis.get(PARAMS_KEY) != _params():
+            # A bitmap built with another size or hash count is useless
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.delete(FILTER_KEY)
+                pipe.set(PARAMS_KEY, _params())
+                await pipe.execute()
+        indexed = 0
+        bits = bytearray(settings.VERIFY_BLOOM_BITS // 8)
+        stream = await db.stream(
+            select(Ballot.tracking_code).execution_options(yield_per=settings.TALLY_STREAM_CHUNK_SIZE)
+        )
+        async for tracking_code in stream.scalars():
+            # Bit 0 of a Redis bitmap is the most significant bit of byte 0
+            for position in bit_positions(tracking_code):
+                bits[position >> 3] |= 0x80 >> (position & 7)
+            indexed += 1
+        await self._store(redis, bits)
+        await redis.set(READY_KEY, _params())
+        return indexed
+
+    async def ensure_built(self, db: AsyncSession) -> None:
+        """Rebuild if Redis has no filters; one worker at a time."""
+        redis = await get_redis()
+        if await redis.get(READY_KEY) == _params():
+            return
+        if not await redis.set(REBUILD_LOCK_KEY, 1, nx=True, ex=600):
+            return
+        try:
+            started = time.monotonic()
+            indexed = await self.rebuild(db)
+            logger.info("[VERIFY] Tracking-code filters rebuilt: %d codes in %.1fs", indexed, time.monotonic() - started)
+        finally:
+            await redis.delete(REBUILD_LOCK_KEY)
+
+
+class RecentVerifications:
+    def __init__(self):
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, tracking_code: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(tracking_code)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] >= settings.VERIFY_CACHE_TTL_SECONDS:
+            del self._entries[tracking_code]
+            return None
+        self._entries.move_to_end(tracking_code)
+        return entry[1]
+
+    def put(self, tracking_code: str, response: Dict[str, Any]) -> None:
+        self._entries[tracking_code] = (time.monotonic(), response)
+        self._entries.move_to_end(tracking_code)
+        while len(self._entries) > settings.VERIFY_CACHE_SIZE:
+            self._entries.popitem(last=False)
+
+
+tracking_filter = TrackingCodeFilter()
+recent_verifications = RecentVerifications()
@@ -0,0 +1,73 @@
+"""
+ElGamal microbenchmark: fixed-base tables vs plain modular exponentiation.
+Reports table build time and operations per second for exponentiations,
+encryption, re-encryption, bit-proof generation and verification, and
+batch verification of whole ballots against one-by-one verify_zkp.
+Usage (from backend/): python -m benchmarks.crypto_benchmark [--ops 200] [--window 6] [--batch 100]
+"""
+import argparse
+import secrets
+import time
+from app.core.config import settings
+from app.services.crypto_service import CryptoEngine, FixedBase, G, P, Q
+
+
+def _rate(label: str, ops: int, fn) -> float:
+    start = time.perf_counter()
+    for _ in range(ops):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {ops / elapsed:10.1f} ops/s")
+    return ops / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--window", type=int, default=settings.CRYPTO_FIXED_BASE_WINDOW)
+    parser.add_argument("--batch", type=int, default=100, help="Ballots (3 options) in the batch verification run")
+    args = parser.parse_args()
+    settings.CRYPTO_FIXED_BASE_WINDOW = args.window
+
+    start = time.perf_counter()
+    table = FixedBase(G, args.window)
+    print(f"table build (w={args.window})       {time.perf_counter() - start:10.3f}s")
+
+    exponents = [secrets.randbelow(Q) for _ in range(args.ops)]
+    it = iter(exponents * 2)
+    plain = _rate("g^x plain pow", args.ops, lambda: pow(G, next(it), P))
+    it = iter(exponents * 2)
+    fixed = _rate("g^x fixed-base", args.ops, lambda: table.pow(next(it)))
+    print(f"{'speedup':<28} {fixed / plain:10.1f}x")
+
+    keypair = CryptoEngine.generate_keypair()
+    public_key = keypair["public_key"]
+    CryptoEngine.encrypt(0, public_key)  # builds the h table outside the timings
+    ciphertext = CryptoEngine.encrypt(1, public_key)
+    _rate("encrypt", args.ops, lambda: CryptoEngine.encrypt(1, public_key))
+    _rate("re-encrypt", args.ops, lambda: CryptoEngine.reencrypt(ciphertext, public_key))
+
+    nonce = secrets.randbelow(Q)
+    ciphertext = CryptoEngine.encrypt(1, public_key, nonce)
+    proof = CryptoEngine.prove_bit(1, nonce, ciphertext, public_key)
+    _rate("prove 0/1", args.ops, lambda: CryptoEngine.prove_bit(1, nonce, ciphertext, public_key))
+    _rate("verify 0/1", args.ops, lambda: CryptoEngine.verify_bit(ciphertext, proof, public_key))
+
+    questions = [{"type": "single", "options": ["A", "B", "C"]}]
+    items = []
+    for _ in range(args.batch):
+        selections = {"selections": [[0, 1, 0]]}
+        encrypted, nonces = CryptoEngine.encrypt_ballot(selections, public_key)
+        proof = CryptoEngine.generate_zkp(selections, public_key, encrypted, nonces, questions)
+        items.append((encrypted, proof, public_key, questions))
+    it = iter(items)
+    single = _rate("verify_zkp (ballots)", args.batch, lambda: CryptoEngine.verify_zkp(*next(it)))
+    start = time.perf_counter()
+    CryptoEngine.verify_zkp_batch(items)
+    batch = args.batch / (time.perf_counter() - start)
+    print(f"{'verify_zkp_batch (ballots)':<28} {batch:10.1f} ops/s")
+    print(f"{'speedup':<28} {batch / single:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+BALLOT_INGEST_MODE benchmark: one transaction per ballot vs write-behind.
+Submits ballots through submit_ballot at a given concurrency against
+DATABASE_URL and REDIS_URL, and reports ballots/s until acknowledgement and
+until every ballot is in Postgres. The election and its user are deleted afterwards.
+Usage (from backend/): python -m benchmarks.ingest_benchmark [--ballots 20000] [--concurrency 64]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from sqlalchemy import delete, func, select
+from app.api.v1.ballots import submit_ballot
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.models import Ballot, BallotChoice, Election, ElectionStatus, User
+from app.schemas.schemas import BallotSubmit
+from app.services.ballot_ingest_service import ballot_ingest
+from benchmarks.tally_benchmark import QUESTIONS, generate_ballots
+
+
+async def _seed(db) -> Election:
+    user = User(email=f"bench-{uuid.uuid4().hex[:8]}@novavote.local", hashed_password="-", is_admin=True)
+    db.add(user)
+    await db.flush()
+    election = Election(title="Ingest benchmark", admin_id=user.id, public_key={}, questions=QUESTIONS,
+                        status=ElectionStatus.OPEN, voter_emails=[])
+    db.add(election)
+    await db.commit()
+    return election
+
+
+async def _cleanup(db, election: Election) -> None:
+    await db.execute(delete(BallotChoice).where(BallotChoice.election_id == election.id))
+    await db.execute(delete(Ballot).where(Ballot.election_id == election.id))
+    await db.execute(delete(Election).where(Election.id == election.id))
+    await db.execute(delete(User).where(User.id == election.admin_id))
+    await db.commit()
+
+
+async def _stored(election: Election) -> int:
+    async with SessionLocal() as db:
+        return (await db.execute(
+            select(func.count()).select_from(Ballot).where(Ballot.election_id == election.id)
+        )).scalar_one()
+
+
+async def run(mode: str, n_ballots: int, concurrency: int) -> None:
+    settings.BALLOT_INGEST_MODE = mode
+    async with SessionLocal() as db:
+        election = await _seed(db)
+    submissions = [
+        BallotSubmit(election_id=election.id, encrypted_ballot=b, proof={}, voter_fingerprint=uuid.uuid4().hex)
+        for b in generate_ballots(n_ballots, seed=1)
+    ]
+    flusher = asyncio.create_task(ballot_ingest.run()) if mode == "queued" else None
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def submit(submission: BallotSubmit) -> None:
+        async with semaphore:
+            async with SessionLocal() as db:
+                await submit_ballot(submission, db)
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*[submit(s) for s in submissions])
+        acked_s = time.perf_counter() - start
+        while await _stored(election) < n_ballots:
+            await asyncio.sleep(0.05)
+        stored_s = time.perf_counter() - start
+        print(f"{mode:>7} | {n_ballots} ballots, concurrency {concurrency}"
+              f" | acknowledged: {n_ballots / acked_s:8.0f} ballots/s"
+              f" | stored: {n_ballots / stored_s:8.0f} ballots/s")
+    finally:
+        if flusher:
+            flusher.cancel()
+        async with SessionLocal() as db:
+            await _cleanup(db, election)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ballots", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--modes", default="direct,queued")
+    args = parser.parse_args()
+    # Pas d'envoi d'emails pendant la mesure
+    settings.MAIL_ENABLED = False
+
+    async def run_all():
+        # One event loop: the Redis client and the DB pool are bound to it
+        for mode in args.modes.split(","):
+            await run(mode, args.ballots, args.concurrency)
+
+    asyncio.run(run_all())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Ranked-choice benchmark: IRV, Borda and Condorcet/Schulze on random rankings.
+Usage (from backend/): python -m benchmarks.ranked_benchmark [--ballots 500000] [--candidates 20]
+"""
+import argparse
+import time
+from collections import Counter
+import numpy as np
+from app.services.ranked_tally import RankedBallots, borda, instant_runoff, pairwise_matrix, schulze
+
+
+def generate_patterns(n_ballots: int, n_candidates: int, seed: int = 42) -> Counter:
+    rng = np.random.default_rng(seed)
+    # Skewed popularity so IRV needs several rounds; random truncation exhausts some ballots
+    popularity = rng.dirichlet(np.ones(n_candidates))
+    keys = rng.random((n_ballots, n_candidates)) ** (1 / popularity)
+    rankings = np.argsort(-keys, axis=1)
+    lengths = rng.integers(1, n_candidates + 1, size=n_ballots)
+    return Counter(tuple(row[:length]) for row, length in zip(rankings.tolist(), lengths.tolist()))
+
+
+def _timed(label: str, fn):
+    start = time.perf_counter()
+    value = fn()
+    print(f"{label:<10} {time.perf_counter() - start:7.3f}s")
+    return value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ballots", type=int, default=500_000)
+    parser.add_argument("--candidates", type=int, default=20)
+    args = parser.parse_args()
+
+    patterns = _timed("generate", lambda: generate_patterns(args.ballots, args.candidates))
+    ballots = _timed("encode", lambda: RankedBallots.from_patterns(args.candidates, patterns))
+    irv = _timed("irv", lambda: instant_runoff(ballots))
+    _timed("borda", lambda: borda(ballots))
+    d = _timed("pairwise", lambda: pairwise_matrix(ballots))
+    _timed("schulze", lambda: schulze(d))
+    print(f"{len(patterns)} distinct rankings, {len(irv['rounds'])} IRV rounds, winner {irv['winner']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Tally throughput benchmark: legacy per-question loop vs TallyEngine.
+Usage (from backend/): python -m benchmarks.tally_benchmark [--ballots 100000]
+"""
+import argparse
+import base64
+import json
+import random
+import time
+from app.services.tally_engine import TallyEngine, decode_selection, counted_options
+
+QUESTIONS = [
+    {"question": "Single", "type": "single", "options": ["A", "B", "C", "D", "Vote blanc"]},
+    {"question": "Multiple", "type": "multiple", "options": ["w", "x", "y", "z"]},
+    {"question": "Ranking", "type": "ranking", "options": ["p", "q", "r", "s"]},
+]
+
+
+def _encode(value: str) -> dict:
+    return {"encrypted": base64.b64encode(value.encode("iso-8859-1")).decode()}
+
+
+def generate_ballots(n: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    ballots = []
+    for _ in range(n):
+        single = rng.choice(QUESTIONS[0]["options"])
+        multiple = rng.sample(QUESTIONS[1]["options"], rng.randint(1, 4))
+        ranking = rng.sample(QUESTIONS[2]["options"], 4)
+        ballots.append({"choices": [
+            _encode(single),
+            _encode(json.dumps(multiple)),
+            _encode(json.dumps({str(i + 1): opt for i, opt in enumerate(ranking)})),
+        ]})
+    return ballots
+
+
+def legacy_tally(questions: list, ballots: list) -> list:
+    """Questions outside, ballots inside: every ballot re-parsed per question."""
+    counts = []
+    for q_idx, question in enumerate(questions):
+        row = [0] * len(question["options"])
+        for ballot in ballots:
+            choices = ballot.get("choices", [])
+            if q_idx < len(choices):
+                selection = decode_selection(question, choices[q_idx]["encrypted"])
+                for o_idx in counted_options(question, selection):
+                    row[o_idx] += 1
+        counts.append(row)
+    return counts
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ballots", type=int, default=100_000)
+    args = parser.parse_args()
+
+    ballots = generate_ballots(args.ballots)
+    legacy, legacy_s = _timed(lambda: legacy_tally(QUESTIONS, ballots))
+    engine, engine_s = _timed(lambda: TallyEngine(QUESTIONS).add_many(ballots).result())
+    assert legacy == engine.counts_as_lists(), "engine and legacy tallies differ"
+
+    print(f"ballots:  {args.ballots}")
+    print(f"legacy:   {legacy_s:.3f}s ({args.ballots / legacy_s:,.0f} ballots/s)")
+    print(f"engine:   {engine_s:.3f}s ({args.ballots / engine_s:,.0f} ballots/s)")
+    print(f"speedup:  {legacy_s / engine_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+TALLY_MODE benchmark: Python engine vs Postgres JSONB aggregation.
+Seeds a throwaway election in DATABASE_URL, then reports latency and the bytes
+each mode pulls over the wire. The election and its user are deleted afterwards.
+Usage (from backend/): python -m benchmarks.tally_mode_benchmark [--sizes 10000,100000,1000000]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from sqlalchemy import delete, func, insert, select, text
+from app.core.database import SessionLocal
+from app.models.models import Ballot, Election, ElectionStatus, User
+from app.services.tally_service import TallyService, JSONB_TALLY_SQL
+from benchmarks.tally_benchmark import QUESTIONS, generate_ballots
+
+INSERT_CHUNK = 10_000
+
+
+async def _seed(db, size: int) -> Election:
+    user = User(email=f"bench-{uuid.uuid4().hex[:8]}@novavote.local", hashed_password="-", is_admin=True)
+    db.add(user)
+    await db.flush()
+    election = Election(title=f"Benchmark {size}", admin_id=user.id, public_key={}, questions=QUESTIONS,
+                        status=ElectionStatus.CLOSED, voter_emails=[])
+    db.add(election)
+    await db.flush()
+    for start in range(0, size, INSERT_CHUNK):
+        ballots = generate_ballots(min(INSERT_CHUNK, size - start), seed=start)
+        await db.execute(insert(Ballot), [
+            {"election_id": election.id, "encrypted_ballot": b, "proof": {},
+             "tracking_code": uuid.uuid4().hex[:16].upper()}
+            for b in ballots
+        ])
+    await db.commit()
+    return election
+
+
+async def _cleanup(db, election: Election) -> None:
+    await db.execute(delete(Ballot).where(Ballot.election_id == election.id))
+    await db.execute(delete(Election).where(Election.id == election.id))
+    await db.execute(delete(User).where(User.id == election.admin_id))
+    await db.commit()
+
+
+async def _timed(coro):
+    start = time.perf_counter()
+    value = await coro
+    return value, time.perf_counter() - start
+
+
+async def run(size: int) -> None:
+    async with SessionLocal() as db:
+        election = await _seed(db, size)
+        try:
+            (engine_counts, _), engine_s = await _timed(TallyService._count_with_engine(db, election))
+            (pg_counts, _), pg_s = await _timed(TallyService._count_in_postgres(db, election))
+            assert engine_counts == pg_counts, "modes disagree"
+
+            # Payload bytes only (no protocol framing)
+            engine_bytes = (await db.execute(
+                select(func.sum(func.octet_length(text("encrypted_ballot::text"))))
+                .select_from(Ballot).where(Ballot.election_id == election.id)
+            )).scalar_one()
+            pg_rows = (await db.execute(JSONB_TALLY_SQL, {"election_id": election.id})).all()
+            pg_bytes = sum(4 + len(encrypted) + 8 for _, encrypted, _ in pg_rows)
+
+            print(f"{size:>9} ballots | python: {engine_s:7.3f}s {engine_bytes / 1e6:9.2f} MB"
+                  f" | postgres: {pg_s:7.3f}s {pg_bytes / 1e3:6.2f} kB")
+        finally:
+            await _cleanup(db, election)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    args = parser.parse_args()
+    for size in (int(s) for s in args.sizes.split(",")):
+        asyncio.run(run(size))
+
+
+if __name__ == "__main__":
+    main()
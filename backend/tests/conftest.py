@@ -0,0 +1,15 @@
+import pytest
+
+from app.core.config import settings
+from app.services.crypto_service import _dlog_table
+
+
+@pytest.fixture(scope="session", autouse=True)
+def dlog_table(tmp_path_factory):
+    """Small discrete-log table outside STORAGE_PATH; several giant steps per tally."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(settings, "CRYPTO_DLOG_TABLE_PATH", str(tmp_path_factory.mktemp("crypto")))
+        mp.setattr(settings, "CRYPTO_DLOG_BABY_STEPS", 1 << 10)
+        _dlog_table.cache_clear()
+        yield
+    _dlog_table.cache_clear()
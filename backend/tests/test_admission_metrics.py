@@ -0,0 +1,37 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+
+from app.api.v1.dependencies import get_current_user
+from app.main import app
+
+
+def get(path, headers=None):
+    async def request():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+    return asyncio.run(request())
+
+
+def test_admission_metrics_require_credentials():
+    assert get("/metrics/admission").status_code in (401, 403)
+
+
+def test_admission_metrics_require_an_admin():
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(is_admin=False)
+    try:
+        assert get("/metrics/admission", {"Authorization": "Bearer x"}).status_code == 403
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_admission_metrics_for_admins():
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(is_admin=True)
+    try:
+        response = get("/metrics/admission", {"Authorization": "Bearer x"})
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 200
+    assert isinstance(response.json(), dict)
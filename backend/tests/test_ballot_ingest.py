@@ -0,0 +1,211 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime
+
+import fakeredis
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.models.models import Ballot, Election
+from app.services import ballot_ingest_service
+from app.services.ballot_ingest_service import (
+    DEAD_LETTER_STREAM, GROUP, PENDING_KEY, REJECTED_KEY, STREAM, BallotIngest, DuplicateVoteError,
+    ElectionClosedError
+)
+
+
+class Rows:
+    def __init__(self, values):
+        self.values = list(values)
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.values
+
+    def __iter__(self):
+        return iter(self.values)
+
+
+class FakeDatabase:
+    """The ballots / ballot_choices semantics _flush relies on: ON CONFLICT DO
+    NOTHING on the primary key and on (election_id, voter_email)."""
+
+    def __init__(self, election_ids):
+        self.elections = set(election_ids)
+        self.ballots = {}
+        self.choices = []
+
+    def insert_ballots(self, rows):
+        inserted = []
+        for row in rows:
+            voter = (row["election_id"], row["voter_email"])
+            taken = row["voter_email"] is not None and any(
+                (b["election_id"], b["voter_email"]) == voter for b in self.ballots.values()
+            )
+            if row["id"] not in self.ballots and not taken:
+                self.ballots[row["id"]] = row
+                inserted.append(row["id"])
+        return inserted
+
+
+class FakeSession:
+    def __init__(self, database):
+        self.database = database
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        if statement.is_insert:
+            rows = [{column.name: value for column, value in row.items()} for row in statement._multi_values[0]]
+            if statement.table.name == "ballot_choices":
+                self.database.choices.extend(rows)
+                return Rows([])
+            return Rows(self.database.insert_ballots(rows))
+        column = statement.column_descriptions[0]
+        (values,) = statement.compile(dialect=postgresql.dialect()).params.values()
+        if column["entity"] is Election:
+            return Rows(e for e in values if e in self.database.elections)
+        if column["name"] == "voter_email":
+            return Rows(b["voter_email"] for b in self.database.ballots.values()
+                        if b["election_id"] == values and b["voter_email"] is not None)
+        return Rows(i for i in values if i in self.database.ballots)
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+ELECTION_ID = str(uuid.uuid4())
+
+
+def make_ballot(voter_email=None, election_id=ELECTION_ID):
+    return {
+        "id": str(uuid.uuid4()),
+        "election_id": election_id,
+        "election_title": "Test",
+        "encrypted_ballot": {"choices": []},
+        "proof": {},
+        "tracking_code": uuid.uuid4().hex[:16].upper(),
+        "ipfs_hash": None,
+        "timestamp": datetime.utcnow().isoformat(),
+        "voter_fingerprint": None,
+        "voter_email": voter_email,
+        "choices": [[0, 1, None]],
+        "proof_verified": False,
+    }
+
+
+@pytest.fixture
+def ingest(monkeypatch):
+    database = FakeDatabase({uuid.UUID(ELECTION_ID)})
+    after_commit = []
+
+    async def record(ballots):
+        after_commit.append([b["id"] for b in ballots])
+
+    monkeypatch.setattr(ballot_ingest_service, "SessionLocal", lambda: FakeSession(database))
+    monkeypatch.setattr(BallotIngest, "_after_commit", staticmethod(record))
+
+    def run(scenario):
+        async def main():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+            async def get_redis():
+                return redis
+
+            monkeypatch.setattr(ballot_ingest_service, "get_redis", get_redis)
+            return await scenario(BallotIngest(), redis)
+        return asyncio.run(main())
+
+    return run, database, after_commit
+
+
+def test_one_queued_ballot_per_voter(ingest):
+    run, database, _ = ingest
+    stored = make_ballot("stored@example.org")
+    database.insert_ballots([{**stored, "id": uuid.UUID(stored["id"]), "election_id": uuid.UUID(ELECTION_ID)}])
+
+    async def scenario(ingest, redis):
+        await ingest.enqueue(make_ballot("new@example.org"))
+        await ingest.enqueue(make_ballot())
+        await ingest.enqueue(make_ballot())  # anonymous ballots are never duplicates
+        for voter in ("stored@example.org", "new@example.org"):
+            with pytest.raises(DuplicateVoteError):
+                await ingest.enqueue(make_ballot(voter))
+        await ingest.close_election(ELECTION_ID)
+        with pytest.raises(ElectionClosedError):
+            await ingest.enqueue(make_ballot("late@example.org"))
+        return await redis.xlen(STREAM)
+
+    assert run(scenario) == 3
+
+
+def test_flush_stores_each_ballot_once(ingest):
+    run, database, after_commit = ingest
+    ballots = [make_ballot("a@example.org"), make_ballot("b@example.org"), make_ballot()]
+
+    async def scenario(ingest, redis):
+        for ballot in ballots:
+            await ingest.enqueue(ballot)
+        flushed = await ingest.flush_once()
+        return flushed, await ingest.flush_once(), await redis.xlen(STREAM), await redis.hlen(PENDING_KEY)
+
+    assert run(scenario) == (3, 0, 0, 0)
+    assert set(map(str, database.ballots)) == {b["id"] for b in ballots}
+    assert len(database.choices) == 3
+    assert after_commit == [[b["id"] for b in ballots]]
+
+
+def test_replayed_batch_is_not_stored_or_counted_twice(ingest):
+    """A worker committed the batch, then died before XACK: the entries are reclaimed."""
+    run, database, after_commit = ingest
+    ballots = [make_ballot("a@example.org"), make_ballot()]
+
+    async def scenario(ingest, redis):
+        for ballot in ballots:
+            await ingest.enqueue(ballot)
+        await ingest._ensure_group(redis)
+        await redis.xreadgroup(GROUP, "dead-worker", {STREAM: ">"})
+        async with ballot_ingest_service.SessionLocal() as db:
+            await BallotIngest._insert(db, ballots)
+        assert await ingest.flush_once() == 0  # nothing new, the entries belong to the dead worker
+        reclaimed = await ingest.flush_once(claim_idle_ms=0)
+        return reclaimed, await redis.xlen(STREAM), await redis.xlen(DEAD_LETTER_STREAM), await redis.hlen(PENDING_KEY)
+
+    assert run(scenario) == (2, 0, 0, 0)
+    assert len(database.ballots) == 2
+    assert len(database.choices) == 2
+    assert after_commit == [[]]
+
+
+def test_conflicting_voter_is_dead_lettered(ingest):
+    """The voter set missed a ballot stored directly: the insert conflict rejects it."""
+    run, database, after_commit = ingest
+    stored = make_ballot("a@example.org")
+    duplicate, other = make_ballot("a@example.org"), make_ballot("b@example.org")
+    orphan = make_ballot(election_id=str(uuid.uuid4()))
+
+    async def scenario(ingest, redis):
+        for ballot in (duplicate, other, orphan):
+            await ingest.enqueue(ballot)
+        async with ballot_ingest_service.SessionLocal() as db:
+            await BallotIngest._insert(db, [stored])
+        await ingest.flush_once()
+        return {
+            code: json.loads(entry)["reason"] for code, entry in (await redis.hgetall(REJECTED_KEY)).items()
+        }, await redis.xlen(DEAD_LETTER_STREAM)
+
+    reasons, dead_letters = run(scenario)
+    assert reasons == {duplicate["tracking_code"]: "already voted", orphan["tracking_code"]: "election not found"}
+    assert dead_letters == 2
+    assert set(map(str, database.ballots)) == {stored["id"], other["id"]}
+    assert after_commit == [[other["id"]]]
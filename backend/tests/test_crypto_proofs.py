@@ -0,0 +1,135 @@
+import secrets
+
+import pytest
+
+from app.core.config import settings
+from app.services.crypto_service import (
+    CHALLENGE_BITS, G_INV, P, Q, CryptoEngine, _challenge, _from_ciphertext, _row_product, _to_ciphertext,
+    allowed_sums, g_pow, h_pow
+)
+
+QUESTIONS = [{"type": "multiple", "options": ["x", "y"]}]
+
+
+@pytest.fixture(scope="module")
+def public_key():
+    return CryptoEngine.generate_keypair()["public_key"]
+
+
+def honest_ballot(selections, public_key, questions=QUESTIONS):
+    ballot_data = {"selections": selections}
+    encrypted_ballot, nonces = CryptoEngine.encrypt_ballot(ballot_data, public_key)
+    return encrypted_ballot, CryptoEngine.generate_zkp(ballot_data, public_key, encrypted_ballot, nonces, questions)
+
+
+def forge_member(ciphertext, allowed, public_key, statement=()):
+    """Simulate every branch, then pick an unreduced last challenge share that
+    still sums to the hash modulo 2^CHALLENGE_BITS and has the simulated value modulo Q."""
+    a, b = ciphertext
+    h = int(public_key["h"])
+    c = [secrets.randbelow(Q) for _ in allowed]
+    v = [secrets.randbelow(Q) for _ in allowed]
+    A, B = [], []
+    for j, c_j, v_j in zip(allowed, c, v):
+        b_j = b * pow(G_INV, j, P) % P
+        A.append(g_pow(v_j) * pow(pow(a, c_j, P), -1, P) % P)
+        B.append(h_pow(public_key, v_j) * pow(pow(b_j, c_j, P), -1, P) % P)
+    modulus = 1 << CHALLENGE_BITS
+    target = _challenge(h, a, b, *statement, *(x for pair in zip(A, B) for x in pair))
+    rest = sum(c[:-1])
+    t = (c[-1] - (target - rest)) * pow(modulus, -1, Q) % Q
+    c[-1] = target - rest + t * modulus
+    if c[-1] < 0:
+        c[-1] += Q * modulus
+    return A, B, c, v
+
+
+def forged_ballot(plaintexts, public_key, questions=QUESTIONS):
+    """Ballot encrypting arbitrary counts, with proofs that only the range checks reject."""
+    ciphertexts = [[CryptoEngine.encrypt(m, public_key) for m in row] for row in plaintexts]
+    encrypted_ballot = {"scheme": "elgamal", "ciphertexts": [[_from_ciphertext(ct) for ct in row] for row in ciphertexts]}
+    proofs, sums = [], []
+    for question, row in zip(questions, encrypted_ballot["ciphertexts"]):
+        row_proofs = []
+        for ct in row:
+            (A0, A1), (B0, B1), (c0, c1), (v0, v1) = forge_member(_to_ciphertext(ct), (0, 1), public_key)
+            row_proofs.append({key: str(value) for key, value in
+                               dict(A0=A0, B0=B0, A1=A1, B1=B1, c0=c0, c1=c1, v0=v0, v1=v1).items()})
+        proofs.append(row_proofs)
+        allowed = allowed_sums(question)
+        A, B, c, v = forge_member(_row_product(row), allowed, public_key, allowed)
+        sums.append({"A": [str(x) for x in A], "B": [str(x) for x in B],
+                     "c": [str(x) for x in c], "v": [str(x) for x in v]})
+    return encrypted_ballot, {"proof_type": "disjunctive_chaum_pedersen", "proofs": proofs, "sums": sums}
+
+
+def test_honest_ballots_verify(public_key):
+    for selections in ([[0, 0]], [[1, 0]], [[1, 1]]):
+        assert CryptoEngine.verify_zkp(*honest_ballot(selections, public_key), public_key, QUESTIONS)
+
+
+def test_forged_bit_proof_is_rejected(public_key):
+    ciphertext = CryptoEngine.encrypt(5, public_key)
+    A, B, c, v = forge_member(ciphertext, (0, 1), public_key)
+    assert c[-1] >= 1 << CHALLENGE_BITS
+    proof = {key: str(value) for key, value in
+             dict(A0=A[0], B0=B[0], A1=A[1], B1=B[1], c0=c[0], c1=c[1], v0=v[0], v1=v[1]).items()}
+    assert not CryptoEngine.verify_bit(ciphertext, proof, public_key)
+
+
+def test_forged_ballot_is_rejected(public_key):
+    assert not CryptoEngine.verify_zkp(*forged_ballot([[1000, 0]], public_key), public_key, QUESTIONS)
+
+
+def test_response_out_of_range_is_rejected(public_key):
+    encrypted_ballot, proof = honest_ballot([[1, 0]], public_key)
+    bit = proof["proofs"][0][0]
+    bit["v0"] = str(int(bit["v0"]) + Q)  # same residue, not reduced
+    assert not CryptoEngine.verify_zkp(encrypted_ballot, proof, public_key, QUESTIONS)
+
+
+def test_branch_count_must_match_allowed_values(public_key):
+    encrypted_ballot, proof = honest_ballot([[1, 0]], public_key)
+    for key in ("A", "B", "c", "v"):
+        proof["sums"][0][key] = proof["sums"][0][key][:-1]
+    assert not CryptoEngine.verify_zkp(encrypted_ballot, proof, public_key, QUESTIONS)
+
+
+def test_invalid_selection_count_cannot_be_proven(public_key):
+    with pytest.raises(ValueError):
+        honest_ballot([[1, 1]], public_key, [{"type": "single", "options": ["x", "y"]}])
+
+
+def test_batch_flags_forged_and_tampered_ballots(public_key):
+    tampered = honest_ballot([[1, 0]], public_key)
+    bit = tampered[1]["proofs"][0][1]
+    bit["v0"] = str((int(bit["v0"]) + 1) % Q)
+    items = [
+        (*honest_ballot([[1, 0]], public_key), public_key, QUESTIONS),
+        (*forged_ballot([[1000, 0]], public_key), public_key, QUESTIONS),
+        (*honest_ballot([[0, 1]], public_key), public_key, QUESTIONS),
+        (*tampered, public_key, QUESTIONS),
+        (*honest_ballot([[1, 1]], public_key), public_key, QUESTIONS),
+    ]
+    expected = [True, False, True, False, True]
+    assert CryptoEngine.verify_zkp_batch(items) == expected
+    assert [CryptoEngine.verify_zkp(*item) for item in items] == expected
+
+
+def test_batch_of_forged_ballots_only(public_key):
+    items = [(*forged_ballot([[m, 0]], public_key), public_key, QUESTIONS) for m in (2, 1000)]
+    assert CryptoEngine.verify_zkp_batch(items) == [False, False]
+
+
+WEB_CLIENT_BALLOT = ({"choices": [{"encrypted": "eA=="}]}, {"commitment": "mock"})
+
+
+def test_web_client_ballots_accepted_by_default(public_key):
+    assert CryptoEngine.verify_zkp(*WEB_CLIENT_BALLOT, public_key, QUESTIONS)
+    assert not CryptoEngine.has_real_proof(*WEB_CLIENT_BALLOT, public_key)
+
+
+def test_web_client_ballots_rejected_when_disabled(public_key, monkeypatch):
+    monkeypatch.setattr(settings, "CRYPTO_ACCEPT_CLIENT_BALLOTS", False)
+    assert not CryptoEngine.verify_zkp(*WEB_CLIENT_BALLOT, public_key, QUESTIONS)
+    assert CryptoEngine.verify_zkp(*honest_ballot([[1, 0]], public_key), public_key, QUESTIONS)
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.services.crypto_service import CryptoEngine
+from app.services.key_pool_service import generate_sealed, seal, unseal, unseal_share
+
+
+@pytest.fixture
+def two_of_three(monkeypatch):
+    monkeypatch.setattr(settings, "ELECTION_KEY_TRUSTEES", 3)
+    monkeypatch.setattr(settings, "ELECTION_KEY_THRESHOLD", 2)
+
+
+def test_generate_keypair_drops_the_election_secret():
+    keypair = CryptoEngine.generate_keypair(2, 3)
+    assert set(keypair) == {"public_key", "trustee_shares"}
+    assert [share["index"] for share in keypair["trustee_shares"]] == [1, 2, 3]
+
+
+def test_sealed_blob_holds_one_sealed_share_per_trustee(two_of_three):
+    public_key, sealed = generate_sealed()
+    sealed_shares = json.loads(sealed)
+    assert len(sealed_shares) == 3
+    shares = [unseal(item) for item in sealed_shares]
+    assert [set(share) for share in shares] == [{"index", "x"}] * 3
+    assert [share["index"] for share in shares] == [1, 2, 3]
+    assert public_key["threshold"] == 2
+
+
+def test_unseal_share_returns_only_the_requested_trustee(two_of_three):
+    _, sealed = generate_sealed()
+    assert unseal_share(sealed, 2)["index"] == 2
+    for index in (0, 4):
+        with pytest.raises(ValueError):
+            unseal_share(sealed, index)
+
+
+def test_tampered_share_is_rejected():
+    sealed = seal({"index": 1, "x": "42"})
+    tampered = sealed[:-4] + ("AAAA" if sealed[-4:] != "AAAA" else "BBBB")
+    with pytest.raises(ValueError):
+        unseal(tampered)
+
+
+def test_sealed_shares_still_decrypt(two_of_three):
+    public_key, sealed = generate_sealed()
+    ballots = []
+    for selections in ([0, 1], [1, 1], [1, 0]):
+        encrypted_ballot, _ = CryptoEngine.encrypt_ballot({"selections": [selections]}, public_key)
+        ballots.append(encrypted_ballot)
+    aggregated = CryptoEngine.aggregate_ballots(ballots)
+    partials = [CryptoEngine.partial_decrypt(aggregated, unseal_share(sealed, index)) for index in (1, 3)]
+    result = CryptoEngine.threshold_decrypt(aggregated, partials, public_key)
+    assert result["decrypted_result"] == [[2, 2]]
@@ -0,0 +1,119 @@
+import hashlib
+
+import pytest
+
+from app.services.merkle_service import (
+    EMPTY_ROOT, LEAF_PREFIX, _append, _audit_ranges, _consistency_ranges, _fold, _subtrees, frontier_root,
+    node_hash, verify_consistency, verify_inclusion
+)
+
+SIZES = list(range(1, 34)) + [63, 64, 65, 100, 127, 128, 129, 1000]
+
+
+def leaf(i):
+    return hashlib.sha256(LEAF_PREFIX + str(i).encode()).digest()
+
+
+def mth(leaves):
+    """RFC 9162 Merkle tree hash, computed recursively."""
+    if not leaves:
+        return EMPTY_ROOT
+    if len(leaves) == 1:
+        return leaves[0]
+    k = 1 << ((len(leaves) - 1).bit_length() - 1)
+    return node_hash(mth(leaves[:k]), mth(leaves[k:]))
+
+
+def rfc_path(m, leaves):
+    """RFC 9162 PATH(m, D[n])."""
+    if len(leaves) == 1:
+        return []
+    k = 1 << ((len(leaves) - 1).bit_length() - 1)
+    if m < k:
+        return rfc_path(m, leaves[:k]) + [mth(leaves[k:])]
+    return rfc_path(m - k, leaves[k:]) + [mth(leaves[:k])]
+
+
+def rfc_subproof(m, leaves, whole=True):
+    """RFC 9162 SUBPROOF(m, D[n], b)."""
+    if m == len(leaves):
+        return [] if whole else [mth(leaves)]
+    k = 1 << ((len(leaves) - 1).bit_length() - 1)
+    if m <= k:
+        return rfc_subproof(m, leaves[:k], whole) + [mth(leaves[k:])]
+    return rfc_subproof(m - k, leaves[k:], False) + [mth(leaves[:k])]
+
+
+class Tree:
+    """Frontier plus completed nodes, as stored in merkle_trees / merkle_nodes."""
+
+    def __init__(self):
+        self.frontier, self.size, self.nodes, self.roots = [], 0, {}, [EMPTY_ROOT]
+
+    def append(self, leaf_hash):
+        completed = []
+        self.size = _append(self.frontier, self.size, leaf_hash, completed)
+        self.nodes.update({(level, idx): node for level, idx, node in completed})
+        self.roots.append(frontier_root(self.frontier))
+
+    def range_roots(self, ranges):
+        return [_fold([self.nodes[node] for node in _subtrees(start, end)]) for start, end in ranges]
+
+
+@pytest.fixture(scope="module")
+def tree():
+    tree = Tree()
+    for i in range(max(SIZES)):
+        tree.append(leaf(i))
+    return tree
+
+
+@pytest.fixture(scope="module")
+def leaves():
+    return [leaf(i) for i in range(max(SIZES))]
+
+
+def test_frontier_root_matches_the_recursive_hash(tree, leaves):
+    assert tree.roots[0] == EMPTY_ROOT
+    for size in SIZES:
+        assert tree.roots[size] == mth(leaves[:size])
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_inclusion_proofs(tree, leaves, size):
+    root = tree.roots[size]
+    for index in sorted({0, 1, size // 2, size - 2, size - 1} & set(range(size))):
+        path = tree.range_roots(_audit_ranges(index, size))
+        assert path == rfc_path(index, leaves[:size])
+        assert verify_inclusion(leaves[index], index, size, path, root)
+        assert not verify_inclusion(leaf(-1), index, size, path, root)
+        assert not verify_inclusion(leaves[index], index, size, path, tree.roots[size - 1])
+        if path:
+            assert not verify_inclusion(leaves[index], index, size, path[:-1], root)
+            assert not verify_inclusion(leaves[index], index, size, path + [root], root)
+    assert not verify_inclusion(leaves[0], size, size, [], root)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_consistency_proofs(tree, leaves, size):
+    for old_size in sorted({1, 2, 3, size // 2, size - 1, size} & set(range(1, size + 1))):
+        path = tree.range_roots(_consistency_ranges(old_size, size))
+        assert path == rfc_subproof(old_size, leaves[:size])
+        assert verify_consistency(old_size, size, tree.roots[old_size], tree.roots[size], path)
+        if old_size < size:
+            assert not verify_consistency(old_size, size, tree.roots[old_size], tree.roots[size - 1], path)
+            assert not verify_consistency(old_size, size, leaf(-1), tree.roots[size], path)
+            assert not verify_consistency(old_size, size, tree.roots[old_size], tree.roots[size], path[:-1])
+            assert not verify_consistency(size, old_size, tree.roots[size], tree.roots[old_size], path)
+
+
+def test_consistency_from_the_empty_tree(tree):
+    assert verify_consistency(0, 5, EMPTY_ROOT, tree.roots[5], [])
+    assert not verify_consistency(0, 5, leaf(0), tree.roots[5], [])
+
+
+def test_every_consistency_pair_of_a_small_tree(tree):
+    for size in range(1, 40):
+        for old_size in range(1, size + 1):
+            path = tree.range_roots(_consistency_ranges(old_size, size))
+            assert verify_consistency(old_size, size, tree.roots[old_size], tree.roots[size], path)
@@ -0,0 +1,95 @@
+import numpy as np
+
+from app.services.ranked_tally import (
+    RankedBallots, borda, condorcet_winner, instant_runoff, pairwise_matrix, ranked_results, schulze
+)
+
+A, B, C, D, E = range(5)
+
+
+def ballots(n_candidates, patterns):
+    return RankedBallots.from_patterns(n_candidates, patterns)
+
+
+# 21 voters: A leads the first round, C's transfers elect B, who is also the Condorcet winner
+MAJORITY = {(A, B, C): 8, (B, C, A): 7, (C, B, A): 6}
+
+# Partial rankings: B's voters rank nobody else and exhaust
+PARTIAL = {(A,): 3, (B,): 2, (C, B): 2}
+
+# Schulze method example (45 voters, 5 candidates), no Condorcet winner
+SCHULZE = {
+    (A, C, B, E, D): 5, (A, D, E, C, B): 5, (B, E, D, A, C): 8, (C, A, B, E, D): 3,
+    (C, A, E, B, D): 7, (C, B, A, D, E): 2, (D, C, E, B, A): 7, (E, B, A, D, C): 8,
+}
+
+
+def test_irv_transfers_eliminated_votes():
+    result = instant_runoff(ballots(3, MAJORITY))
+    assert result["winner"] == B
+    assert [(r["counts"], r["exhausted"], r["eliminated"]) for r in result["rounds"]] == [
+        ([8, 7, 6], 0, C),
+        ([8, 13, 0], 0, None),
+    ]
+
+
+def test_irv_counts_exhausted_ballots_and_ties():
+    result = instant_runoff(ballots(3, PARTIAL))
+    assert result["winner"] == A
+    first, second = result["rounds"]
+    assert (first["counts"], first["eliminated"], first["tie"]) == ([3, 2, 2], B, True)
+    assert (second["counts"], second["exhausted"]) == ([3, 0, 2], 2)
+
+
+def test_irv_without_ballots():
+    assert instant_runoff(ballots(3, {})) == {"winner": None, "rounds": []}
+
+
+def test_borda_points():
+    assert borda(ballots(3, MAJORITY)) == [16, 28, 19]
+    # Unranked candidates get no points
+    assert borda(ballots(3, PARTIAL)) == [6, 6, 4]
+
+
+def test_pairwise_and_condorcet():
+    d = pairwise_matrix(ballots(3, MAJORITY))
+    assert d.tolist() == [[0, 8, 8], [13, 0, 15], [13, 6, 0]]
+    assert condorcet_winner(d) == B
+    assert schulze(d) == [B, C, A]
+
+
+def test_ranked_above_unranked():
+    d = pairwise_matrix(ballots(3, PARTIAL))
+    assert d.tolist() == [[0, 3, 3], [4, 0, 2], [2, 2, 0]]
+    assert condorcet_winner(d) is None
+    assert schulze(d) == [B, A, C]
+
+
+def test_schulze_resolves_a_cycle():
+    d = pairwise_matrix(ballots(5, SCHULZE))
+    assert d.tolist() == [
+        [0, 20, 26, 30, 22],
+        [25, 0, 16, 33, 18],
+        [19, 29, 0, 17, 24],
+        [15, 12, 28, 0, 14],
+        [23, 27, 21, 31, 0],
+    ]
+    assert condorcet_winner(d) is None
+    assert schulze(d) == [E, A, C, B, D]
+
+
+def test_repeated_and_unknown_candidates_are_dropped():
+    ranked = ballots(3, {(B, B, 7, A): 1})
+    assert ranked.preferences.tolist() == [[B, A, -1]]
+    assert np.array_equal(ranked.weights, [1])
+
+
+def test_ranked_results_payload():
+    payload = ranked_results(["A", "B", "C"], MAJORITY)
+    assert payload["irv"]["winner"] == "B"
+    assert payload["irv"]["rounds"][0] == {
+        "round": 1, "counts": {"A": 8, "B": 7, "C": 6}, "exhausted": 0, "eliminated": "C", "tie": False
+    }
+    assert payload["borda"] == {"A": 16, "B": 28, "C": 19}
+    assert payload["condorcet"]["winner"] == "B"
+    assert payload["condorcet"]["schulze_ranking"] == ["B", "C", "A"]
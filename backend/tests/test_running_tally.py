@@ -0,0 +1,95 @@
+import asyncio
+import base64
+import json
+import random
+import uuid
+
+import fakeredis
+
+from app.services import tally_service as tally_module
+from app.services.tally_engine import TallyEngine, materialize_ballot
+from app.services.tally_service import DIRTY_SET, TALLY_KEY, TallyService
+
+QUESTIONS = [
+    {"type": "single", "options": ["Oui", "Non"]},
+    {"type": "multiple", "options": ["A", "B", "C"]},
+    {"type": "ranking", "options": ["X", "Y", "Z"]},
+]
+
+
+def b64(value):
+    return base64.b64encode((value if isinstance(value, str) else json.dumps(value)).encode()).decode()
+
+
+def random_ballots(count, seed):
+    rng = random.Random(seed)
+    return [{"choices": [
+        {"encrypted": b64(rng.choice(["Oui", "Non"]))},
+        {"encrypted": b64(rng.sample(["A", "B", "C"], rng.randint(0, 3)))},
+        {"encrypted": b64(dict(zip("123", rng.sample(["X", "Y", "Z"], 3))))},
+    ]} for _ in range(count)]
+
+
+def run(monkeypatch, scenario):
+    async def main():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+        async def get_redis():
+            return redis
+
+        monkeypatch.setattr(tally_module, "get_redis", get_redis)
+        return await scenario(redis)
+    return asyncio.run(main())
+
+
+def test_counters_follow_submissions(monkeypatch):
+    election_id = uuid.uuid4()
+    seeded, submitted = random_ballots(300, seed=1), random_ballots(200, seed=2)
+    expected = TallyEngine(QUESTIONS).add_many(seeded + submitted).result()
+
+    async def scenario(redis):
+        initial = TallyEngine(QUESTIONS).add_many(seeded).result()
+        await TallyService._store(election_id, initial.counts_as_lists(), initial.ballot_count)
+        for start in range(0, len(submitted), 64):
+            batch = submitted[start:start + 64]
+            await TallyService.record_batch(election_id, [materialize_ballot(QUESTIONS, b) for b in batch])
+        return await TallyService.read_counters(election_id, QUESTIONS), await redis.smembers(DIRTY_SET)
+
+    (counts, vote_count), dirty = run(monkeypatch, scenario)
+    assert counts == expected.counts_as_lists()
+    assert vote_count == 500
+    assert dirty == {str(election_id)}
+
+
+def test_unseeded_counters_are_left_for_the_rebuild(monkeypatch):
+    election_id = uuid.uuid4()
+    ballot = random_ballots(1, seed=3)[0]
+
+    async def scenario(redis):
+        credited = await TallyService.record_batch(election_id, [materialize_ballot(QUESTIONS, ballot)])
+        return credited, await redis.exists(TALLY_KEY.format(election_id=election_id)), \
+            await TallyService.read_counters(election_id, QUESTIONS)
+
+    credited, exists, counters = run(monkeypatch, scenario)
+    ranking = json.loads(base64.b64decode(ballot["choices"][2]["encrypted"]))
+    # Ranking questions only credit the first choice
+    assert f"q2:o{['X', 'Y', 'Z'].index(ranking['1'])}" in credited[0]
+    assert sum(field.startswith("q2:") for field in credited[0]) == 1
+    assert not exists
+    assert counters is None
+
+
+def test_redis_failure_does_not_fail_the_submission(monkeypatch):
+    async def unavailable():
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(tally_module, "get_redis", unavailable)
+    rows = materialize_ballot(QUESTIONS, random_ballots(1, seed=4)[0])
+    credited = asyncio.run(TallyService.record_batch(uuid.uuid4(), [rows]))
+    assert len(credited) == 1 and credited[0][0].startswith("q0:")
+
+
+def test_checkpoint_mapping_round_trip():
+    counts = [[3, 1], [2, 0, 5], [4, 4, 0]]
+    mapping = TallyService._to_mapping(counts, 8)
+    assert TallyService._from_mapping(QUESTIONS, {k: str(v) for k, v in mapping.items()}) == (counts, 8)
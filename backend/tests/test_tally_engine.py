@@ -0,0 +1,84 @@
+import base64
+import json
+import random
+from collections import Counter
+
+import pytest
+
+from app.services.tally_engine import TallyEngine
+
+QUESTIONS = [
+    {"type": "single", "options": ["Oui", "Non", "Blanc"]},
+    {"type": "multiple", "options": ["A", "B", "C", "D"]},
+    {"type": "ranking", "options": ["X", "Y", "Z"]},
+]
+
+
+def b64(value):
+    text = value if isinstance(value, str) else json.dumps(value)
+    return base64.b64encode(text.encode()).decode()
+
+
+def random_ballots(count, seed):
+    rng = random.Random(seed)
+    ballots = []
+    for _ in range(count):
+        ranking = rng.sample(QUESTIONS[2]["options"], rng.randint(1, 3))
+        ballots.append({"choices": [
+            {"encrypted": b64(rng.choice(QUESTIONS[0]["options"]))},
+            {"encrypted": b64(rng.sample(QUESTIONS[1]["options"], rng.randint(0, 4)))},
+            {"encrypted": b64({str(position): option for position, option in enumerate(ranking, start=1)})},
+        ]})
+    return ballots
+
+
+def naive_tally(ballots):
+    """Straightforward per-ballot count: plain votes, every multiple selection, first ranked choice."""
+    counts = [[0] * len(q["options"]) for q in QUESTIONS]
+    rank_counts = [[0] * 3 for _ in QUESTIONS[2]["options"]]
+    preferences = Counter()
+    for ballot in ballots:
+        single, multiple, ranking = (base64.b64decode(c["encrypted"]).decode() for c in ballot["choices"])
+        counts[0][QUESTIONS[0]["options"].index(single)] += 1
+        for option in json.loads(multiple):
+            counts[1][QUESTIONS[1]["options"].index(option)] += 1
+        ranking = json.loads(ranking)
+        ranked = tuple(QUESTIONS[2]["options"].index(ranking[p]) for p in sorted(ranking, key=int))
+        counts[2][ranked[0]] += 1
+        for position, option in enumerate(ranked):
+            rank_counts[option][position] += 1
+        preferences[ranked] += 1
+    return counts, rank_counts, dict(preferences)
+
+
+@pytest.mark.parametrize("count", [0, 1, 7, 500, 20_000])
+def test_engine_matches_a_naive_count(count):
+    ballots = random_ballots(count, seed=count)
+    result = TallyEngine(QUESTIONS).add_many(ballots).result()
+    counts, rank_counts, preferences = naive_tally(ballots)
+    assert result.ballot_count == count
+    assert result.counts_as_lists() == counts
+    assert result.rank_counts[2].tolist() == rank_counts
+    assert result.preferences[2] == preferences
+
+
+def test_engine_counts_are_independent_of_ballot_order():
+    ballots = random_ballots(3000, seed=1)
+    shuffled = ballots[:]
+    random.Random(2).shuffle(shuffled)
+    first = TallyEngine(QUESTIONS).add_many(ballots).result()
+    second = TallyEngine(QUESTIONS).add_many(shuffled).result()
+    assert first.counts_as_lists() == second.counts_as_lists()
+    assert first.preferences == second.preferences
+
+
+def test_missing_and_undecodable_choices_still_count_the_ballot():
+    ballots = [
+        {"choices": [{"encrypted": b64("Oui")}]},
+        {"choices": [{"encrypted": "%%%"}, {"encrypted": b64(["A"])}]},
+        {"choices": []},
+        None,
+    ]
+    result = TallyEngine(QUESTIONS).add_many(ballots).result()
+    assert result.ballot_count == 4
+    assert result.counts_as_lists() == [[1, 0, 0], [1, 0, 0, 0], [0, 0, 0]]
@@ -0,0 +1,79 @@
+import base64
+import json
+from collections import Counter
+
+from app.services.tally_engine import TallyEngine, count_encrypted_values, counted_rows, materialize_ballot
+
+QUESTIONS = [
+    {"type": "single", "options": ["A", "B", "1", "true"]},
+    {"type": "multiple", "options": ["A", "B", "1"]},
+    {"type": "ranking", "options": ["A", "B", "C"]},
+]
+
+
+def b64(value):
+    text = value if isinstance(value, str) else json.dumps(value)
+    return base64.b64encode(text.encode("iso-8859-1")).decode()
+
+
+def ballot(*encrypted):
+    return {"choices": [value if not isinstance(value, str) else {"encrypted": value} for value in encrypted]}
+
+
+# Every shape the classification has to agree on, valid or not
+FIXTURE_BALLOTS = [
+    ballot(b64("A"), b64(["A", "B"]), b64({"1": "A", "2": "B"})),
+    ballot(b64("B"), b64(["1"]), b64({"1": "C", "2": "A", "3": "B"})),
+    ballot(b64("1"), b64([1, "A"]), b64({"1": 1})),              # JSON numbers are not options
+    ballot(b64("true"), b64([["A"], {"x": "B"}]), b64({"0": "B", "1": "A"})),
+    ballot(b64(" A"), b64("[A"), b64({"2": "A"})),                 # no first choice
+    ballot(b64('"A"'), b64("A"), b64(["A"])),                      # JSON string, plain value, list in ranking
+    ballot(b64("[B"), b64(["A", "A"]), b64("A")),
+    ballot(b64("null"), b64({"1": "A"}), b64({"1": "A", "x": "B"})),
+    ballot(b64("Z"), b64([]), b64({"1": "Z"})),
+    ballot("not base64!", {"encrypted": 5}, b64({"1": "B"})),
+    ballot({"encrypted": None}, "@@@", b64({"1": "B", "2": "C"})),
+    {"choices": ["garbage", {"encrypted": b64(["B"])}, {"encrypted": b64({"1": "C"})}]},
+    {"choices": {"0": {"encrypted": b64("A")}}},
+    {"ciphertexts": []},
+    None,
+]
+
+
+def postgres_rows(ballots):
+    """Rows of JSONB_TALLY_SQL: choices arrays only, string values only, grouped."""
+    grouped = Counter()
+    for encrypted_ballot in ballots:
+        choices = encrypted_ballot.get("choices") if isinstance(encrypted_ballot, dict) else None
+        if not isinstance(choices, list):
+            continue
+        for q_idx, choice in enumerate(choices):
+            if isinstance(choice, dict) and isinstance(choice.get("encrypted"), str):
+                grouped[(q_idx, choice["encrypted"])] += 1
+    return [(q_idx, encrypted, count) for (q_idx, encrypted), count in grouped.items()]
+
+
+def naive_counts(ballots):
+    counts = [[0] * len(q["options"]) for q in QUESTIONS]
+    for encrypted_ballot in ballots:
+        for q_idx, o_idx in counted_rows(materialize_ballot(QUESTIONS, encrypted_ballot)):
+            counts[q_idx][o_idx] += 1
+    return counts
+
+
+def test_postgres_mode_matches_the_engine():
+    engine = TallyEngine(QUESTIONS).add_many(FIXTURE_BALLOTS).result()
+    assert count_encrypted_values(QUESTIONS, postgres_rows(FIXTURE_BALLOTS)) == engine.counts_as_lists()
+
+
+def test_engine_matches_materialized_rows():
+    engine = TallyEngine(QUESTIONS).add_many(FIXTURE_BALLOTS).result()
+    assert engine.counts_as_lists() == naive_counts(FIXTURE_BALLOTS)
+
+
+def test_fixture_counts():
+    assert count_encrypted_values(QUESTIONS, postgres_rows(FIXTURE_BALLOTS)) == [
+        [1, 1, 0, 0],  # "1", "true", '"A"', " A", "null" and "[B" are not plain votes
+        [5, 2, 1],     # plain "A" counts, JSON numbers and nested values do not
+        [3, 3, 2],     # position "0" ranks before "1"
+    ]
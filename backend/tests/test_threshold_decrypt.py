@@ -0,0 +1,69 @@
+import itertools
+
+import pytest
+
+from app.services.crypto_service import CryptoEngine, DiscreteLogTable, g_pow
+
+SELECTIONS = [[1, 0, 1], [0, 1, 1], [1, 1, 0], [0, 0, 1], [1, 0, 0]]
+
+
+@pytest.fixture(scope="module")
+def election():
+    keypair = CryptoEngine.generate_keypair(threshold=2, trustees=3)
+    ballots = [CryptoEngine.encrypt_ballot({"selections": [s]}, keypair["public_key"])[0] for s in SELECTIONS]
+    aggregated = CryptoEngine.aggregate_ballots(ballots)
+    partials = {
+        share["index"]: CryptoEngine.partial_decrypt(aggregated, share) for share in keypair["trustee_shares"]
+    }
+    return keypair["public_key"], aggregated, partials
+
+
+def test_any_threshold_of_trustees_decrypts(election):
+    public_key, aggregated, partials = election
+    for indices in itertools.chain(itertools.combinations(partials, 2), [tuple(partials)]):
+        result = CryptoEngine.threshold_decrypt(aggregated, [partials[i] for i in indices], public_key)
+        assert result["decrypted_result"] == [[3, 2, 3]]
+
+
+def test_too_few_shares(election):
+    public_key, aggregated, partials = election
+    with pytest.raises(ValueError, match="Not enough"):
+        CryptoEngine.threshold_decrypt(aggregated, [partials[1]], public_key)
+
+
+@pytest.mark.parametrize("with_public_key", [True, False])
+def test_duplicate_shares(election, with_public_key):
+    public_key, aggregated, partials = election
+    with pytest.raises(ValueError, match="Duplicate"):
+        CryptoEngine.threshold_decrypt(aggregated, [partials[1], partials[1]], public_key if with_public_key else None)
+
+
+@pytest.mark.parametrize("index", [0, -1, 4, True, "1", 1.0, None])
+def test_out_of_range_indices(election, index):
+    public_key, aggregated, partials = election
+    forged = {**partials[2], "index": index}
+    with pytest.raises(ValueError, match="Invalid trustee index"):
+        CryptoEngine.threshold_decrypt(aggregated, [partials[1], forged], public_key)
+
+
+def test_zero_index_rejected_without_public_key(election):
+    _, aggregated, partials = election
+    with pytest.raises(ValueError, match="Invalid trustee index"):
+        CryptoEngine.threshold_decrypt(aggregated, [partials[1], {**partials[2], "index": 0}])
+
+
+def test_partial_of_another_trustee_rejected(election):
+    public_key, aggregated, partials = election
+    relabelled = {**partials[3], "index": 2}
+    with pytest.raises(ValueError, match="Invalid partial decryption"):
+        CryptoEngine.threshold_decrypt(aggregated, [partials[1], relabelled], public_key)
+
+
+def test_discrete_log_table(tmp_path):
+    table = DiscreteLogTable(str(tmp_path / "bsgs.npy"), 16)
+    for m in [0, 1, 15, 16, 17, 100, 255, 256]:
+        assert table.solve(g_pow(m), 256) == m
+    with pytest.raises(ValueError, match="out of range"):
+        table.solve(g_pow(300), 256)
+    # Built once, then mapped by every later instance
+    assert DiscreteLogTable(str(tmp_path / "bsgs.npy"), 16).solve(g_pow(42), 50) == 42
@@ -128,12 +128,12 @@ export default function VotePage() {
         response: Math.random().toString(36)
       }
       
-      const response = await apiClient.submitBallot({
+      const response = await apiClient.submitBallotWithMagicLink({
         election_id: session.election_id,
         encrypted_ballot,
         proof,
         voter_fingerprint: btoa(session.email),
-        magic_token: token  // CRUCIAL: Permet à l'API d'envoyer l'email de confirmation
+        magic_token: token  // CRUCIAL: lien consommé atomiquement avec le vote (et email de confirmation)
       })
       
       setTrackingCode(response.tracking_code)
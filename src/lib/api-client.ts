@@ -201,6 +201,14 @@ class ApiClient {
     });
   }
 
+  // Vote + consommation du lien magique en une seule transaction
+  async submitBallotWithMagicLink(ballotData: unknown) {
+    return this.request<SubmitBallotResponse>("/ballots/with-magic-link", {
+      method: "POST",
+      body: JSON.stringify(ballotData),
+    });
+  }
+
   async verifyBallot(trackingCode: string) {
     return this.request(`/ballots/verify/${trackingCode}`);
   }